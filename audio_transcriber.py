@@ -0,0 +1,222 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from dotenv import load_dotenv
+load_dotenv()
+
+AUDIO_DIR = "LLMFiles"
+# "whisper" (local, default) or "google" (SpeechRecognition's free web API)
+AUDIO_ENGINE = os.getenv("AUDIO_ENGINE", "whisper")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+# Each worker process holds its own copy of the model, so keep the pool small
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", str(min(2, os.cpu_count() or 1))))
+# torch threads per worker; the workers themselves provide the parallelism
+AUDIO_WORKER_THREADS = int(os.getenv("AUDIO_WORKER_THREADS", "1"))
+AUDIO_MEMO_ENTRIES = int(os.getenv("AUDIO_MEMO_ENTRIES", "64"))
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(".cache", "transcripts"))
+# Transcripts on disk older than the TTL are dropped, then the least recently used beyond the size limit
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", str(30 * 24 * 3600)))
+CHUNK_MAX_SECONDS = int(os.getenv("AUDIO_CHUNK_MAX_SECONDS", "30"))
+SILENCE_MIN_MS = 400
+SAMPLE_RATE = 16000
+
+_model = None
+_model_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _get_model():
+    """The speech model of this process, loaded on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if AUDIO_ENGINE == "whisper":
+                import whisper
+                _model = whisper.load_model(WHISPER_MODEL)
+            else:
+                import speech_recognition as sr
+                _model = sr.Recognizer()
+        return _model
+
+
+def _transcribe_pcm(pcm: bytes) -> str:
+    """Transcribe 16 kHz mono 16-bit PCM."""
+    model = _get_model()
+    if AUDIO_ENGINE == "whisper":
+        import numpy as np
+        audio = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+        return model.transcribe(audio, fp16=False)["text"].strip()
+    import speech_recognition as sr
+    try:
+        return model.recognize_google(sr.AudioData(pcm, SAMPLE_RATE, 2))
+    except sr.UnknownValueError:
+        return ""  # chunk without recognizable speech
+
+
+def _init_worker():
+    if AUDIO_ENGINE == "whisper":
+        import torch
+        torch.set_num_threads(max(1, AUDIO_WORKER_THREADS))
+    _get_model()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process runs browser and tool threads
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, AUDIO_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def preload():
+    """Load the model in this process and in every worker, so the first clip doesn't wait for it."""
+    _get_model()
+    if AUDIO_WORKERS > 1:
+        pool = _get_pool()
+        list(pool.map(_noop, range(AUDIO_WORKERS)))
+
+
+def _noop(_):
+    return None
+
+
+def shutdown_transcriber():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_at_silence(segment, max_ms: int = CHUNK_MAX_SECONDS * 1000) -> List:
+    """Cut audio into chunks of at most ``max_ms``, preferring the middle of a pause as the cut point."""
+    if len(segment) <= max_ms:
+        return [segment]
+    from pydub.silence import detect_silence
+    silences = detect_silence(segment, min_silence_len=SILENCE_MIN_MS,
+                              silence_thresh=segment.dBFS - 16, seek_step=10)
+    cuts = [(start + end) // 2 for start, end in silences]
+    chunks = []
+    start = 0
+    while len(segment) - start > max_ms:
+        # Take the last pause in the window, but don't produce very short chunks
+        candidates = [c for c in cuts if start + max_ms // 3 <= c <= start + max_ms]
+        cut = candidates[-1] if candidates else start + max_ms
+        chunks.append(segment[start:cut])
+        start = cut
+    chunks.append(segment[start:])
+    return chunks
+
+
+def _cache_key(data: bytes) -> str:
+    model = WHISPER_MODEL if AUDIO_ENGINE == "whisper" else AUDIO_ENGINE
+    return hashlib.sha256(data).hexdigest() + f"-{AUDIO_ENGINE}-{model}"
+
+
+def _remember(key: str, text: str):
+    with _memo_lock:
+        _memo[key] = text
+        _memo.move_to_end(key)
+        while len(_memo) > AUDIO_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+
+
+def _cached(key: str):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    path = os.path.join(TRANSCRIPT_CACHE_DIR, key + ".txt")
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        os.utime(path)  # the mtime doubles as last use for eviction
+    except FileNotFoundError:
+        return None
+    _remember(key, text)
+    return text
+
+
+def _evict_disk(max_bytes: int = None, ttl: float = None):
+    """Drop expired transcripts from TRANSCRIPT_CACHE_DIR, then the least recently used over the size limit."""
+    max_bytes = TRANSCRIPT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    ttl = TRANSCRIPT_CACHE_TTL if ttl is None else ttl
+    try:
+        names = [name for name in os.listdir(TRANSCRIPT_CACHE_DIR) if name.endswith(".txt")]
+    except FileNotFoundError:
+        return
+    files = []
+    for name in names:
+        path = os.path.join(TRANSCRIPT_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - ttl
+    for mtime, size, path in files:
+        if mtime > cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _store(key: str, text: str):
+    _remember(key, text)
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(TRANSCRIPT_CACHE_DIR, key + ".txt")
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    _evict_disk()
+
+
+def transcribe_audio(file_path: str) -> str:
+    """
+    Transcribe an audio file (MP3, WAV, OPUS, ...) in LLMFiles into text.
+
+    Long clips are split at pauses and the chunks are transcribed in parallel
+    on a process pool. Transcripts are memoized by the SHA-256 of the audio,
+    in memory and under TRANSCRIPT_CACHE_DIR.
+    """
+    path = file_path if os.path.isabs(file_path) else os.path.join(AUDIO_DIR, file_path)
+    with open(path, "rb") as f:
+        data = f.read()
+    key = _cache_key(data)
+    text = _cached(key)
+    if text is not None:
+        print(f"Transcript cache hit for {file_path}")
+        return text
+
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(path)
+    segment = segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    chunks = [chunk.raw_data for chunk in split_at_silence(segment)]
+    if len(chunks) == 1 or AUDIO_WORKERS <= 1:
+        parts = [_transcribe_pcm(chunk) for chunk in chunks]
+    else:
+        parts = list(_get_pool().map(_transcribe_pcm, chunks))
+    text = " ".join(part for part in parts if part)
+    print(f"Transcribed {file_path}: {len(segment) / 1000:.0f}s of audio in {len(chunks)} chunks")
+    _store(key, text)
+    return text
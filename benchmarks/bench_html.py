@@ -0,0 +1,98 @@
+"""
+Compare the single-pass page extraction in scraper.py with the original
+two-pass BeautifulSoup implementation.
+
+Usage:
+    python benchmarks/bench_html.py [corpus_dir] [--repeat N]
+
+The corpus is a directory of saved rendered pages (*.html). When it is empty
+a synthetic quiz-like page is generated so the script always has something
+to measure.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+BASE_URL = "https://tds-llm-analysis.s-anand.net/quiz"
+
+
+def synthetic_page(rows: int = 5000) -> str:
+    cells = "".join(
+        f"<tr><td>{i}</td><td>item-{i}</td><td>{i * 3.5:.2f}</td>"
+        f"<td><a href='/files/{i}.csv'>csv {i}</a></td></tr>"
+        for i in range(rows)
+    )
+    return (
+        "<html><head><title>Quiz</title><style>td{padding:2px}</style>"
+        "<script src='/app.js'>window.x = 1;</script></head><body>"
+        "<h1>Quiz</h1><p>Download the <a href='/data.csv'>data</a> and sum the values.</p>"
+        f"<img src='/chart.png'><table>{cells}</table>"
+        "<!-- footer --><footer>Post your answer to /submit</footer></body></html>"
+    )
+
+
+def load_corpus(directory: str) -> dict:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        pages["synthetic.html"] = synthetic_page()
+    return pages
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def reference(html: str):
+    return scraper.extract_all_urls(html, BASE_URL), scraper.clean_text(html, BASE_URL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = ["html.parser"] + (["lxml"] if scraper.lxml_html is not None else [])
+    pages = load_corpus(args.corpus)
+    totals = {"bs4 (two passes)": 0.0, **{b: 0.0 for b in backends}}
+    mismatches = []
+
+    for name, html in pages.items():
+        ref_urls, ref_text = reference(html)
+        row = {"bs4 (two passes)": best_of(lambda: reference(html), args.repeat)}
+        for backend in backends:
+            urls, text = scraper.extract_page(html, BASE_URL, backend)
+            if set(urls) != set(ref_urls) or text != ref_text:
+                mismatches.append((name, backend))
+            row[backend] = best_of(lambda: scraper.extract_page(html, BASE_URL, backend), args.repeat)
+        for key, value in row.items():
+            totals[key] += value
+        print(f"{name} ({len(html) / 1024:.0f} KB): " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in row.items()))
+
+    baseline = totals["bs4 (two passes)"]
+    print("\nTotal over", len(pages), "pages:")
+    for key, value in totals.items():
+        print(f"  {key:<18} {value * 1000:9.1f} ms  ({baseline / value if value else 0:.1f}x)")
+    if mismatches:
+        print("\nOutput differs from the reference for:", ", ".join(f"{n} [{b}]" for n, b in mismatches))
+        sys.exit(1)
+    print("\nAll backends match the reference output.")
+
+
+if __name__ == "__main__":
+    main()
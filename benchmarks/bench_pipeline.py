@@ -0,0 +1,243 @@
+"""
+End-to-end pipeline benchmark against a local mock quiz site and mock LLM.
+
+Starts benchmarks/mock_quiz_server.py and benchmarks/mock_llm.py in-process,
+points the pipeline at them, solves --chains quiz chains with --concurrency
+of them in flight, and reports:
+
+- p50/p95 latency of every pipeline stage, LLM request and tool call
+  (from the JSONL traces written by telemetry.py),
+- chains per minute and correct submissions,
+- peak RSS of this process, and peak combined RSS of its live child process
+  trees (browsers, kernels) sampled during the run.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--chains 8] [--concurrency 4] [--steps 3]
+        [--llm-latency 0.5] [--script sum_csv] [--mode async|sync]
+        [--save results.json] [--compare baseline.json --tolerance 0.15]
+
+With --compare the run exits with status 1 if throughput dropped or any p95
+grew by more than --tolerance relative to the baseline.
+
+The pipeline itself needs its runtime dependencies (Playwright with Chromium,
+the tools package), exactly as in production.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_llm  # noqa: E402
+import mock_quiz_server  # noqa: E402
+
+
+def _descendants_rss_kb(pid: int) -> int:
+    """Combined VmRSS of every live descendant of ``pid`` (Linux /proc)."""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    children = [int(c) for c in f.read().split()]
+                stack.extend(children)
+                for child in children:
+                    with open(f"/proc/{child}/status") as f:
+                        total += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class ChildRssSampler(threading.Thread):
+    """Samples the RSS of the live browser and kernel processes while the chains run.
+
+    RUSAGE_CHILDREN only covers children that have exited and been waited for,
+    and reports the largest one rather than their sum.
+    """
+
+    def __init__(self, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_kb = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, _descendants_rss_kb(os.getpid()))
+
+    def stop(self) -> float:
+        self.stopped.set()
+        self.join()
+        self.peak_kb = max(self.peak_kb, _descendants_rss_kb(os.getpid()))
+        return self.peak_kb / 1024
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest-rank percentile
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def configure_environment(llm_url: str, trace_dir: str, concurrency: int, stream: bool):
+    # Must run before the pipeline modules are imported, they read these at import time
+    os.environ.update({
+        "LLM_API_URL": llm_url,
+        "AIPIPE_KEY": os.environ.get("AIPIPE_KEY") or "bench",
+        "EMAIL": os.environ.get("EMAIL") or "bench@example.com",
+        "SECRET": os.environ.get("SECRET") or "bench",
+        "TRACE_DIR": trace_dir,
+        "LLM_RATE_PER_MINUTE": "100000",
+        "LLM_RATE_BURST": "1000",
+        "LLM_STREAM": "1" if stream else "0",
+        "DOWNLOAD_CACHE_FRESH_SECONDS": "0",
+    })
+
+
+def run_chains(start_urls, concurrency: int, mode: str):
+    import pipeline_manager
+    if mode == "sync":
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(pipeline_manager.run_pipeline, start_urls))
+    else:
+        async def run_all():
+            # Same bound the job scheduler applies in the server
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def run_one(url):
+                async with semaphore:
+                    await pipeline_manager.arun_pipeline(url)
+
+            await asyncio.gather(*(run_one(url) for url in start_urls))
+        asyncio.run(run_all())
+
+
+def span_durations(trace_dir: str):
+    durations = defaultdict(list)
+    for path in glob.glob(os.path.join(trace_dir, "*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "span":
+                    durations[record["name"]].append(record["duration"])
+    return durations
+
+
+def summarize(durations, chains: int, wall: float, quiz_stats, llm_requests: int, child_rss_mb: float):
+    return {
+        "chains": chains,
+        "wall_seconds": round(wall, 3),
+        "chains_per_minute": round(chains / wall * 60, 2) if wall else 0.0,
+        "submissions": quiz_stats["submissions"],
+        "correct": quiz_stats["correct"],
+        "llm_requests": llm_requests,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(child_rss_mb, 1),
+        "spans": {
+            name: {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 4),
+                "p95": round(percentile(values, 0.95), 4),
+            }
+            for name, values in sorted(durations.items())
+        },
+    }
+
+
+def print_report(result):
+    print(f"\n{result['chains']} chains in {result['wall_seconds']:.2f}s "
+          f"-> {result['chains_per_minute']:.2f} chains/min")
+    print(f"Submissions: {result['correct']}/{result['submissions']} correct, LLM requests: {result['llm_requests']}")
+    print(f"Peak RSS: {result['peak_rss_mb']} MB (children {result['peak_child_rss_mb']} MB)\n")
+    print(f"  {'span':<32} {'count':>6} {'p50 s':>9} {'p95 s':>9}")
+    for name, stats in result["spans"].items():
+        print(f"  {name:<32} {stats['count']:>6} {stats['p50']:>9.4f} {stats['p95']:>9.4f}")
+
+
+def compare(result, baseline, tolerance: float) -> list:
+    regressions = []
+    if result["chains_per_minute"] < baseline["chains_per_minute"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['chains_per_minute']} -> {result['chains_per_minute']} chains/min")
+    for name, stats in result["spans"].items():
+        before = baseline["spans"].get(name)
+        # Ignore sub-10ms spans, their noise dwarfs any real change
+        if before and before["p95"] >= 0.01 and stats["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{name} p95 {before['p95']}s -> {stats['p95']}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chains", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=3, help="quizzes per chain")
+    parser.add_argument("--rows", type=int, default=1000, help="rows in each quiz CSV")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--site-latency", type=float, default=0.0)
+    parser.add_argument("--script", choices=sorted(mock_llm.SCRIPTS), default="sum_csv")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    site, quiz_state = mock_quiz_server.serve(steps=args.steps, rows=args.rows, latency=args.site_latency)
+    llm, llm_state = mock_llm.serve(latency=args.llm_latency, token_delay=args.token_delay, script=args.script)
+    trace_dir = tempfile.mkdtemp(prefix="bench-traces-")
+    configure_environment(f"http://127.0.0.1:{llm.server_address[1]}/v1/chat/completions",
+                          trace_dir, args.concurrency, not args.no_stream)
+
+    site_url = f"http://127.0.0.1:{site.server_address[1]}"
+    start_urls = [f"{site_url}/quiz/{chain}/1" for chain in range(1, args.chains + 1)]
+    sampler = ChildRssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    run_chains(start_urls, args.concurrency, args.mode)
+    wall = time.perf_counter() - start
+    child_rss_mb = sampler.stop()
+
+    result = summarize(span_durations(trace_dir), args.chains, wall, quiz_state.stats(), llm_state.requests,
+                       child_rss_mb)
+    result["config"] = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+    print_report(result)
+
+    from browser_pool import shutdown_pool
+    from kernel_pool import shutdown_kernel_pool
+    shutdown_pool()
+    shutdown_kernel_pool()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against", args.compare)
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Import-time profile of the server's cold start.
+
+Imports --module (default: main) in a fresh interpreter under
+``python -X importtime`` and reports the wall time, the slowest imports by
+cumulative time and the heavy packages that were loaded. With --tools it
+then loads every solver tool through FUNCTION_MAP and times each one, which
+is what the background warm-up pays after the server is listening.
+
+Usage:
+    python benchmarks/import_profile.py [--module main] [--top 20] [--tools]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+HEAVY = ("torch", "whisper", "librosa", "pandas", "sklearn", "scipy", "numpy",
+         "langchain_core", "langsmith", "playwright", "fastapi", "httpx")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+result = {{"seconds": elapsed, "modules": sorted(sys.modules)}}
+if {tools}:
+    from solver_agent import FUNCTION_MAP
+    started = time.perf_counter()
+    result["tools"] = FUNCTION_MAP.load_all()
+    result["tools_seconds"] = time.perf_counter() - started
+print(json.dumps(result))
+"""
+
+
+def profile(module: str, tools: bool):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, tools=tools)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            depth = (len(indent) - 1) // 2
+            imports.append((name, int(self_us), int(cumulative_us), depth))
+            if name == module and depth == 0:
+                break  # the rest is the --tools step
+    return json.loads(proc.stdout.strip().splitlines()[-1]), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--tools", action="store_true", help="also time loading every solver tool")
+    args = parser.parse_args()
+
+    result, imports = profile(args.module, args.tools)
+    print(f"import {args.module}: {result['seconds']:.3f}s wall, {len(imports)} modules\n")
+    print(f"  {'module':<48} {'self ms':>9} {'cumul ms':>9}")
+    for name, self_us, cumulative_us, _ in sorted(imports, key=lambda i: i[2], reverse=True)[:args.top]:
+        print(f"  {name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+    loaded = [name for name in HEAVY if name in result["modules"]]
+    print("\nHeavy packages loaded at import:", ", ".join(loaded) or "none")
+    if args.tools:
+        print(f"\nLoading every tool took {result['tools_seconds']:.3f}s:")
+        for name, seconds in sorted(result["tools"].items(), key=lambda item: item[1], reverse=True):
+            print(f"  {name:<28} {seconds:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
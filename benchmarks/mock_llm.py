@@ -0,0 +1,240 @@
+"""
+Deterministic OpenAI-compatible chat completions server, for offline benchmarks.
+
+Point the pipeline at it with LLM_API_URL=http://127.0.0.1:<port>/v1/chat/completions.
+
+- JSON-mode requests (the task extractor) get a task built from the quiz page
+  text: the CSV link, the submission URL and the payload.
+- Solver requests follow a tool-call script (--script), picking the next
+  step from the conversation so far, and stop once a submission is accepted.
+- Every response waits --latency seconds; streamed responses are then sent in
+  small chunks, --token-delay seconds apart.
+
+Usage:
+    python benchmarks/mock_llm.py [--port 8701] [--latency 0.5] [--script sum_csv]
+"""
+import argparse
+import ast
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_CHARS = 24
+
+
+def _sum_code(filename: str) -> str:
+    source = f"urllib.request.urlopen({filename!r})" if filename.startswith("http") else f"open({filename!r}, 'rb')"
+    return (
+        "import csv, io, urllib.request\n"
+        f"data = {source}.read().decode()\n"
+        "total = sum(float(row['value']) for row in csv.DictReader(io.StringIO(data)))\n"
+        "print(int(total) if total.is_integer() else total)\n"
+    )
+
+
+def _head_code(filename: str) -> str:
+    return f"print(open({filename!r}).read()[:200])" if not filename.startswith("http") else "print('remote file')"
+
+
+# Each script is a list of solver turns; a turn is a list of (tool, arguments builder) pairs
+SCRIPTS = {
+    "sum_csv": [
+        [("run_code", lambda ctx: {"code": _sum_code(ctx["file"])})],
+        [("submit_answer", lambda ctx: ctx["submission"])],
+    ],
+    # Re-renders the page and inspects the file first, like a cautious agent
+    "explore": [
+        [("get_rendered_html", lambda ctx: {"url": ctx["quiz_url"]}),
+         ("run_code", lambda ctx: {"code": _head_code(ctx["file"])})],
+        [("run_code", lambda ctx: {"code": _sum_code(ctx["file"])})],
+        [("submit_answer", lambda ctx: ctx["submission"])],
+    ],
+}
+
+
+def extract_task(prompt: str) -> dict:
+    """The task extractor's answer for a mock quiz page."""
+    url = prompt.rsplit("SOURCE_URL:", 1)[-1].strip()
+    content = prompt.rsplit("QUIZ_CONTENT:", 1)[-1]
+    csv_url = re.search(r"https?://[^\s'\"\\)]+\.csv", content)
+    submit_url = re.search(r"https?://[^\s'\"\\]+/submit", content)
+    files = {}
+    if csv_url:
+        ids = re.search(r"/files/(\d+)/(\d+)\.csv", csv_url.group(0))
+        files["data_{}_{}.csv".format(*ids.groups()) if ids else "data.csv"] = csv_url.group(0)
+    return {
+        "task": "Sum the value column of the CSV file and submit the total.",
+        "files": files,
+        "quiz_url": url,
+        "submission_url": submit_url.group(0) if submit_url else "",
+        "payload": {"url": url, "email": "", "secret": "", "answer": "<sum>"},
+        "other": None,
+    }
+
+
+def _solver_context(messages: list) -> dict:
+    user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+    files = re.search(r"Required Files:\*\* (\[.*?\])", user)
+    files = ast.literal_eval(files.group(1)) if files else []
+    submission_url = re.search(r"Submission URL:\*\* (\S+)", user)
+    schema = re.search(r"```json\s*(.*?)\s*```", user, re.S)
+    try:
+        payload = ast.literal_eval(schema.group(1)) if schema else {}
+    except (ValueError, SyntaxError):
+        payload = json.loads(schema.group(1))
+    answer = None
+    for message in reversed(messages):
+        if message.get("role") == "tool":
+            stdout = re.search(r"'stdout': '([^']*)'", str(message.get("content")))
+            if stdout and stdout.group(1).strip("\\n").strip():
+                value = stdout.group(1).replace("\\n", "\n").strip().splitlines()[-1]
+                try:
+                    answer = float(value)
+                    answer = int(answer) if answer.is_integer() else answer
+                    break
+                except ValueError:
+                    continue
+    # Credentials come from the "My Credentials" part of the prompt, as for the real agent
+    for key in ("email", "secret"):
+        value = re.search(rf"{key.capitalize()}: (\S+)", user)
+        if value and key in payload:
+            payload[key] = value.group(1)
+    payload = dict(payload, answer=answer)
+    return {
+        "file": files[0] if files else "",
+        "quiz_url": payload.get("url", ""),
+        "submission": {
+            "submission_url": submission_url.group(1) if submission_url else "",
+            "payload": json.dumps(payload),
+        },
+    }
+
+
+def solver_turn(messages: list, script: list):
+    """The tool calls for the next solver turn, or None once the quiz is done."""
+    last = messages[-1]
+    if last.get("role") == "tool" and ("you can stop" in str(last.get("content")) or
+                                       last.get("content") == "Task completed"):
+        return None
+    turn = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+    if turn >= len(script):
+        turn = len(script) - 1  # a rejected answer is submitted again
+    ctx = _solver_context(messages)
+    return [
+        {"id": f"call_{turn}_{i}", "type": "function",
+         "function": {"name": name, "arguments": json.dumps(build(ctx))}}
+        for i, (name, build) in enumerate(script[turn])
+    ]
+
+
+def complete(request: dict, script: list) -> dict:
+    messages = request.get("messages", [])
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        message = {"role": "assistant", "content": json.dumps(extract_task(messages[0]["content"]))}
+    else:
+        tool_calls = solver_turn(messages, script)
+        message = {"role": "assistant", "content": "Working on it." if tool_calls else "Done."}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+    prompt_chars = sum(len(str(m.get("content") or "")) + len(json.dumps(m.get("tool_calls") or [])) for m in messages)
+    usage = {
+        "prompt_tokens": prompt_chars // 4,
+        "completion_tokens": len(json.dumps(message)) // 4,
+    }
+    return {"id": "mock", "object": "chat.completion", "model": request.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": usage}
+
+
+def stream_chunks(response: dict):
+    """Split a completion into SSE delta chunks the way OpenAI-compatible servers do."""
+    message = response["choices"][0]["message"]
+    content = message.get("content") or ""
+    for start in range(0, len(content), CHUNK_CHARS):
+        yield {"choices": [{"index": 0, "delta": {"content": content[start:start + CHUNK_CHARS]}}]}
+    for index, call in enumerate(message.get("tool_calls") or []):
+        yield {"choices": [{"index": 0, "delta": {"tool_calls": [
+            {"index": index, "id": call["id"], "type": "function",
+             "function": {"name": call["function"]["name"], "arguments": ""}}]}}]}
+        arguments = call["function"]["arguments"]
+        for start in range(0, len(arguments), CHUNK_CHARS):
+            yield {"choices": [{"index": 0, "delta": {"tool_calls": [
+                {"index": index, "function": {"arguments": arguments[start:start + CHUNK_CHARS]}}]}}]}
+    yield {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    yield {"choices": [], "usage": response["usage"]}
+
+
+class MockLLMState:
+    def __init__(self, latency: float, token_delay: float, script: str):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.script = SCRIPTS[script]
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+def make_handler(state: MockLLMState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            state.count()
+            response = complete(request, state.script)
+            time.sleep(state.latency)
+            if not request.get("stream"):
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in stream_chunks(response):
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                if state.token_delay:
+                    time.sleep(state.token_delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(port: int = 0, latency: float = 0.5, token_delay: float = 0.0, script: str = "sum_csv"):
+    """Start the server on a background thread. Returns ``(server, state)``."""
+    state = MockLLMState(latency, token_delay, script)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each response")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--script", choices=sorted(SCRIPTS), default="sum_csv")
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.latency, args.token_delay, args.script)
+    print(f"Mock LLM on http://127.0.0.1:{server.server_address[1]}/v1/chat/completions")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the quiz site, for offline benchmarks.
+
+Every chain is a sequence of quiz pages at /quiz/<chain>/<step>. The question
+is injected by JavaScript (like the real quizzes), so pages must be rendered.
+Each step links a CSV at /files/<chain>/<step>.csv and asks for the sum of its
+"value" column. POST /submit answers with {"correct", "reason", "url",
+"next_url"}; next_url is null after the last step.
+
+Usage:
+    python benchmarks/mock_quiz_server.py [--port 8700] [--steps 3] [--rows 1000]
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+def expected_answer(chain: int, step: int, rows: int) -> int:
+    return sum((i * 7 + chain + step) % 100 for i in range(rows))
+
+
+def csv_body(chain: int, step: int, rows: int) -> bytes:
+    lines = ["id,name,value"] + [f"{i},item-{i},{(i * 7 + chain + step) % 100}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+class QuizState:
+    def __init__(self, steps: int, rows: int, latency: float = 0.0):
+        self.steps = steps
+        self.rows = rows
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.submissions = 0
+        self.correct = 0
+
+    def record(self, correct: bool):
+        with self.lock:
+            self.submissions += 1
+            self.correct += int(correct)
+
+    def stats(self):
+        with self.lock:
+            return {"submissions": self.submissions, "correct": self.correct}
+
+
+def make_handler(state: QuizState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _base(self) -> str:
+            return f"http://{self.headers.get('Host')}"
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if state.latency:
+                threading.Event().wait(state.latency)
+            path = urlparse(self.path).path
+            quiz = re.fullmatch(r"/quiz/(\d+)/(\d+)", path)
+            data = re.fullmatch(r"/files/(\d+)/(\d+)\.csv", path)
+            if quiz:
+                chain, step = int(quiz.group(1)), int(quiz.group(2))
+                base = self._base()
+                question = (
+                    f"<h2>Q{step}. {base}/quiz/{chain}/{step}</h2>"
+                    f"<p>Download <a href='/files/{chain}/{step}.csv'>this file</a>. "
+                    f"What is the sum of the \"value\" column?</p>"
+                    f"<p>Post your answer to {base}/submit with this JSON payload:</p>"
+                    f"<pre>{{\"email\": \"your email\", \"secret\": \"your secret\", "
+                    f"\"url\": \"{base}/quiz/{chain}/{step}\", \"answer\": 12345}}</pre>"
+                )
+                encoded = base64.b64encode(question.encode()).decode()
+                html = (
+                    "<html><head><title>Quiz</title></head><body><div id='result'></div>"
+                    f"<script>document.querySelector('#result').innerHTML = atob('{encoded}');</script>"
+                    "</body></html>"
+                )
+                self._send(200, html.encode(), "text/html")
+            elif data:
+                self._send(200, csv_body(int(data.group(1)), int(data.group(2)), state.rows), "text/csv")
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/submit":
+                self._send(404, b"not found", "text/plain")
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                chain, step = map(int, re.search(r"/quiz/(\d+)/(\d+)", payload["url"]).groups())
+                answer = float(payload["answer"])
+            except Exception as e:
+                self._send(400, json.dumps({"error": f"Invalid submission: {e}"}).encode(), "application/json")
+                return
+            correct = answer == expected_answer(chain, step, state.rows)
+            state.record(correct)
+            next_url = f"{self._base()}/quiz/{chain}/{step + 1}" if step < state.steps else None
+            body = {
+                "correct": correct,
+                "reason": None if correct else "The sum is wrong",
+                "url": next_url,
+                "next_url": next_url,
+            }
+            self._send(200, json.dumps(body).encode(), "application/json")
+
+    return Handler
+
+
+def serve(port: int = 0, steps: int = 3, rows: int = 1000, latency: float = 0.0):
+    """Start the server on a background thread. Returns ``(server, state)``."""
+    state = QuizState(steps, rows, latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every GET")
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.steps, args.rows, args.latency)
+    print(f"Mock quiz server on http://127.0.0.1:{server.server_address[1]}/quiz/1/1")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dotenv import load_dotenv
+load_dotenv()
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+MAX_PAGES_PER_BROWSER = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+RENDER_TIMEOUT = float(os.getenv("BROWSER_RENDER_TIMEOUT", "120"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("BROWSER_HEALTH_CHECK_INTERVAL", "30"))
+# Launch attempts (with exponential backoff) before a worker gives up until its next job
+LAUNCH_RETRIES = int(os.getenv("BROWSER_LAUNCH_RETRIES", "3"))
+
+# Playwright's sync API is bound to the thread that started it, so every
+# browser lives on its own worker thread and pages are handed over via a queue.
+_driver_start_lock = threading.Lock()
+
+
+def _child_pids(pid: int) -> set:
+    pids = set()
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                pids.update(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+def _tree_rss_mb(pid: int) -> float:
+    """Resident memory of a process and all of its descendants, in MB (Linux only)."""
+    total_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+        stack.extend(_child_pids(current))
+    return total_kb / 1024
+
+
+class _BrowserWorker(threading.Thread):
+    def __init__(self, pool, index):
+        super().__init__(name=f"browser-worker-{index}", daemon=True)
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.driver_pid = None
+        self.pages_served = 0
+        self.recycles = 0
+        self.launch_failures = 0
+        self.last_error = None
+
+    def _launch(self):
+        # Imported here so importing the pool (e.g. from main) stays cheap
+        from playwright.sync_api import sync_playwright
+        with _driver_start_lock:
+            before = _child_pids(os.getpid())
+            self.playwright = sync_playwright().start()
+            new_pids = _child_pids(os.getpid()) - before
+        self.driver_pid = new_pids.pop() if len(new_pids) == 1 else None
+        self.browser = self.playwright.chromium.launch(headless=True)
+        self.pages_served = 0
+
+    def _launch_with_retries(self) -> bool:
+        for attempt in range(max(1, LAUNCH_RETRIES)):
+            try:
+                self._launch()
+                return True
+            except Exception as e:
+                print(f"{self.name}: failed to launch browser (attempt {attempt + 1}/{LAUNCH_RETRIES}): {e}")
+                self._close()
+                self.last_error = e
+                if attempt + 1 < LAUNCH_RETRIES:
+                    time.sleep(min(30, 2 ** attempt))
+        self.launch_failures += 1
+        return False
+
+    def _close(self):
+        for closer in (lambda: self.browser.close(), lambda: self.playwright.stop()):
+            try:
+                closer()
+            except Exception:
+                pass
+        self.browser = None
+        self.playwright = None
+        self.driver_pid = None
+
+    def rss_mb(self) -> float:
+        return _tree_rss_mb(self.driver_pid) if self.driver_pid else 0.0
+
+    def _healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    def _needs_recycle(self) -> bool:
+        if self.pages_served >= self.pool.max_pages:
+            return True
+        return self.pool.max_rss_mb > 0 and self.rss_mb() > self.pool.max_rss_mb
+
+    def _ensure_browser(self):
+        if self._healthy() and not self._needs_recycle():
+            return
+        if self.browser is not None:
+            print(f"{self.name}: recycling browser after {self.pages_served} pages ({self.rss_mb():.0f} MB)")
+            self.recycles += 1
+        self._close()
+        if not self._launch_with_retries():
+            self.pool.fail_queued(self.last_error)
+            raise RuntimeError(f"No browser could be launched: {self.last_error}")
+
+    def _render(self, url: str) -> str:
+        context = self.browser.new_context()
+        try:
+            page = context.new_page()
+            page.goto(url, wait_until="networkidle")
+            return page.content()
+        finally:
+            context.close()
+            self.pages_served += 1
+
+    def run(self):
+        if not self._launch_with_retries():
+            self.pool.fail_queued(self.last_error)
+        while True:
+            try:
+                job = self.pool.jobs.get(timeout=self.pool.health_check_interval)
+            except queue.Empty:
+                if self.browser is not None and not self._healthy():
+                    print(f"{self.name}: browser disconnected, relaunching")
+                    self._close()
+                    if not self._launch_with_retries():
+                        self.pool.fail_queued(self.last_error)
+                continue
+            if job is None:
+                break
+            url, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._ensure_browser()
+                future.set_result(self._render(url))
+            except Exception as e:
+                # A failed render may have taken the browser down with it.
+                if not self._healthy():
+                    self._close()
+                future.set_exception(e)
+        self._close()
+
+
+class BrowserPool:
+    """A fixed set of long-lived headless Chromium instances.
+
+    Each render gets a fresh browser context (isolated cookies/storage) on a
+    warm browser. Browsers are relaunched when they disconnect, after
+    ``max_pages`` renders, or when their process tree exceeds ``max_rss_mb``.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_pages=MAX_PAGES_PER_BROWSER,
+                 max_rss_mb=MAX_RSS_MB, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.health_check_interval = health_check_interval
+        self.jobs = queue.Queue()
+        self.workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.workers:
+                return
+            self.workers = [_BrowserWorker(self, i) for i in range(self.size)]
+            for worker in self.workers:
+                worker.start()
+
+    def fail_queued(self, error: Exception):
+        """Fail queued renders at once when no worker has a browser, instead of letting them time out."""
+        if any(w.browser is not None for w in self.workers):
+            return
+        sentinels = []
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                sentinels.append(job)
+            elif job[1].set_running_or_notify_cancel():
+                job[1].set_exception(RuntimeError(f"No browser could be launched: {error}"))
+        for sentinel in sentinels:
+            self.jobs.put(sentinel)
+
+    def submit(self, url: str) -> Future:
+        self.start()
+        future = Future()
+        self.jobs.put((url, future))
+        return future
+
+    def render(self, url: str, timeout: float = RENDER_TIMEOUT) -> str:
+        return self.submit(url).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "queued": self.jobs.qsize(),
+            "workers": [
+                {
+                    "name": w.name,
+                    "alive": w.is_alive(),
+                    "pages_served": w.pages_served,
+                    "recycles": w.recycles,
+                    "launch_failures": w.launch_failures,
+                    "rss_mb": round(w.rss_mb(), 1),
+                }
+                for w in self.workers
+            ],
+        }
+
+    def shutdown(self, timeout: float = 10):
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for _ in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=timeout)
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[1].cancel()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,166 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+load_dotenv()
+
+TASK_EXTRACTOR_TOKEN_BUDGET = int(os.getenv("TASK_EXTRACTOR_TOKEN_BUDGET", "30000"))
+MAX_URLS = int(os.getenv("COMPACTION_MAX_URLS", "60"))
+TABLE_RUN_MIN = 40      # consecutive data-like lines before a run is collapsed
+TABLE_KEEP_HEAD = 15
+TABLE_KEEP_TAIL = 5
+DATA_EXTENSIONS = (
+    ".csv", ".tsv", ".json", ".jsonl", ".txt", ".xml", ".pdf", ".xls", ".xlsx", ".parquet",
+    ".zip", ".gz", ".mp3", ".wav", ".opus", ".ogg", ".m4a", ".flac", ".png", ".jpg", ".jpeg",
+    ".gif", ".webp", ".svg",
+)
+STATIC_EXTENSIONS = (".js", ".mjs", ".css", ".woff", ".woff2", ".ttf", ".ico", ".map")
+_DATA_LINE = re.compile(r"^[\s\d.,:;%$€£+\-/()|]*$|^\S{1,30}$")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # tiktoken is optional (and needs its BPE file); fall back to ~4 chars/token
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def dedupe_lines(lines: List[str]) -> List[str]:
+    """Drop repeats of long, non-data lines (navigation, footers, cookie banners)."""
+    counts = Counter(lines)
+    seen = set()
+    result = []
+    for line in lines:
+        if counts[line] > 1 and len(line) > 20 and not _DATA_LINE.match(line):
+            if line in seen:
+                continue
+            seen.add(line)
+        result.append(line)
+    return result
+
+
+def _shape(line: str) -> str:
+    return re.sub(r"\d+", "0", line)
+
+
+def collapse_tables(lines: List[str]) -> List[str]:
+    """Collapse long runs of table cells into their head and tail. The data itself is in the downloaded files."""
+    # Cells are short numeric-ish lines, or lines whose shape (digits masked) repeats row after row
+    shapes = Counter(_shape(line) for line in lines)
+    result = []
+    run = []
+
+    def flush():
+        if len(run) >= TABLE_RUN_MIN:
+            omitted = len(run) - TABLE_KEEP_HEAD - TABLE_KEEP_TAIL
+            result.extend(run[:TABLE_KEEP_HEAD])
+            result.append(f"... [{omitted} similar table lines omitted] ...")
+            result.extend(run[-TABLE_KEEP_TAIL:])
+        else:
+            result.extend(run)
+        run.clear()
+
+    for line in lines:
+        if (len(line) <= 40 and _DATA_LINE.match(line)) or shapes[_shape(line)] >= TABLE_RUN_MIN:
+            run.append(line)
+        else:
+            flush()
+            result.append(line)
+    flush()
+    return result
+
+
+def rank_urls(urls: List[str], text: str, page_url: str) -> List[str]:
+    """Order URLs by how likely they are to matter for the task."""
+    page_host = urlparse(page_url).netloc
+
+    def score(url):
+        parsed = urlparse(url)
+        path = parsed.path.lower()
+        value = 0
+        if path.endswith(DATA_EXTENSIONS):
+            value += 5
+        if path.endswith(STATIC_EXTENSIONS):
+            value -= 5
+        if url in text:
+            value += 3
+        if parsed.netloc == page_host:
+            value += 1
+        if parsed.scheme not in ("http", "https"):
+            value -= 2
+        return value
+
+    return sorted(urls, key=lambda u: (-score(u), u))
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Keep the head and the tail of the text (instructions tend to be at both ends)."""
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return text
+    chars = int(len(text) * budget / tokens * 0.95)
+    head = int(chars * 0.7)
+    tail = chars - head
+    return text[:head] + "\n... [TRUNCATED to fit the token budget] ...\n" + (text[-tail:] if tail > 0 else "")
+
+
+def compact_content(content: Dict[str, Any], budget: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Shrink a scraper result so that ``str(content)`` fits in ``budget`` tokens.
+
+    Steps are applied in order and only while the content is still over budget:
+    dedupe boilerplate lines, collapse tables, keep the most relevant URLs,
+    then truncate the text.
+
+    Returns:
+        tuple: The compacted content and a report with before/after token counts.
+    """
+    before = count_tokens(str(content))
+    report = {"tokens_before": before, "tokens_after": before, "budget": budget, "steps": []}
+    if before <= budget or not isinstance(content, dict) or "text" not in content:
+        return content, report
+
+    content = dict(content)
+    lines = content["text"].split("\n")
+    for step, transform in (("dedupe_lines", dedupe_lines), ("collapse_tables", collapse_tables)):
+        new_lines = transform(lines)
+        if len(new_lines) != len(lines):
+            lines = new_lines
+            content["text"] = "\n".join(lines)
+            report["steps"].append(step)
+        if count_tokens(str(content)) <= budget:
+            break
+
+    files = content.get("files") or []
+    if count_tokens(str(content)) > budget and len(files) > MAX_URLS:
+        content["files"] = rank_urls(files, content["text"], content.get("url", ""))[:MAX_URLS]
+        report["steps"].append("rank_urls")
+
+    if count_tokens(str(content)) > budget:
+        # repr() escapes newlines and quotes, so the text costs more inside the prompt than on its own
+        other = count_tokens(str({**content, "text": ""}))
+        ratio = count_tokens(repr(content["text"])) / max(1, count_tokens(content["text"]))
+        content["text"] = truncate_to_budget(content["text"], max(0, int((budget - other) / ratio)))
+        report["steps"].append("truncate")
+
+    report["tokens_after"] = count_tokens(str(content))
+    return content, report
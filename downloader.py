@@ -0,0 +1,757 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+import httpx
+import requests
+from telemetry import span, counter, histogram, bind_context
+from dotenv import load_dotenv
+load_dotenv()
+
+# Shared by all chains and kernels (kernel_pool.KERNEL_WORKDIR): not namespaced per quiz
+DOWNLOAD_DIR = "LLMFiles"
+CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.join(".cache", "downloads"))
+CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+# Entries fetched this recently are served without revalidating, so files
+# prefetched speculatively are reused without another round trip.
+CACHE_FRESH_SECONDS = float(os.getenv("DOWNLOAD_CACHE_FRESH_SECONDS", "300"))
+# Hard cap per file: larger downloads are refused (by HEAD, Content-Length or while streaming)
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(100 * 1024 ** 2)))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "10"))
+# Longest silence between two chunks, and longest a whole transfer may take
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "60"))
+DOWNLOAD_DEADLINE_SECONDS = float(os.getenv("DOWNLOAD_DEADLINE_SECONDS", "120"))
+# Interrupted transfers are resumed with a Range request this many times
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "2"))
+DOWNLOAD_HEAD_PROBE = os.getenv("DOWNLOAD_HEAD_PROBE", "1") == "1"
+CHUNK_SIZE = 1024 ** 2
+WRITE_BUFFER = 4 * 1024 ** 2
+TEXT_EXTENSIONS = (".csv", ".tsv", ".txt", ".jsonl", ".ndjson", ".log", ".md")
+
+DOWNLOADS = counter("downloads_total", "download_file calls by outcome", ("status",))
+DOWNLOAD_BYTES = counter("download_bytes_total", "Bytes of files materialized into LLMFiles")
+DOWNLOAD_NETWORK_BYTES = counter("download_network_bytes_total", "Bytes received from the network by downloads")
+DOWNLOAD_THROUGHPUT = histogram("download_throughput_bytes_per_second", "Throughput of each network download",
+                                buckets=(1e4, 1e5, 1e6, 1e7, 3e7, 1e8, 3e8, 1e9))
+_TIMEOUT = (DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+_RETRYABLE = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class FileTooLarge(Exception):
+    def __init__(self, url: str, size: int, limit: int):
+        super().__init__(f"{size} bytes is over the {limit} byte download limit; "
+                         f"pass head_bytes to download_file to fetch only the start of it")
+        self.url = url
+        self.size = size
+        self.limit = limit
+
+
+class DownloadDeadline(Exception):
+    pass
+
+
+class DownloadAborted(Exception):
+    pass
+
+
+class InvalidHeadBytes(ValueError):
+    pass
+
+
+def _head_bytes(head_bytes: Any) -> Optional[int]:
+    """``head_bytes`` as a byte count capped at DOWNLOAD_MAX_BYTES; None means the whole file."""
+    if head_bytes is None:
+        return None
+    try:
+        count = int(head_bytes)
+    except (TypeError, ValueError):
+        count = 0
+    if count <= 0:
+        raise InvalidHeadBytes(f"head_bytes must be a positive integer, got {head_bytes!r}")
+    return min(count, DOWNLOAD_MAX_BYTES)
+
+
+class DownloadCache:
+    """Content-addressed on-disk cache for downloaded files.
+
+    Bodies are stored once per SHA-256 digest under ``blobs/``; an SQLite index
+    maps each URL to its digest plus the ETag/Last-Modified validators used for
+    conditional GETs. SQLite keeps the index consistent across threads and
+    processes. When the blobs exceed ``max_bytes`` the least recently used URLs
+    are evicted.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 fresh_seconds: float = CACHE_FRESH_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.index_path = os.path.join(root, "index.sqlite")
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.index_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        if not os.path.exists(self._blob_path(entry["digest"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return bool(entry) and time.time() - entry["fetched_at"] < self.fresh_seconds
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url: str):
+        with self._connect() as db:
+            db.execute("UPDATE entries SET last_used = ? WHERE url = ?", (time.time(), url))
+
+    def writer(self) -> "_BlobWriter":
+        return _BlobWriter(self)
+
+    def commit(self, url: str, tmp_path: str, digest: str, size: int,
+               etag: Optional[str], last_modified: Optional[str]) -> Dict[str, Any]:
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+        now = time.time()
+        entry = {
+            "url": url, "digest": digest, "size": size, "etag": etag,
+            "last_modified": last_modified, "fetched_at": now, "last_used": now,
+        }
+        with self._connect() as db:
+            db.execute("""
+                INSERT OR REPLACE INTO entries (url, digest, size, etag, last_modified, fetched_at, last_used)
+                VALUES (:url, :digest, :size, :etag, :last_modified, :fetched_at, :last_used)
+            """, entry)
+        self.evict()
+        return entry
+
+    def materialize(self, entry: Dict[str, Any], path: str):
+        # Copy rather than hard link: the agent's code may edit files in LLMFiles
+        shutil.copyfile(self._blob_path(entry["digest"]), path)
+
+    def total_bytes(self) -> int:
+        with self._connect() as db:
+            row = db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)").fetchone()
+        return row[0]
+
+    def evict(self):
+        with self.lock, self._connect() as db:
+            total = db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+            ).fetchone()[0]
+            while total > self.max_bytes:
+                row = db.execute("SELECT url, digest, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+                if row is None:
+                    break
+                db.execute("DELETE FROM entries WHERE url = ?", (row["url"],))
+                still_used = db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (row["digest"],)).fetchone()
+                if not still_used:
+                    try:
+                        os.remove(self._blob_path(row["digest"]))
+                    except FileNotFoundError:
+                        pass
+                    total -= row["size"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as db:
+            entries = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+        }
+
+
+class _BlobWriter:
+    """Streams a response body into the cache's tmp dir while hashing it."""
+
+    def __init__(self, cache: DownloadCache):
+        self.cache = cache
+        fd, self.path = tempfile.mkstemp(dir=cache.tmp_dir)
+        # Large buffer: a multi-MB chunk goes to disk in one write
+        self.file = os.fdopen(fd, "wb", buffering=WRITE_BUFFER)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self, url: str, headers) -> Dict[str, Any]:
+        self.file.close()
+        return self.cache.commit(url, self.path, self.hasher.hexdigest(), self.size,
+                                 headers.get("etag"), headers.get("last-modified"))
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> DownloadCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DownloadCache()
+        return _cache
+
+
+def _target_path(filename: str) -> str:
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    path = os.path.join(DOWNLOAD_DIR, filename)
+    parent_directory = os.path.dirname(path)
+    if parent_directory and not os.path.isdir(parent_directory):
+        os.makedirs(parent_directory, exist_ok=True)
+    return path
+
+
+# One fetch per URL at a time: a second caller waits for the first instead of
+# downloading the same file again (e.g. a speculative prefetch still running).
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _claim(url: str):
+    with _inflight_lock:
+        future = _inflight.get(url)
+        if future is not None:
+            return future, False
+        future = _inflight[url] = Future()
+        return future, True
+
+
+def _release(url: str, future: Future, entry=None, error=None):
+    with _inflight_lock:
+        if _inflight.get(url) is future:
+            del _inflight[url]
+    if future.done():
+        return
+    if isinstance(error, Exception):
+        future.set_exception(error)
+    elif error is not None:
+        # The owner was cancelled (or interrupted): waiters fetch the URL themselves
+        future.set_exception(DownloadAborted(f"download of {url} was abandoned"))
+    else:
+        future.set_result(entry)
+
+
+def _wait_seconds() -> float:
+    # The owner's transfer is bounded by the deadline; allow one more read timeout on top
+    return DOWNLOAD_DEADLINE_SECONDS + DOWNLOAD_READ_TIMEOUT
+
+
+def _describe(headers) -> Dict[str, Any]:
+    size = headers.get("content-length")
+    return {
+        "size": int(size) if size and size.isdigit() else None,
+        "accept_ranges": headers.get("accept-ranges", "").lower() == "bytes",
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "content_type": headers.get("content-type"),
+    }
+
+
+def probe(url: str) -> Dict[str, Any]:
+    """HEAD ``url`` for its size, Range support and validators; {} if the server won't say."""
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=_TIMEOUT)
+    except requests.RequestException:
+        return {}
+    return _describe(response.headers) if response.status_code < 400 else {}
+
+
+async def aprobe(url: str) -> Dict[str, Any]:
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=_httpx_timeout()) as client:
+            response = await client.head(url)
+    except httpx.HTTPError:
+        return {}
+    return _describe(response.headers) if response.status_code < 400 else {}
+
+
+def _httpx_timeout() -> httpx.Timeout:
+    return httpx.Timeout(DOWNLOAD_READ_TIMEOUT, connect=DOWNLOAD_CONNECT_TIMEOUT)
+
+
+def _check_size(url: str, size: Optional[int], max_bytes: int):
+    if size is not None and size > max_bytes:
+        raise FileTooLarge(url, size, max_bytes)
+
+
+def _body_size(status: int, headers) -> Optional[int]:
+    # For a 206 the full size is after the slash in "Content-Range: bytes 100-199/5000"
+    if status == 206:
+        total = (headers.get("content-range") or "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    return _describe(headers)["size"]
+
+
+class _Transfer:
+    """One URL being downloaded into the cache.
+
+    Enforces the byte cap and the deadline, remembers how far the body got so
+    an interrupted transfer continues with a Range request, and measures
+    throughput.
+    """
+
+    def __init__(self, cache: DownloadCache, url: str, max_bytes: int):
+        self.cache = cache
+        self.url = url
+        self.max_bytes = max_bytes
+        self.writer = None
+        self.validator = None
+        self.resumable = False
+        self.received = 0
+        self.resumes = 0
+        self.started = time.perf_counter()
+
+    @property
+    def offset(self) -> int:
+        return self.writer.size if self.writer is not None else 0
+
+    def can_resume(self) -> bool:
+        return self.resumable and self.offset > 0
+
+    def headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        if not self.can_resume():
+            return self.cache.conditional_headers(entry)
+        headers = {"Range": f"bytes={self.offset}-"}
+        if self.validator:
+            # The server sends the whole body again if it changed since the first attempt
+            headers["If-Range"] = self.validator
+        return headers
+
+    def begin(self, status: int, headers):
+        if status == 206 and self.can_resume():
+            self.resumes += 1
+        else:
+            self.discard()
+            self.writer = self.cache.writer()
+            self.validator = headers.get("etag") or headers.get("last-modified")
+            self.resumable = headers.get("accept-ranges", "").lower() == "bytes"
+        _check_size(self.url, _body_size(status, headers), self.max_bytes)
+
+    def write(self, chunk: bytes):
+        self.writer.write(chunk)
+        self.received += len(chunk)
+        if self.writer.size > self.max_bytes:
+            raise FileTooLarge(self.url, self.writer.size, self.max_bytes)
+        _check_deadline(self.started)
+
+    def commit(self, headers) -> Dict[str, Any]:
+        self.cache.misses += 1
+        entry = self.writer.commit(self.url, headers)
+        self.writer = None
+        seconds = time.perf_counter() - self.started
+        rate = self.received / seconds if seconds > 0 else 0.0
+        DOWNLOAD_NETWORK_BYTES.inc(self.received)
+        DOWNLOAD_THROUGHPUT.observe(rate)
+        entry["transfer"] = {
+            "network_bytes": self.received, "seconds": round(seconds, 3),
+            "bytes_per_second": round(rate), "resumes": self.resumes,
+        }
+        return entry
+
+    def discard(self):
+        if self.writer is not None:
+            self.writer.discard()
+            self.writer = None
+
+    def interrupted(self, attempt: int, error: Exception):
+        if attempt >= DOWNLOAD_RETRIES:
+            self.discard()
+            raise error
+        if not self.can_resume():
+            self.discard()
+        where = f"resuming at byte {self.offset}" if self.can_resume() else "restarting"
+        print(f"Download of {self.url} interrupted ({type(error).__name__}: {error}), {where}")
+
+
+def _fetch(url: str) -> Dict[str, Any]:
+    cache = get_cache()
+    entry = cache.lookup(url)
+    if cache.is_fresh(entry):
+        cache.hits += 1
+        cache.touch(url)
+        return entry
+    if DOWNLOAD_HEAD_PROBE and entry is None:
+        _check_size(url, probe(url).get("size"), DOWNLOAD_MAX_BYTES)
+    transfer = _Transfer(cache, url, DOWNLOAD_MAX_BYTES)
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with requests.get(url, stream=True, headers=transfer.headers(entry), timeout=_TIMEOUT) as response:
+                if response.status_code == 304 and entry:
+                    cache.revalidated += 1
+                    cache.touch(url)
+                    return entry
+                if response.status_code == 416:
+                    # The partial body is no longer valid for this URL, start over
+                    transfer.discard()
+                    continue
+                response.raise_for_status()
+                transfer.begin(response.status_code, response.headers)
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        transfer.write(chunk)
+                return transfer.commit(response.headers)
+        except _RETRYABLE as e:
+            transfer.interrupted(attempt, e)
+        except Exception:
+            transfer.discard()
+            raise
+    raise requests.HTTPError(f"Could not download {url}")
+
+
+async def _afetch(url: str) -> Dict[str, Any]:
+    # SQLite, hashing and disk writes run in threads so other chains keep the event loop
+    cache = get_cache()
+    entry = await asyncio.to_thread(cache.lookup, url)
+    if cache.is_fresh(entry):
+        cache.hits += 1
+        await asyncio.to_thread(cache.touch, url)
+        return entry
+    if DOWNLOAD_HEAD_PROBE and entry is None:
+        _check_size(url, (await aprobe(url)).get("size"), DOWNLOAD_MAX_BYTES)
+    transfer = _Transfer(cache, url, DOWNLOAD_MAX_BYTES)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=_httpx_timeout()) as client:
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                async with client.stream("GET", url, headers=transfer.headers(entry)) as response:
+                    if response.status_code == 304 and entry:
+                        cache.revalidated += 1
+                        await asyncio.to_thread(cache.touch, url)
+                        return entry
+                    if response.status_code == 416:
+                        await asyncio.to_thread(transfer.discard)
+                        continue
+                    response.raise_for_status()
+                    await asyncio.to_thread(transfer.begin, response.status_code, response.headers)
+                    async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            await asyncio.to_thread(transfer.write, chunk)
+                    return await asyncio.to_thread(transfer.commit, response.headers)
+            except httpx.TransportError as e:
+                await asyncio.to_thread(transfer.interrupted, attempt, e)
+            except Exception:
+                await asyncio.to_thread(transfer.discard)
+                raise
+    raise httpx.HTTPError(f"Could not download {url}")
+
+
+def _range_headers(start: int, end: Optional[int]) -> Dict[str, str]:
+    return {"Range": f"bytes={start}-{'' if end is None else end}"}
+
+
+def _range_limit(start: int, end: Optional[int], max_bytes: Optional[int]) -> int:
+    max_bytes = max_bytes or DOWNLOAD_MAX_BYTES
+    return min(max_bytes, end - start + 1) if end is not None else max_bytes
+
+
+def _check_deadline(started: float):
+    if time.perf_counter() - started > DOWNLOAD_DEADLINE_SECONDS:
+        raise DownloadDeadline(f"download took longer than {DOWNLOAD_DEADLINE_SECONDS:g}s")
+
+
+def _skip(chunk: bytes, skip: int):
+    # Servers that ignore Range send the body from byte 0
+    drop = min(skip, len(chunk))
+    return chunk[drop:], skip - drop
+
+
+def fetch_range(url: str, start: int = 0, end: Optional[int] = None, max_bytes: Optional[int] = None) -> bytes:
+    """Bytes ``start``..``end`` (inclusive) of ``url`` via a Range request, without downloading the rest."""
+    limit = _range_limit(start, end, max_bytes)
+    body = bytearray()
+    started = time.perf_counter()
+    with requests.get(url, stream=True, headers=_range_headers(start, end), timeout=_TIMEOUT) as response:
+        response.raise_for_status()
+        skip = start if response.status_code == 200 else 0
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            chunk, skip = _skip(chunk, skip)
+            body += chunk
+            if len(body) >= limit:
+                break
+            _check_deadline(started)
+    DOWNLOAD_NETWORK_BYTES.inc(len(body))
+    return bytes(body[:limit])
+
+
+async def afetch_range(url: str, start: int = 0, end: Optional[int] = None,
+                       max_bytes: Optional[int] = None) -> bytes:
+    limit = _range_limit(start, end, max_bytes)
+    body = bytearray()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(follow_redirects=True, timeout=_httpx_timeout()) as client:
+        async with client.stream("GET", url, headers=_range_headers(start, end)) as response:
+            response.raise_for_status()
+            skip = start if response.status_code == 200 else 0
+            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                chunk, skip = _skip(chunk, skip)
+                body += chunk
+                if len(body) >= limit:
+                    break
+                _check_deadline(started)
+    DOWNLOAD_NETWORK_BYTES.inc(len(body))
+    return bytes(body[:limit])
+
+
+def _write_head(path: str, filename: str, data: bytes) -> int:
+    # Cut text files at the last complete line so the sample still parses
+    if filename.lower().endswith(TEXT_EXTENSIONS) and b"\n" in data:
+        data = data[:data.rindex(b"\n") + 1]
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def fetch(url: str) -> Dict[str, Any]:
+    """Make sure ``url`` is in the download cache and return its cache entry."""
+    while True:
+        future, owner = _claim(url)
+        if owner:
+            break
+        try:
+            return future.result(timeout=_wait_seconds())
+        except DownloadAborted:
+            continue
+    entry = error = None
+    try:
+        entry = _fetch(url)
+        return entry
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        # Always resolve the future, even on cancellation, or later callers wait forever
+        _release(url, future, entry, error)
+
+
+async def afetch(url: str) -> Dict[str, Any]:
+    while True:
+        future, owner = _claim(url)
+        if owner:
+            break
+        try:
+            # Shielded: a cancelled waiter must not cancel the owner's shared future
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), _wait_seconds())
+        except DownloadAborted:
+            continue
+    entry = error = None
+    try:
+        entry = await _afetch(url)
+        return entry
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _release(url, future, entry, error)
+
+
+def _record_download(s, entry: Dict[str, Any]):
+    DOWNLOADS.inc(status="ok")
+    DOWNLOAD_BYTES.inc(entry.get("size") or 0)
+    s.set(bytes=entry.get("size"), **entry.get("transfer", {}))
+
+
+def _materialize(url: str, entry: Dict[str, Any], path: str) -> Dict[str, Any]:
+    try:
+        get_cache().materialize(entry, path)
+        return entry
+    except FileNotFoundError:
+        # Evicted (possibly by another worker) between the lookup and the copy
+        print(f"Cached copy of {url} was evicted, downloading it again")
+        entry = fetch(url)
+        get_cache().materialize(entry, path)
+        return entry
+
+
+async def _amaterialize(url: str, entry: Dict[str, Any], path: str) -> Dict[str, Any]:
+    try:
+        await asyncio.to_thread(get_cache().materialize, entry, path)
+        return entry
+    except FileNotFoundError:
+        print(f"Cached copy of {url} was evicted, downloading it again")
+        entry = await afetch(url)
+        await asyncio.to_thread(get_cache().materialize, entry, path)
+        return entry
+
+
+def _failed(s, url: str, e: Exception) -> str:
+    s.set(error=str(e))
+    if isinstance(e, FileTooLarge):
+        DOWNLOADS.inc(status="too_large")
+        return f"{url} (not downloaded: {e})"
+    if isinstance(e, InvalidHeadBytes):
+        DOWNLOADS.inc(status="invalid")
+        return f"{url} (not downloaded: {e})"
+    DOWNLOADS.inc(status="failed")
+    return url
+
+
+def download_file(url: str, filename: str, head_bytes: int = None) -> str:
+    """
+    Download a file from a URL and save it with the given filename
+    in the LLMFiles directory. Repeat downloads are served from the
+    download cache after a conditional GET. Files over DOWNLOAD_MAX_BYTES
+    are refused.
+
+    Args:
+        url (str): Direct URL to the file.
+        filename (str): The filename to save the downloaded content as.
+        head_bytes (int): Only fetch the first head_bytes bytes (a Range
+            request; text files are cut at the last full line). Must be
+            positive; capped at DOWNLOAD_MAX_BYTES.
+
+    Returns:
+        str: The saved filename, or the URL (with the reason when the file
+        is too large) if the download failed.
+    """
+    with span("download_file", url=url, filename=filename, head_bytes=head_bytes) as s:
+        try:
+            head = _head_bytes(head_bytes)
+            path = _target_path(filename)
+            print("Path: ", path)
+            if head:
+                size = _write_head(path, filename, fetch_range(url, 0, head - 1))
+                DOWNLOADS.inc(status="partial")
+                s.set(bytes=size)
+                return filename
+            entry = _materialize(url, fetch(url), path)
+            _record_download(s, entry)
+            return filename
+        except Exception as e:
+            return _failed(s, url, e)
+
+
+async def adownload_file(url: str, filename: str, head_bytes: int = None) -> str:
+    """
+    Async variant of `download_file`, sharing the same cache.
+
+    Returns:
+        str: The saved filename, or the URL if the download failed.
+    """
+    with span("download_file", url=url, filename=filename, head_bytes=head_bytes) as s:
+        try:
+            head = _head_bytes(head_bytes)
+            path = await asyncio.to_thread(_target_path, filename)
+            print("Path: ", path)
+            if head:
+                data = await afetch_range(url, 0, head - 1)
+                size = await asyncio.to_thread(_write_head, path, filename, data)
+                DOWNLOADS.inc(status="partial")
+                s.set(bytes=size)
+                return filename
+            entry = await _amaterialize(url, await afetch(url), path)
+            _record_download(s, entry)
+            return filename
+        except Exception as e:
+            return _failed(s, url, e)
+
+
+def prefetch_files(files: Dict[str, str], workers: int = DOWNLOAD_WORKERS) -> List[str]:
+    """Download ``{filename: url}`` concurrently, returning results in input order."""
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download") as pool:
+        # Each download keeps the caller's trace context
+        calls = [(bind_context(download_file), filename, url) for filename, url in files.items()]
+        return list(pool.map(lambda call: call[0](url=call[2], filename=call[1]), calls))
+
+
+async def aprefetch_files(files: Dict[str, str], workers: int = DOWNLOAD_WORKERS) -> List[str]:
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def fetch(filename, url):
+        async with semaphore:
+            return await adownload_file(url=url, filename=filename)
+
+    return list(await asyncio.gather(*(fetch(f, u) for f, u in files.items())))
+
+
+def warm_cache(urls: List[str], workers: int = DOWNLOAD_WORKERS) -> int:
+    """Fetch ``urls`` into the cache only (nothing is written to LLMFiles). Returns how many succeeded."""
+    def try_fetch(url):
+        try:
+            fetch(url)
+            return True
+        except Exception:
+            return False
+
+    if not urls:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch") as pool:
+        return sum(pool.map(try_fetch, urls))
+
+
+async def awarm_cache(urls: List[str], workers: int = DOWNLOAD_WORKERS) -> int:
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def try_fetch(url):
+        async with semaphore:
+            try:
+                await afetch(url)
+                return True
+            except Exception:
+                return False
+
+    return sum(await asyncio.gather(*(try_fetch(u) for u in urls)))
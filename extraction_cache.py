@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from telemetry import counter
+from dotenv import load_dotenv
+load_dotenv()
+
+# Task extractor results (QuestionTemplate dicts) keyed on the model, the prompt
+# version and the normalized page, so re-visiting an unchanged quiz page skips the LLM call.
+EXTRACTION_CACHE = os.getenv("EXTRACTION_CACHE", "1") == "1"
+# Ignore cached entries but still store fresh results (e.g. after fixing a bad extraction)
+EXTRACTION_CACHE_BYPASS = os.getenv("EXTRACTION_CACHE_BYPASS", "0") == "1"
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB", os.path.join(".cache", "extractions.sqlite"))
+EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "256"))
+
+EXTRACTION_LOOKUPS = counter("extraction_cache_lookups_total", "Task extraction cache lookups by result", ("result",))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_content(content: Any) -> str:
+    """Canonical form of a scraped page: whitespace collapsed, links sorted."""
+    if not isinstance(content, dict):
+        return _WHITESPACE.sub(" ", str(content)).strip()
+    return json.dumps({
+        "url": content.get("url", ""),
+        "text": _WHITESPACE.sub(" ", content.get("text") or "").strip(),
+        "files": sorted(content.get("files") or []),
+    }, sort_keys=True)
+
+
+def extraction_key(model: str, prompt_version: str, content: Any, url: str) -> str:
+    digest = hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_version}\0{url}\0{digest}".encode("utf-8")).hexdigest()
+
+
+def cacheable(content: Any) -> bool:
+    # Failed renders are retried on the next visit, never cached
+    return not (isinstance(content, dict) and content.get("error"))
+
+
+class ExtractionCache:
+    """Two-level cache of task extractions: an in-process LRU in front of an SQLite file.
+
+    The SQLite layer survives restarts and is shared by worker processes.
+    Entries expire after ``ttl`` seconds; beyond ``max_entries`` the least
+    recently used rows are dropped.
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_DB, ttl: float = EXTRACTION_CACHE_TTL,
+                 max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EXTRACTION_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.lock = threading.Lock()
+        # key -> (expires, JSON text); JSON so callers never share a mutable dict
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS extractions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _remember(self, key: str, expires: float, value: str):
+        with self.lock:
+            self.memory[key] = (expires, value)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is not None and cached[0] <= now:
+                del self.memory[key]
+                cached = None
+            if cached is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+        if cached is not None:
+            EXTRACTION_LOOKUPS.inc(result="memory")
+            return json.loads(cached[1])
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value, created FROM extractions WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (now, key))
+        if row is None:
+            with self.lock:
+                self.misses += 1
+            EXTRACTION_LOOKUPS.inc(result="miss")
+            return None
+        self._remember(key, row[1] + self.ttl, row[0])
+        with self.lock:
+            self.hits += 1
+        EXTRACTION_LOOKUPS.inc(result="disk")
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        text = json.dumps(value)
+        self._remember(key, now + self.ttl, text)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?)", (key, text, now, now))
+            db.execute("DELETE FROM extractions WHERE created <= ?", (now - self.ttl,))
+            db.execute("""
+                DELETE FROM extractions WHERE key IN (
+                    SELECT key FROM extractions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        with self._connect() as db:
+            db.execute("DELETE FROM extractions")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as db:
+            entries = db.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        with self.lock:
+            return {"entries": entries, "memory_entries": len(self.memory), "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
+
+
+def lookup(key: str, content: Any) -> Optional[Dict[str, Any]]:
+    """The cached extraction for ``key``, or None when disabled, bypassed or missing."""
+    if not EXTRACTION_CACHE or not cacheable(content):
+        return None
+    if EXTRACTION_CACHE_BYPASS:
+        EXTRACTION_LOOKUPS.inc(result="bypass")
+        return None
+    return get_extraction_cache().get(key)
+
+
+def store(key: str, content: Any, task_metadata: Dict[str, Any]):
+    if EXTRACTION_CACHE and cacheable(content) and isinstance(task_metadata, dict):
+        get_extraction_cache().put(key, task_metadata)
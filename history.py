@@ -0,0 +1,83 @@
+import json
+import os
+from typing import Dict, Any, List
+from compaction import count_tokens
+from dotenv import load_dotenv
+load_dotenv()
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("SOLVER_HISTORY_TOKEN_BUDGET", "60000"))
+KEEP_RECENT_TOOL_RESULTS = int(os.getenv("SOLVER_KEEP_RECENT_TOOL_RESULTS", "4"))
+# When over budget, prune down to this fraction so the next few turns send an unchanged prefix
+LOW_WATERMARK = 0.7
+KEEP_HEAD_CHARS = 1200
+KEEP_TAIL_CHARS = 400
+
+
+def _message_tokens(message: Dict[str, Any]) -> int:
+    tokens = 4  # role and framing
+    if message.get("content"):
+        tokens += count_tokens(str(message["content"]))
+    if message.get("tool_calls"):
+        tokens += count_tokens(json.dumps(message["tool_calls"]))
+    return tokens
+
+
+def _shorten(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = str(message.get("content") or "")
+    if len(content) <= KEEP_HEAD_CHARS + KEEP_TAIL_CHARS:
+        return message
+    removed = len(content) - KEEP_HEAD_CHARS - KEEP_TAIL_CHARS
+    shortened = dict(message)
+    shortened["content"] = (
+        content[:KEEP_HEAD_CHARS]
+        + f"\n... [{removed} characters of this earlier tool output were removed to save context; re-run the tool if you need them] ...\n"
+        + content[-KEEP_TAIL_CHARS:]
+    )
+    return shortened
+
+
+class HistoryManager:
+    """Builds the message list sent on each solver turn from the agent's full history.
+
+    The system prompt and task come first and are never changed, so with the
+    constant tool schema they form a stable prefix for provider-side prompt
+    caching. Once the history exceeds ``budget`` tokens, the oldest tool outputs
+    (except the ``keep_recent`` newest) are cut to their head and tail. A cut is
+    permanent, so later turns resend exactly the same shortened prefix.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, keep_recent: int = KEEP_RECENT_TOOL_RESULTS):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.shortened = {}
+        self._token_cache = {}
+        self.turn_tokens = []
+
+    def _tokens(self, index: int, message: Dict[str, Any]) -> int:
+        key = (index, id(message))
+        if key not in self._token_cache:
+            self._token_cache[key] = _message_tokens(message)
+        return self._token_cache[key]
+
+    def build(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        view = [self.shortened.get(i, m) for i, m in enumerate(messages)]
+        total = sum(self._tokens(i, m) for i, m in enumerate(view))
+        full = sum(self._tokens(i, m) for i, m in enumerate(messages))
+        if total > self.budget:
+            tool_indices = [i for i, m in enumerate(messages) if m.get("role") == "tool"]
+            old = tool_indices[:-self.keep_recent] if self.keep_recent else tool_indices
+            target = self.budget * LOW_WATERMARK
+            for i in old:
+                if total <= target:
+                    break
+                if i in self.shortened:
+                    continue
+                shortened = _shorten(messages[i])
+                if shortened is messages[i]:
+                    continue
+                self.shortened[i] = view[i] = shortened
+                total += self._tokens(i, shortened) - self._tokens(i, messages[i])
+        self.turn_tokens.append(total)
+        print(f"Turn {len(self.turn_tokens)}: sending {total} tokens"
+              + (f" ({full - total} pruned from old tool outputs)" if full > total else ""))
+        return view
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+from downloader import DOWNLOAD_DIR
+from telemetry import span
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Tabular downloads are converted once, with a streaming DuckDB COPY, so the
+# agent's code can query them out-of-core instead of re-parsing the raw file.
+INGEST = os.getenv("INGEST", "1") == "1"
+# "parquet": <file>.parquet next to each download; "duckdb": one table per file in a per-quiz database
+INGEST_FORMAT = os.getenv("INGEST_FORMAT", "parquet")
+INGEST_MEMORY_LIMIT = os.getenv("INGEST_MEMORY_LIMIT", "1GB")
+INGEST_THREADS = int(os.getenv("INGEST_THREADS", str(min(4, os.cpu_count() or 1))))
+INGEST_TEMP_DIR = os.getenv("INGEST_TEMP_DIR", os.path.join(".cache", "duckdb"))
+INGEST_SAMPLE_ROWS = int(os.getenv("INGEST_SAMPLE_ROWS", "3"))
+INGEST_PREVIEW_CHARS = int(os.getenv("INGEST_PREVIEW_CHARS", "1500"))
+MAX_CELL_CHARS = 40
+
+# Compressed CSV/JSON is read transparently by DuckDB
+_READERS = {
+    ".csv": "read_csv_auto({path})",
+    ".tsv": "read_csv_auto({path}, delim='\\t')",
+    ".json": "read_json_auto({path})",
+    ".jsonl": "read_json_auto({path}, format='newline_delimited')",
+    ".ndjson": "read_json_auto({path}, format='newline_delimited')",
+    ".parquet": "read_parquet({path})",
+}
+_missing_warned = threading.Event()
+
+
+def _reader(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith((".gz", ".zst")):
+        name = name.rsplit(".", 1)[0]
+    return _READERS.get(os.path.splitext(name)[1])
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_name(filename: str, taken: Optional[set] = None) -> str:
+    # The extension is part of the name so data.csv and data.json get separate tables
+    name = re.sub(r"\W", "_", filename.lower()).strip("_") or "data"
+    name = f"t_{name}" if name[0].isdigit() else name
+    unique, n = name, 2
+    while taken is not None and unique in taken:
+        unique, n = f"{name}_{n}", n + 1
+    if taken is not None:
+        taken.add(unique)
+    return unique
+
+
+def session_db_path(quiz_url: str) -> str:
+    return os.path.join(DOWNLOAD_DIR, f"quiz_{hashlib.sha256(quiz_url.encode()).hexdigest()[:12]}.duckdb")
+
+
+def _connect(database: str = ":memory:"):
+    os.makedirs(INGEST_TEMP_DIR, exist_ok=True)
+    con = duckdb.connect(database)
+    # Bounded memory: larger-than-memory sorts/joins spill to the temp directory
+    con.execute(f"SET memory_limit = {_quote(INGEST_MEMORY_LIMIT)}")
+    con.execute(f"SET threads = {INGEST_THREADS}")
+    con.execute(f"SET temp_directory = {_quote(os.path.abspath(INGEST_TEMP_DIR))}")
+    return con
+
+
+def _is_stale(target: str, source: str) -> bool:
+    return not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source)
+
+
+def _cell(value: Any) -> str:
+    text = str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 3] + "..."
+
+
+def _preview(con, relation: str) -> Dict[str, Any]:
+    columns = con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()
+    rows = con.execute(f"SELECT COUNT(*) FROM {relation}").fetchone()[0]
+    sample = con.execute(f"SELECT * FROM {relation} LIMIT {INGEST_SAMPLE_ROWS}").fetchall()
+    return {
+        "columns": [(name, dtype) for name, dtype, *_ in columns],
+        "rows": rows,
+        "sample": [[_cell(v) for v in row] for row in sample],
+    }
+
+
+def ingest_file(filename: str, db_path: Optional[str] = None, taken: Optional[set] = None) -> Optional[Dict[str, Any]]:
+    """Convert one downloaded file (name relative to LLMFiles) and describe it; None if not tabular.
+
+    ``taken`` collects the table names already used in ``db_path``.
+    """
+    reader = _reader(filename)
+    source = os.path.join(DOWNLOAD_DIR, filename)
+    if reader is None or not os.path.isfile(source):
+        return None
+    with span("ingest_file", filename=filename, format=INGEST_FORMAT) as s:
+        read = reader.format(path=_quote(os.path.abspath(source)))
+        result = {"file": filename}
+        try:
+            if db_path:
+                table = _table_name(filename, taken)
+                con = _connect(db_path)
+                try:
+                    con.execute(f"CREATE OR REPLACE TABLE {_identifier(table)} AS SELECT * FROM {read}")
+                    result.update(_preview(con, _identifier(table)), database=os.path.basename(db_path), table=table)
+                finally:
+                    con.close()
+            else:
+                con = _connect()
+                try:
+                    target = source if filename.lower().endswith(".parquet") else source + ".parquet"
+                    if _is_stale(target, source):
+                        # Unique temp name: concurrent chains may ingest the same filename
+                        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".parquet.tmp")
+                        os.close(fd)
+                        try:
+                            con.execute(f"COPY (SELECT * FROM {read}) TO {_quote(os.path.abspath(tmp))} (FORMAT PARQUET)")
+                            os.replace(tmp, target)
+                        finally:
+                            if os.path.exists(tmp):
+                                os.remove(tmp)
+                    result.update(_preview(con, f"read_parquet({_quote(os.path.abspath(target))})"),
+                                  parquet=os.path.relpath(target, DOWNLOAD_DIR))
+                finally:
+                    con.close()
+        except Exception as e:
+            # Not tabular after all (or malformed): the agent falls back to the raw file
+            s.set(error=str(e))
+            message = (str(e).splitlines() or [type(e).__name__])[0]
+            return {"file": filename, "error": message[:200]}
+        s.set(rows=result["rows"], columns=len(result["columns"]))
+        return result
+
+
+def ingest_files(files: List[str], quiz_url: str = "") -> List[Dict[str, Any]]:
+    """Ingest every tabular file downloaded for a quiz; returns one preview per file."""
+    if not INGEST or not files:
+        return []
+    if duckdb is None:
+        if not _missing_warned.is_set():
+            _missing_warned.set()
+            print("duckdb is not installed, skipping ingestion of downloaded files")
+        return []
+    db_path = session_db_path(quiz_url) if INGEST_FORMAT == "duckdb" else None
+    previews = []
+    taken = set()
+    for filename in files:
+        # Failed downloads are reported as their URL
+        if isinstance(filename, str) and "://" not in filename:
+            preview = ingest_file(filename, db_path, taken)
+            if preview:
+                previews.append(preview)
+    return previews
+
+
+def format_previews(previews: List[Dict[str, Any]]) -> str:
+    """Compact schema/row-count/sample text for the solver prompt."""
+    if not previews:
+        return "None"
+    if any("table" in p for p in previews):
+        hint = "Query with duckdb.connect('<database>', read_only=True).sql('SELECT ... FROM <table>')"
+    else:
+        hint = "Query with duckdb.sql(\"SELECT ... FROM '<parquet>'\")"
+    blocks = [hint + " instead of loading whole files into pandas or printing them:"]
+    for p in previews:
+        if "error" in p:
+            blocks.append(f"{p['file']}: not ingested ({p['error']})")
+            continue
+        where = f"table {p['table']} in {p['database']}" if "table" in p else p["parquet"]
+        lines = [f"{p['file']} -> {where} ({p['rows']:,} rows)",
+                 "  columns: " + ", ".join(f"{name} {dtype}" for name, dtype in p["columns"])]
+        lines += ["  sample: " + " | ".join(row) for row in p["sample"]]
+        block = "\n".join(lines)
+        if len(block) > INGEST_PREVIEW_CHARS:
+            block = block[:INGEST_PREVIEW_CHARS] + " ..."
+        blocks.append(block)
+    return "\n".join(blocks)
@@ -0,0 +1,355 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable
+from dotenv import load_dotenv
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+# Finished jobs kept for GET /jobs/{id}
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+# "memory": chains run inside the API process. "sqlite": /solve only enqueues into
+# JOB_DB and worker processes (worker.py) on this host run them. JOB_DB must be on a
+# local disk: SQLite's WAL locking is unsafe on network filesystems (NFS, SMB).
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+JOB_DB = os.getenv("JOB_DB", os.path.join(".cache", "jobs.sqlite"))
+# Worker processes the API process starts itself in sqlite mode (0: run worker.py separately)
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", str(JOB_WORKERS)))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# A running job whose worker hasn't sent a heartbeat for this long is marked failed
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when the queue is at capacity."""
+
+
+class Job:
+    def __init__(self, url: str):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.current_url = url
+        self.stage = "queued"
+        self.status = "queued"
+        self.quizzes = 0
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stage_started = self.created
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        job = cls.__new__(cls)
+        for key in ("id", "url", "current_url", "stage", "status", "quizzes", "error",
+                    "created", "started", "finished", "stage_started"):
+            setattr(job, key, row[key])
+        return job
+
+    def progress(self, url: str, stage: str):
+        if url != self.current_url:
+            self.quizzes += 1
+        self.current_url = url
+        self.stage = stage
+        self.stage_started = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = self.finished or time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "url": self.url,
+            "current_url": self.current_url,
+            "stage": self.stage,
+            "quizzes_completed": self.quizzes,
+            "elapsed_seconds": round(now - (self.started or self.created), 2),
+            "stage_elapsed_seconds": round(now - self.stage_started, 2),
+            "queued_seconds": round((self.started or now) - self.created, 2),
+            "error": self.error,
+        }
+
+
+class JobScheduler:
+    """Runs quiz chains from a bounded queue on a fixed number of asyncio workers.
+
+    A URL that is already queued or being solved (as the start of a chain or
+    its current quiz) is not queued again; the existing job is returned.
+    """
+
+    def __init__(self, runner: Callable[..., Awaitable[Any]], workers: int = JOB_WORKERS,
+                 max_queue: int = JOB_QUEUE_SIZE):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.queue = None
+        self.jobs = OrderedDict()
+        self.active = {}
+        self.tasks = []
+        self.running = {}
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks + list(self.running.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.running.values(), return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, url: str):
+        """Queue a chain. Returns ``(job, created)``; raises QueueFull under backpressure."""
+        job = self._find_active(url)
+        if job is not None:
+            return job, False
+        job = Job(url)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.queue.qsize()} quizzes are already queued")
+        self.jobs[job.id] = job
+        self.active[job.id] = job
+        self._prune()
+        return job, True
+
+    async def asubmit(self, url: str):
+        return self.submit(url)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _find_active(self, url: str) -> Optional[Job]:
+        for job in self.active.values():
+            if url in (job.url, job.current_url):
+                return job
+        return None
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(self.jobs) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            job.started = time.time()
+            job.progress(job.url, "starting")
+            task = asyncio.create_task(self.runner(job.url, progress=job.progress))
+            self.running[job.id] = task
+            try:
+                await task
+                job.status = "completed"
+                job.quizzes += 1
+                job.stage = "done"
+                job.stage_started = time.time()
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                if not task.cancelled():
+                    task.cancel()
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+                print(f"Job {job.id} failed on {job.current_url}: {job.error}")
+            finally:
+                job.finished = time.time()
+                self.running.pop(job.id, None)
+                self.active.pop(job.id, None)
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "workers": self.workers,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "running": len(self.running),
+        }
+
+
+class SQLiteJobQueue:
+    """Job queue shared by processes through an SQLite file (WAL mode).
+
+    Exposes the JobScheduler interface to the API process; worker processes
+    claim jobs with ``claim``, report with ``progress``/``heartbeat`` and
+    close them with ``finish``.
+    """
+
+    def __init__(self, path: str = JOB_DB, max_queue: int = JOB_QUEUE_SIZE,
+                 processes: int = JOB_WORKER_PROCESSES):
+        self.path = path
+        self.max_queue = max_queue
+        self.processes = processes
+        self.children = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    current_url TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    quizzes INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    worker TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    stage_started REAL NOT NULL,
+                    heartbeat REAL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _reap(self, db: sqlite3.Connection):
+        db.execute(
+            "UPDATE jobs SET status = 'failed', error = 'worker lost', finished = ? "
+            "WHERE status = 'running' AND heartbeat < ?",
+            (time.time(), time.time() - JOB_STALE_SECONDS),
+        )
+
+    def start(self):
+        worker = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+        self.children = [subprocess.Popen([sys.executable, worker]) for _ in range(self.processes)]
+
+    async def stop(self):
+        for child in self.children:
+            child.terminate()
+        for child in self.children:
+            try:
+                await asyncio.to_thread(child.wait, 30)
+            except subprocess.TimeoutExpired:
+                child.kill()
+        self.children = []
+
+    def submit(self, url: str):
+        job = Job(url)
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            self._reap(db)
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') AND (url = ? OR current_url = ?) LIMIT 1",
+                (url, url),
+            ).fetchone()
+            if row is not None:
+                db.execute("COMMIT")
+                return Job.from_row(row), False
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queue:
+                db.execute("COMMIT")
+                raise QueueFull(f"{queued} quizzes are already queued")
+            db.execute(
+                "INSERT INTO jobs (id, url, current_url, stage, status, created, stage_started) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, url, url, job.stage, job.status, job.created, job.stage_started),
+            )
+            db.execute(
+                "DELETE FROM jobs WHERE finished IS NOT NULL AND id NOT IN "
+                "(SELECT id FROM jobs WHERE finished IS NOT NULL ORDER BY finished DESC LIMIT ?)",
+                (JOB_HISTORY,),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return job, True
+
+    async def asubmit(self, url: str):
+        # The insert runs under BEGIN IMMEDIATE and can wait on a worker's lock
+        return await asyncio.to_thread(self.submit, url)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Atomically take the oldest queued job for ``worker``."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            self._reap(db)
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            now = time.time()
+            db.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', worker = ?, started = ?, "
+                "stage_started = ?, heartbeat = ? WHERE id = ?",
+                (worker, now, now, now, row["id"]),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return self.get(row["id"])
+
+    def progress(self, job_id: str, url: str, stage: str):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET quizzes = quizzes + (current_url != ?), current_url = ?, stage = ?, "
+                "stage_started = ?, heartbeat = ? WHERE id = ?",
+                (url, url, stage, now, now, job_id),
+            )
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, stage = ?, stage_started = ?, "
+                "quizzes = quizzes + ? WHERE id = ?",
+                (status, error, now, "done" if status == "completed" else "stopped", now,
+                 1 if status == "completed" else 0, job_id),
+            )
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            workers = db.execute("SELECT COUNT(DISTINCT worker) FROM jobs WHERE status = 'running'").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "worker_processes": len([c for c in self.children if c.poll() is None]),
+            "busy_workers": workers,
+            "queued": counts.get("queued", 0),
+            "max_queue": self.max_queue,
+            "running": counts.get("running", 0),
+        }
+
+
+def get_scheduler(runner: Callable[..., Awaitable[Any]]):
+    """The job backend selected by JOB_BACKEND; ``runner`` is only used in memory mode."""
+    if JOB_BACKEND == "sqlite":
+        return SQLiteJobQueue()
+    return JobScheduler(runner)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
@@ -0,0 +1,265 @@
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+KERNEL_POOL_SIZE = int(os.getenv("KERNEL_POOL_SIZE", "2"))
+KERNEL_TIMEOUT = float(os.getenv("KERNEL_TIMEOUT", "120"))
+KERNEL_CPU_SECONDS = int(os.getenv("KERNEL_CPU_SECONDS", "120"))
+KERNEL_MEMORY_MB = int(os.getenv("KERNEL_MEMORY_MB", "4096"))
+KERNEL_STARTUP_TIMEOUT = float(os.getenv("KERNEL_STARTUP_TIMEOUT", "120"))
+KERNEL_PREIMPORTS = [m for m in os.getenv("KERNEL_PREIMPORTS", "numpy,pandas,sklearn,scipy,duckdb").split(",") if m]
+KERNEL_WORKDIR = "LLMFiles"
+MAX_OUTPUT_CHARS = 100000
+
+
+class Kernel:
+    """One warm Python interpreter that executes code in a persistent namespace.
+
+    Requests and replies are JSON lines over the child's stdin and a private
+    copy of its stdout; output printed by the code itself is captured and
+    returned in the reply.
+    """
+
+    def __init__(self):
+        os.makedirs(KERNEL_WORKDIR, exist_ok=True)
+        env = dict(os.environ, MPLBACKEND="Agg", PYTHONUNBUFFERED="1")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=KERNEL_WORKDIR, env=env, text=True, bufsize=1,
+        )
+        self.replies = queue.Queue()
+        self.lock = threading.Lock()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        self.ready = threading.Event()
+        threading.Thread(target=self._wait_ready, daemon=True).start()
+
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+
+    def _wait_ready(self):
+        try:
+            line = self.replies.get(timeout=KERNEL_STARTUP_TIMEOUT)
+        except queue.Empty:
+            line = None
+        if line is None:
+            self.close()
+        self.ready.set()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def execute(self, code: str, timeout: float = KERNEL_TIMEOUT) -> Dict[str, Any]:
+        with self.lock:
+            self.ready.wait(KERNEL_STARTUP_TIMEOUT)
+            if not self.alive():
+                return {"stdout": "", "stderr": "Python kernel failed to start", "return_code": -1}
+            self.proc.stdin.write(json.dumps({"code": code, "cpu_seconds": KERNEL_CPU_SECONDS}) + "\n")
+            self.proc.stdin.flush()
+            try:
+                line = self.replies.get(timeout=timeout)
+            except queue.Empty:
+                line = None
+            if line is None:
+                timed_out = self.alive()
+                self.close()
+                reason = f"timed out after {timeout}s" if timed_out else "crashed (out of memory or CPU limit)"
+                return {
+                    "stdout": "",
+                    "stderr": f"Execution {reason}. The Python session was reset, variables were lost.",
+                    "return_code": -9,
+                }
+            return json.loads(line)
+
+    def close(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class KernelPool:
+    """Keeps ``size`` pre-imported kernels warm so a quiz session starts without import cost."""
+
+    def __init__(self, size: int = KERNEL_POOL_SIZE):
+        self.size = max(0, size)
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.closed = False
+
+    def _spawn(self):
+        kernel = Kernel()
+        with self.lock:
+            if self.closed:
+                kernel.close()
+                return
+            self.started += 1
+        self.idle.put(kernel)
+
+    def warm(self):
+        for _ in range(self.size - self.idle.qsize()):
+            threading.Thread(target=self._spawn, daemon=True).start()
+
+    def take(self) -> Kernel:
+        while True:
+            try:
+                kernel = self.idle.get_nowait()
+            except queue.Empty:
+                kernel = Kernel()
+                break
+            if kernel.alive():
+                break
+        if not self.closed:
+            threading.Thread(target=self._spawn, daemon=True).start()
+        return kernel
+
+    def session(self) -> "KernelSession":
+        return KernelSession(self)
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class KernelSession:
+    """The kernel of one quiz: variables and loaded data persist between run_code calls."""
+
+    def __init__(self, pool: KernelPool):
+        self.pool = pool
+        self.kernel: Optional[Kernel] = None
+
+    def run(self, code: str) -> Dict[str, Any]:
+        if self.kernel is None or not self.kernel.alive():
+            self.kernel = self.pool.take()
+        return self.kernel.execute(code)
+
+    def close(self):
+        if self.kernel is not None:
+            self.kernel.close()
+            self.kernel = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_kernel_pool() -> KernelPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = KernelPool()
+        return _pool
+
+
+def shutdown_kernel_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def run_code(code: str) -> Dict[str, Any]:
+    """
+    Execute Python code in a fresh warm kernel and return stdout, stderr and
+    the return code. Solver sessions use a KernelSession instead so state persists.
+    """
+    session = get_kernel_pool().session()
+    try:
+        return session.run(code)
+    finally:
+        session.close()
+
+
+def _address_space_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _worker_main():
+    import importlib
+    import resource
+    import signal
+    import tempfile
+
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    # Output written straight to fd 1/2 (C extensions, os.system, subprocesses) goes to
+    # a scratch file so it cannot corrupt the protocol; it is returned with stdout
+    raw_output = tempfile.TemporaryFile()
+    os.dup2(raw_output.fileno(), 1)
+    os.dup2(raw_output.fileno(), 2)
+    sys.path.insert(0, os.getcwd())
+
+    for module in KERNEL_PREIMPORTS:
+        try:
+            importlib.import_module(module.strip())
+        except Exception:
+            pass
+    if KERNEL_MEMORY_MB > 0:
+        # Set after the preimports, on top of the address space they already reserved
+        # (BLAS and DuckDB map large ranges up front), so the budget is for the agent's code
+        limit = _address_space_bytes() + KERNEL_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def on_cpu_limit(signum, frame):
+        raise TimeoutError(f"CPU time limit of {KERNEL_CPU_SECONDS}s exceeded")
+
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    hard_cpu = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    protocol.write(json.dumps({"ready": True}) + "\n")
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        return_code = 0
+        used = int(sum(resource.getrusage(resource.RUSAGE_SELF)[:2]))
+        soft = used + request.get("cpu_seconds", KERNEL_CPU_SECONDS)
+        if hard_cpu != resource.RLIM_INFINITY:
+            soft = min(soft, hard_cpu)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard_cpu))
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                exec(compile(request["code"], "<run_code>", "exec"), namespace)
+            except SystemExit as e:
+                return_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                etype, value, tb = sys.exc_info()
+                traceback.print_exception(etype, value, tb.tb_next)  # hide this frame
+                return_code = 1
+        resource.setrlimit(resource.RLIMIT_CPU, (hard_cpu, hard_cpu))
+        raw_output.seek(0)
+        raw = raw_output.read().decode("utf-8", errors="replace")
+        raw_output.seek(0)
+        raw_output.truncate()
+        protocol.write(json.dumps({
+            "stdout": (raw + stdout.getvalue())[-MAX_OUTPUT_CHARS:],
+            "stderr": stderr.getvalue()[-MAX_OUTPUT_CHARS:],
+            "return_code": return_code,
+        }) + "\n")
+
+
+if __name__ == "__main__" and "--worker" in sys.argv:
+    _worker_main()
@@ -1,38 +1,445 @@
 import httpx
+import asyncio
+import os
+import threading
 import time
 import json
 import pprint
 from langchain_core.runnables import Runnable
 from langchain_core.messages import BaseMessage
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from rate_limiter import get_limiter, backoff_delay, retry_after_seconds
+from telemetry import span, counter, histogram
+from model_router import get_router, Route
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+# OpenAI-compatible chat completions endpoint (point it at benchmarks/mock_llm.py for offline runs)
+LLM_API_URL = os.getenv("LLM_API_URL", "https://aipipe.org/openrouter/v1/chat/completions")
+
+LLM_REQUESTS = counter("llm_requests_total", "Chat completion requests by HTTP outcome", ("model", "status"))
+LLM_TOKENS = counter("llm_tokens_total", "Tokens reported in the response usage", ("model", "kind"))
+LLM_RETRIES = counter("llm_retries_total", "Retried chat completion requests by reason", ("model", "reason"))
+LLM_FIRST_TOKEN = histogram("llm_time_to_first_token_seconds", "Time to the first streamed token", ("model",))
+LLM_FIRST_TOOL_CALL = histogram("llm_time_to_first_tool_call_seconds",
+                                "Time until the first streamed tool call was complete", ("model",))
+
+# Pooled clients shared by every OpenRouterLLM pointing at the same endpoint, so
+# consecutive agent turns reuse one TCP+TLS connection instead of handshaking again.
+_sync_clients: Dict[str, httpx.Client] = {}
+_async_clients: Dict[tuple, httpx.AsyncClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (from the httpx[http2] dependency; without it we stay on HTTP/1.1)
+        return True
+    except ImportError:
+        return False
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return {
+        "timeout": LLM_TIMEOUT,
+        "http2": _http2_enabled(),
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def _origin(url: str) -> str:
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode()}"
+
+
+def get_client(url: str) -> httpx.Client:
+    origin = _origin(url)
+    with _clients_lock:
+        client = _sync_clients.get(origin)
+        if client is None or client.is_closed:
+            client = _sync_clients[origin] = httpx.Client(**_client_kwargs())
+        return client
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    # Async clients are bound to the event loop they were first used on
+    key = (_origin(url), id(asyncio.get_running_loop()))
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None or client.is_closed:
+            client = _async_clients[key] = httpx.AsyncClient(**_client_kwargs())
+        return client
+
+
+def close_clients():
+    with _clients_lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_clients():
+    loop_id = id(asyncio.get_running_loop())
+    with _clients_lock:
+        keys = [key for key in _async_clients if key[1] == loop_id]
+        clients = [_async_clients.pop(key) for key in keys]
+    for client in clients:
+        await client.aclose()
+
+
+class _RequestTimer:
+    """Splits a request into connect / time-to-first-byte / total using httpcore trace events."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.connect_started = None
+        self.connect_done = None
+        self.headers_received = None
+        self.http_version = None
+
+    def trace(self, event_name: str, info: Dict[str, Any]):
+        now = time.perf_counter()
+        if event_name == "connection.connect_tcp.started":
+            self.connect_started = now
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            self.connect_done = now
+        elif event_name.endswith("receive_response_headers.complete"):
+            self.headers_received = now
+            self.http_version = event_name.split(".")[0]
+
+    async def atrace(self, event_name: str, info: Dict[str, Any]):
+        self.trace(event_name, info)
+
+    def timings(self) -> Dict[str, Any]:
+        end = time.perf_counter()
+        connect = 0.0
+        if self.connect_started is not None and self.connect_done is not None:
+            connect = self.connect_done - self.connect_started
+        return {
+            "connect": round(connect, 4),
+            "ttfb": round((self.headers_received or end) - self.start, 4),
+            "total": round(end - self.start, 4),
+            "reused_connection": self.connect_started is None,
+            "http_version": self.http_version,
+        }
+
+
+class _StreamError(Exception):
+    """The stream broke off: an error chunk or a line that isn't JSON."""
+
+    def __init__(self, reason: str, status: int = 502):
+        super().__init__(reason)
+        self.status = status
+
+
+class _StreamAccumulator:
+    """Rebuilds a chat completion message from SSE deltas.
+
+    A tool call is handed to ``on_tool_call`` as soon as its arguments parse as
+    complete JSON, without waiting for the rest of the completion. Parsing is
+    only attempted when a fragment closes an object or the stream moves on to
+    the next tool call, so long arguments aren't re-parsed on every delta.
+    """
+
+    def __init__(self, on_tool_call=None):
+        self.on_tool_call = on_tool_call
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.first_tool_call_at = None
+        self.content = []
+        self.tool_calls = {}
+        self.dispatched = set()
+        self.streaming_index = None
+        self.usage = None
+
+    def feed_line(self, line: str) -> bool:
+        """Consume one SSE line. Returns False once the stream is finished."""
+        if not line.startswith("data:"):
+            return True  # blank separators and ": keep-alive" comments
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return False
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            raise _StreamError(f"Malformed stream chunk: {data[:200]}")
+        if "error" in chunk:
+            error = chunk["error"]
+            code = error.get("code") if isinstance(error, dict) else None
+            # Only throttling and server-side codes are meaningful here; anything else is retried as a 502
+            status = code if isinstance(code, int) and (code == 429 or code >= 500) else 502
+            raise _StreamError(f"Stream error: {error}", status)
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices", []):
+            self._feed_delta(choice.get("delta") or {})
+        return True
+
+    def _feed_delta(self, delta: Dict[str, Any]):
+        if (delta.get("content") or delta.get("tool_calls")) and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        if delta.get("content"):
+            self.content.append(delta["content"])
+        for part in delta.get("tool_calls") or []:
+            index = part.get("index", len(self.tool_calls))
+            if self.streaming_index is not None and index != self.streaming_index:
+                # The previous call won't grow any further
+                self._maybe_dispatch(self.streaming_index)
+            self.streaming_index = index
+            call = self.tool_calls.setdefault(
+                index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if part.get("id"):
+                call["id"] = part["id"]
+            function = part.get("function") or {}
+            fragment = function.get("arguments") or ""
+            call["function"]["name"] += function.get("name") or ""
+            call["function"]["arguments"] += fragment
+            if fragment.rstrip().endswith("}") or part.get("id") or function.get("name"):
+                self._maybe_dispatch(index)
+
+    def _maybe_dispatch(self, index: int, final=False):
+        call = self.tool_calls[index]
+        if index in self.dispatched or not call["id"] or not call["function"]["name"]:
+            return
+        arguments = call["function"]["arguments"]
+        if not final:
+            try:
+                json.loads(arguments)
+            except ValueError:
+                return
+        self.dispatched.add(index)
+        if self.first_tool_call_at is None:
+            self.first_tool_call_at = time.perf_counter()
+        if self.on_tool_call is not None:
+            self.on_tool_call(call)
+
+    def message(self) -> Dict[str, Any]:
+        for index in sorted(self.tool_calls):
+            self._maybe_dispatch(index, final=True)
+        message = {"role": "assistant", "content": "".join(self.content)}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return message
+
+    def partial_message(self) -> Dict[str, Any]:
+        """The message so far, keeping only the tool calls that were already dispatched."""
+        message = {"role": "assistant", "content": "".join(self.content)}
+        if self.dispatched:
+            message["tool_calls"] = [self.tool_calls[i] for i in sorted(self.dispatched)]
+        return message
+
+    def timings(self) -> Dict[str, Any]:
+        def since_start(mark):
+            return round(mark - self.start, 4) if mark is not None else None
+        return {
+            "time_to_first_token": since_start(self.first_token_at),
+            "time_to_first_tool_call": since_start(self.first_tool_call_at),
+        }
+
 
 class OpenRouterLLM:
-    def __init__(self, api_key: str, model: str, json_mode=False):
+    """Chat completions client.
+
+    Created with a ``tier`` ("fast" or "strong") instead of a fixed ``model``,
+    every request is routed by model_router: the model and endpoint come from
+    the tier's first healthy route, and a failed request is retried on the next one.
+    """
+
+    def __init__(self, api_key: str, model: str = None, json_mode=False, stream=False, tier: str = None):
         self.api_key = api_key
-        self.model = model
-        self.url = "https://aipipe.org/openrouter/v1/chat/completions"
+        self.tier = tier
+        self.route = get_router().primary(tier) if tier else Route(model)
+        self.model = self.route.model
+        self.url = self.route.url or LLM_API_URL
         # self.url = "https://api.groq.com/openai/v1/chat/completions"
         self.json_mode = json_mode 
+        self.stream = stream
+        self.last_timings = {}
+        self.limiter = get_limiter(api_key)
 
-    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        headers = {
+    def _use_route(self, tier: Optional[str], payload: Dict[str, Any], avoid: Optional[Route] = None):
+        if tier is None:
+            return
+        self.route, _ = get_router().choose(tier, avoid)
+        self.model = payload["model"] = self.route.model
+        self.url = self.route.url or LLM_API_URL
+
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        with httpx.Client(timeout=60) as client:
-            try:
-                res = client.post(self.url, headers=headers, json=payload)
-                res.raise_for_status()
-                return res.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 413:
-                    return {"error": 413, "reason": e.response.text}
-                    # Handle it however you want:
-                else:
-                    return {"error": status, "reason": e.response.text}
- 
-    def invoke(self, messages, tools=None):
+
+    def _record_timings(self, timer: _RequestTimer, accumulator: _StreamAccumulator = None):
+        self.last_timings = timer.timings()
+        if accumulator is not None:
+            self.last_timings.update(accumulator.timings())
+            if self.last_timings["time_to_first_token"] is not None:
+                LLM_FIRST_TOKEN.observe(self.last_timings["time_to_first_token"], model=self.model)
+            if self.last_timings["time_to_first_tool_call"] is not None:
+                LLM_FIRST_TOOL_CALL.observe(self.last_timings["time_to_first_tool_call"], model=self.model)
+        print(f"LLM {self.model}: " + ", ".join(f"{k} {v}" for k, v in self.last_timings.items()))
+
+    def _observe(self, response: Dict[str, Any], s):
+        """Attach the outcome, token usage and timings of one request to its span and the metrics."""
+        status = response.get("error", 200)
+        LLM_REQUESTS.inc(model=self.model, status=status)
+        usage = response.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], model=self.model, kind=kind.split("_")[0])
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached:
+            LLM_TOKENS.inc(cached, model=self.model, kind="cached")
+        s.set(status=status, prompt_tokens=usage.get("prompt_tokens"),
+              completion_tokens=usage.get("completion_tokens"), cached_tokens=cached, **self.last_timings)
+
+    def _record_route(self, response: Dict[str, Any], started: float):
+        # Rate limiting is per API key, not a sign of a slow or broken model
+        if response.get("error") != 429:
+            get_router().observe(self.route, time.perf_counter() - started, "error" not in response)
+
+    def _traced(self, post, tier=None):
+        def traced(payload):
+            with span("llm.request", model=self.model, tier=tier, stream=self.stream) as s:
+                started = time.perf_counter()
+                response = post(payload)
+                self._record_route(response, started)
+                self._observe(response, s)
+                return response
+        return traced
+
+    def _atraced(self, post, tier=None):
+        async def traced(payload):
+            with span("llm.request", model=self.model, tier=tier, stream=self.stream) as s:
+                started = time.perf_counter()
+                response = await post(payload)
+                self._record_route(response, started)
+                self._observe(response, s)
+                return response
+        return traced
+
+    def _error(self, res: httpx.Response) -> Dict[str, Any]:
+        self.limiter.update_from_headers(res.headers)
+        return self._error_response(res)
+
+    async def _aerror(self, res: httpx.Response) -> Dict[str, Any]:
+        await self.limiter.aupdate_from_headers(res.headers)
+        return self._error_response(res)
+
+    @staticmethod
+    def _error_response(res: httpx.Response) -> Dict[str, Any]:
+        return {
+            "error": res.status_code,
+            "reason": res.text,
+            "retry_after": retry_after_seconds(res.headers),
+        }
+
+    @staticmethod
+    def _transport_error(e: httpx.TransportError) -> Dict[str, Any]:
+        # Timeouts and dropped connections are retried (and failed over) like a 5xx
+        return {
+            "error": 504 if isinstance(e, httpx.TimeoutException) else 503,
+            "reason": f"{type(e).__name__}: {e}",
+            "retry_after": None,
+        }
+
+    def _stream_failed(self, e: Exception, accumulator: _StreamAccumulator) -> Dict[str, Any]:
+        # Tool calls already handed out can't be taken back: finish the turn with
+        # what was dispatched instead of retrying and running them twice
+        if accumulator.dispatched:
+            print(f"Stream from {self.model} broke off after {len(accumulator.dispatched)} tool call(s): {e}")
+            return {"choices": [{"message": accumulator.partial_message()}], "usage": accumulator.usage}
+        if isinstance(e, _StreamError):
+            return {"error": e.status, "reason": str(e), "retry_after": None}
+        return self._transport_error(e)
+
+    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = self._headers()
+        client = get_client(self.url)
+        timer = _RequestTimer()
+        try:
+            res = client.post(self.url, headers=headers, json=payload,
+                              extensions={"trace": timer.trace})
+            res.raise_for_status()
+            self.limiter.update_from_headers(res.headers)
+            return res.json()
+        except httpx.HTTPStatusError as e:
+            return self._error(e.response)
+        except httpx.TransportError as e:
+            return self._transport_error(e)
+        finally:
+            self._record_timings(timer)
+
+    async def _apost(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = get_async_client(self.url)
+        timer = _RequestTimer()
+        try:
+            res = await client.post(self.url, headers=self._headers(), json=payload,
+                                    extensions={"trace": timer.atrace})
+            res.raise_for_status()
+            await self.limiter.aupdate_from_headers(res.headers)
+            return res.json()
+        except httpx.HTTPStatusError as e:
+            return await self._aerror(e.response)
+        except httpx.TransportError as e:
+            return self._transport_error(e)
+        finally:
+            self._record_timings(timer)
+
+    def _post_stream(self, payload: Dict[str, Any], on_tool_call=None) -> Dict[str, Any]:
+        client = get_client(self.url)
+        timer = _RequestTimer()
+        accumulator = _StreamAccumulator(on_tool_call)
+        try:
+            with client.stream("POST", self.url, headers=self._headers(), json=payload,
+                               extensions={"trace": timer.trace}) as res:
+                if res.status_code >= 400:
+                    res.read()
+                    return self._error(res)
+                self.limiter.update_from_headers(res.headers)
+                for line in res.iter_lines():
+                    if not accumulator.feed_line(line):
+                        break
+            return {"choices": [{"message": accumulator.message()}], "usage": accumulator.usage}
+        except (httpx.TransportError, _StreamError) as e:
+            return self._stream_failed(e, accumulator)
+        finally:
+            self._record_timings(timer, accumulator)
+
+    async def _apost_stream(self, payload: Dict[str, Any], on_tool_call=None) -> Dict[str, Any]:
+        client = get_async_client(self.url)
+        timer = _RequestTimer()
+        accumulator = _StreamAccumulator(on_tool_call)
+        try:
+            async with client.stream("POST", self.url, headers=self._headers(), json=payload,
+                                     extensions={"trace": timer.atrace}) as res:
+                if res.status_code >= 400:
+                    await res.aread()
+                    return await self._aerror(res)
+                await self.limiter.aupdate_from_headers(res.headers)
+                async for line in res.aiter_lines():
+                    if not accumulator.feed_line(line):
+                        break
+            return {"choices": [{"message": accumulator.message()}], "usage": accumulator.usage}
+        except (httpx.TransportError, _StreamError) as e:
+            return self._stream_failed(e, accumulator)
+        finally:
+            self._record_timings(timer, accumulator)
+
+    def _build_payload(self, messages, tools=None) -> Dict[str, Any]:
         payload = {
             "model": self.model,
             "messages": messages,
@@ -42,20 +449,102 @@ class OpenRouterLLM:
             payload["tools"] = tools
         if self.json_mode:
             payload["response_format"] = {"type": "json_object"}
-        response = self._post(payload)
+        if self.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _retry_delay(self, response: Dict[str, Any], attempt: int, payload: Dict[str, Any]) -> float:
+        """Decide how to retry a failed request and return how long to wait first."""
+        delay = self._prepare_retry(response, attempt, payload)
+        if delay is None:
+            return self.limiter.on_throttled(response.get("retry_after"), attempt)
+        return delay
+
+    async def _aretry_delay(self, response: Dict[str, Any], attempt: int, payload: Dict[str, Any]) -> float:
+        delay = self._prepare_retry(response, attempt, payload)
+        if delay is None:
+            return await self.limiter.aon_throttled(response.get("retry_after"), attempt)
+        return delay
+
+    def _prepare_retry(self, response: Dict[str, Any], attempt: int, payload: Dict[str, Any]) -> Optional[float]:
+        # Returns None for a 429, whose backoff comes from the rate limiter
+        if attempt > LLM_MAX_RETRIES:
+            raise RuntimeError(
+                f"LLM request failed after {LLM_MAX_RETRIES} retries: {response['error']} {response['reason']}"
+            )
+        print("Retrying...", response["error"], response["reason"])
+        LLM_RETRIES.inc(model=self.model, reason=response["error"])
+        if response["error"] == 429:
+            return None
+        if response["error"] >= 500:
+            return backoff_delay(attempt)
+        payload["messages"].append(
+            {
+                "role": "user",
+                "content": "Your last response is malformed"
+            }
+        )
+        return 0.0
+
+    def _failed_route(self, response: Dict[str, Any]) -> Optional[Route]:
+        # A throttled key fails on every model alike; anything else moves on to the next route
+        return None if response.get("error") == 429 else self.route
+
+    def invoke(self, messages, tools=None, on_tool_call=None, tier: str = None):
+        """
+        Run one chat completion and return the assistant message.
+
+        In streaming mode ``on_tool_call`` is called with each tool call as soon
+        as its arguments are complete, while the rest of the response streams in.
+        ``tier`` overrides the instance's tier for this call (routed instances only).
+        """
+        tier = (tier or self.tier) if self.tier else None
+        payload = self._build_payload(messages, tools)
+        if self.stream:
+            post = lambda p: self._post_stream(p, on_tool_call)
+        else:
+            post = self._post
+        post = self._traced(post, tier)
+        self._use_route(tier, payload)
+        self.limiter.acquire()
+        response = post(payload)
         if "choices" not in response:
             print(response)
+        attempt = 0
         while "error" in response:
-            print("Retrying...", response["error"], response["reason"])
-            if response["error"] == 429:
-                time.sleep(20)
-                continue
-            payload["messages"].append(
-                {
-                    "role": "user",
-                    "content": "Your last response is malformed"
-                }
-            )
-            response = self._post(payload)
+            attempt += 1
+            delay = self._retry_delay(response, attempt, payload)
+            failed = self.route
+            self._use_route(tier, payload, avoid=self._failed_route(response))
+            # No backoff when the retry goes to a different route
+            time.sleep(delay if self.route == failed else 0)
+            self.limiter.acquire()
+            response = post(payload)
+        self.limiter.on_success()
+
+        return response["choices"][0]["message"]
+
+    async def ainvoke(self, messages, tools=None, on_tool_call=None, tier: str = None):
+        tier = (tier or self.tier) if self.tier else None
+        payload = self._build_payload(messages, tools)
+        if self.stream:
+            post = lambda p: self._apost_stream(p, on_tool_call)
+        else:
+            post = self._apost
+        post = self._atraced(post, tier)
+        self._use_route(tier, payload)
+        await self.limiter.aacquire()
+        response = await post(payload)
+        attempt = 0
+        while "error" in response:
+            attempt += 1
+            delay = await self._aretry_delay(response, attempt, payload)
+            failed = self.route
+            self._use_route(tier, payload, avoid=self._failed_route(response))
+            await asyncio.sleep(delay if self.route == failed else 0)
+            await self.limiter.aacquire()
+            response = await post(payload)
+        await self.limiter.aon_success()
 
-        return response["choices"][0]["message"]
\ No newline at end of file
+        return response["choices"][0]["message"]
@@ -1,19 +1,120 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import uvicorn
+import asyncio
+import importlib
 import os
+import sys
+import threading
 import time
-from pipeline_manager import run_pipeline
+from jobs import get_scheduler, QueueFull, JOB_BACKEND
+from browser_pool import get_pool, shutdown_pool
+from kernel_pool import get_kernel_pool, shutdown_kernel_pool
+from audio_transcriber import preload as preload_transcriber, shutdown_transcriber
+from ocr_service import shutdown_ocr
+from rate_limiter import snapshot_all as rate_limit_snapshot
+from shared_store import snapshot as store_snapshot
+from downloader import get_cache
+from extraction_cache import get_extraction_cache
+from model_router import get_router
+from telemetry import register_collector, render_prometheus
 
 load_dotenv()
 
 EMAIL = os.getenv("EMAIL") 
 SECRET = os.getenv("SECRET")
+# After startup, import the pipeline and every tool and start the browser/kernel
+# pools in the background, so the first quiz doesn't pay for them
+WARMUP = os.getenv("WARMUP", "1") == "1"
+# Head start for the server to bind its socket before the warm-up competes for the CPU
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY", "1"))
+warmup_state = {"status": "pending" if WARMUP else "disabled"}
 
-app = FastAPI()
+
+def _load_pipeline():
+    # pipeline_manager pulls in LangChain and the solver; it is only imported when first needed
+    return importlib.import_module("pipeline_manager")
+
+
+async def run_chain(url: str, progress=None):
+    pipeline_manager = await asyncio.to_thread(_load_pipeline)
+    return await pipeline_manager.arun_pipeline(url, progress=progress)
+
+
+# Quiz chains run from a bounded queue, in this process or in worker processes (JOB_BACKEND)
+scheduler = get_scheduler(run_chain)
+
+
+def _warm_up():
+    time.sleep(WARMUP_DELAY)
+    started = time.perf_counter()
+    warmup_state["status"] = "running"
+    try:
+        if JOB_BACKEND == "memory":
+            # Launch the browsers now so the first quiz doesn't pay the Chromium cold start
+            get_pool().start()
+            # Same for the Python kernels behind run_code (pandas/numpy are imported up front)
+            get_kernel_pool().warm()
+            if os.getenv("AUDIO_PRELOAD", "0") == "1":
+                # Load the speech model in the background, it takes a few seconds
+                threading.Thread(target=preload_transcriber, daemon=True).start()
+        _load_pipeline()
+        from solver_agent import FUNCTION_MAP
+        warmup_state["tools"] = FUNCTION_MAP.load_all()
+        warmup_state["status"] = "done"
+    except Exception as e:
+        print("Warm-up failed:", e)
+        warmup_state["status"] = f"failed: {e}"
+    warmup_state["seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Warm-up {warmup_state['status']} in {warmup_state['seconds']}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    shutdown_pool()
+    shutdown_kernel_pool()
+    shutdown_transcriber()
+    shutdown_ocr()
+    if "llm" in sys.modules:
+        # Only loaded once a quiz has run; importing it just to close nothing would slow shutdown
+        from llm import aclose_clients, close_clients
+        await aclose_clients()
+        close_clients()
+
+def _collect_gauges():
+    """Point-in-time state of the limiter, caches, stores and job queue for /metrics."""
+    for key, limiter in rate_limit_snapshot().items():
+        for field in ("rate_per_minute", "tokens", "blocked_for_seconds", "requests", "throttled", "waited_seconds"):
+            yield f"llm_rate_limiter_{field}", "LLM client rate limiter state", {"key": key}, limiter[field]
+    for field, value in get_cache().stats().items():
+        yield f"download_cache_{field}", "Download cache state", {}, value
+    for field, value in get_extraction_cache().stats().items():
+        yield f"extraction_cache_{field}", "Task extraction cache state", {}, value
+    for route, stats in get_router().snapshot()["routes"].items():
+        for field in ("p95_seconds", "error_rate"):
+            yield f"llm_route_{field}", "Recent latency and error rate per routed model", {"route": route}, stats[field]
+        yield "llm_route_cooling_down", "Whether a route is skipped by the router", {"route": route}, int(bool(stats["cooling_down"]))
+    for store, stats in store_snapshot().items():
+        for field, value in stats.items():
+            if isinstance(value, (int, float)):
+                yield f"store_{field}", "Shared store state", {"store": store}, value
+    for field, value in scheduler.stats().items():
+        if isinstance(value, (int, float)):
+            yield f"jobs_{field}", "Job queue state", {}, value
+
+
+register_collector(_collect_gauges)
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -27,11 +128,22 @@ def healthz():
     """Simple liveness check."""
     return {
         "status": "ok",
-        "uptime_seconds": int(time.time() - START_TIME)
+        "uptime_seconds": int(time.time() - START_TIME),
+        "rate_limits": rate_limit_snapshot(),
+        "stores": store_snapshot(),
+        "extraction_cache": get_extraction_cache().stats(),
+        "llm_routes": get_router().snapshot(),
+        "jobs": scheduler.stats(),
+        "warmup": warmup_state,
     }
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: span latencies, LLM tokens and retries, tool calls, cache and queue state."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/solve")
-async def solve(request: Request, background_tasks: BackgroundTasks):
+async def solve(request: Request):
     try:
         data = await request.json()
     except Exception:
@@ -45,10 +157,21 @@ async def solve(request: Request, background_tasks: BackgroundTasks):
     
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
-    print("Verified starting the task...")
-    background_tasks.add_task(run_pipeline, url)
+    try:
+        job, created = await scheduler.asubmit(url)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Too many quizzes in progress: {e}", headers={"Retry-After": "30"})
+    print("Verified starting the task..." if created else f"Already solving {url}, returning job {job.id}")
+
+    return JSONResponse(status_code=200, content={"status": "ok", "job_id": job.id, "duplicate": not created})
 
-    return JSONResponse(status_code=200, content={"status": "ok"})
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Progress of a quiz chain started by /solve."""
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
 
 if __name__ == "__main__":
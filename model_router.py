@@ -0,0 +1,226 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from telemetry import counter, histogram
+from dotenv import load_dotenv
+load_dotenv()
+
+# Calls are made at a tier: "fast" for task extraction and simple solver turns,
+# "strong" for everything that needs real reasoning. Each tier is an ordered list
+# of routes, "model" or "model@https://other-endpoint/v1/chat/completions".
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "openai/gpt-5.1-codex-max")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "openai/gpt-4.1-mini")
+LLM_STRONG_FALLBACKS = os.getenv("LLM_STRONG_FALLBACKS", "openai/gpt-5.1")
+LLM_FAST_FALLBACKS = os.getenv("LLM_FAST_FALLBACKS", "google/gemini-2.5-flash")
+# With routing off every call goes to the strong tier (failover still applies)
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1") == "1"
+# A route is skipped for ROUTER_COOLDOWN_SECONDS once its p95 latency or error
+# rate over the last ROUTER_WINDOW calls crosses the tier's threshold
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "20"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_FAST_P95_SECONDS = float(os.getenv("ROUTER_FAST_P95_SECONDS", "15"))
+ROUTER_STRONG_P95_SECONDS = float(os.getenv("ROUTER_STRONG_P95_SECONDS", "60"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "120"))
+# Successful run_code results shorter than this read as an answer that only needs submitting
+ROUTER_SIMPLE_RESULT_CHARS = int(os.getenv("ROUTER_SIMPLE_RESULT_CHARS", "300"))
+
+ROUTE_DECISIONS = counter("llm_route_decisions_total", "Model routing decisions", ("tier", "model", "reason"))
+ROUTE_SECONDS = histogram("llm_route_request_seconds", "Chat completion latency per routed model", ("model",))
+
+
+class Route(NamedTuple):
+    model: str
+    url: Optional[str] = None  # None: the default LLM_API_URL
+
+    def __str__(self):
+        return f"{self.model}@{self.url}" if self.url else self.model
+
+
+def parse_routes(*specs: str) -> List[Route]:
+    routes = []
+    for spec in specs:
+        for item in spec.split(","):
+            model, _, url = item.strip().partition("@")
+            if model and Route(model, url or None) not in routes:
+                routes.append(Route(model, url or None))
+    return routes
+
+
+class _RouteStats:
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)  # (seconds, ok)
+        self.requests = 0
+        self.errors = 0
+        self.tripped_p95 = 0.0
+
+    def observe(self, seconds: float, ok: bool):
+        self.samples.append((seconds, ok))
+        self.requests += 1
+        self.errors += 0 if ok else 1
+
+    def p95(self) -> float:
+        latencies = sorted(seconds for seconds, _ in self.samples)
+        if not latencies:
+            return 0.0
+        return latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def reset(self):
+        # Judge the route afresh when it comes back, but remember how slow it was
+        self.tripped_p95 = self.p95()
+        self.samples.clear()
+
+    def recent_p95(self) -> float:
+        return self.p95() if self.samples else self.tripped_p95
+
+
+class ModelRouter:
+    """Picks the route (model and endpoint) for each LLM call from its tier.
+
+    The first healthy route of the tier wins. A route is tripped for
+    ``cooldown`` seconds when its p95 latency over the last ``window`` calls
+    exceeds the tier's threshold or its error rate exceeds ``max_error_rate``;
+    once the cooldown ends it gets traffic again. Decisions and per-route
+    latency are kept for /healthz and /metrics.
+    """
+
+    def __init__(self, tiers: Dict[str, List[Route]], p95_seconds: Dict[str, float],
+                 max_error_rate: float = ROUTER_MAX_ERROR_RATE, window: int = ROUTER_WINDOW,
+                 min_samples: int = ROUTER_MIN_SAMPLES, cooldown: float = ROUTER_COOLDOWN_SECONDS):
+        self.tiers = tiers
+        self.p95_seconds = p95_seconds
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.stats: Dict[Route, _RouteStats] = {}
+        self.tripped: Dict[Tuple[str, Route], float] = {}
+        self.decisions = deque(maxlen=50)
+
+    def routes(self, tier: str) -> List[Route]:
+        return self.tiers.get(tier) or self.tiers["strong"]
+
+    def primary(self, tier: str) -> Route:
+        return self.routes(tier)[0]
+
+    def _problem(self, tier: str, route: Route, now: float) -> Optional[str]:
+        if self.tripped.get((tier, route), 0) > now:
+            return "cooling down"
+        stats = self.stats.get(route)
+        if stats is None or len(stats.samples) < self.min_samples:
+            return None
+        p95, error_rate = stats.p95(), stats.error_rate()
+        limit = self.p95_seconds.get(tier)
+        if limit and p95 > limit:
+            problem = f"p95 {p95:.1f}s over {limit:g}s"
+        elif error_rate > self.max_error_rate:
+            problem = f"error rate {error_rate:.0%}"
+        else:
+            return None
+        self.tripped[(tier, route)] = now + self.cooldown
+        stats.reset()
+        return problem
+
+    def choose(self, tier: str, avoid: Optional[Route] = None) -> Tuple[Route, str]:
+        """The route for the next call at ``tier``; ``avoid`` is a route that just failed."""
+        routes = self.routes(tier)
+        skipped = []
+        chosen = None
+        with self.lock:
+            now = time.time()
+            for route in routes:
+                if route == avoid and len(routes) > 1:
+                    skipped.append(f"{route} failed")
+                    continue
+                problem = self._problem(tier, route, now)
+                if problem:
+                    skipped.append(f"{route} {problem}")
+                    continue
+                chosen = route
+                break
+            if chosen is None:
+                # Everything is degraded: take whichever has been fastest lately
+                chosen = min(routes, key=lambda r: self.stats[r].recent_p95() if r in self.stats else 0.0)
+                skipped.append("all routes degraded")
+            reason = "; ".join(skipped) or "primary"
+            self.decisions.append({"time": round(now, 3), "tier": tier, "route": str(chosen), "reason": reason})
+        ROUTE_DECISIONS.inc(tier=tier, model=chosen.model, reason="failover" if skipped else "primary")
+        if skipped:
+            print(f"Routing {tier} call to {chosen}: {reason}")
+        return chosen, reason
+
+    def observe(self, route: Route, seconds: float, ok: bool):
+        with self.lock:
+            stats = self.stats.get(route)
+            if stats is None:
+                stats = self.stats[route] = _RouteStats(self.window)
+            stats.observe(seconds, ok)
+        ROUTE_SECONDS.observe(seconds, model=route.model)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.time()
+            return {
+                "tiers": {tier: [str(route) for route in routes] for tier, routes in self.tiers.items()},
+                "routes": {
+                    str(route): {
+                        "requests": stats.requests,
+                        "errors": stats.errors,
+                        "p95_seconds": round(stats.p95(), 3),
+                        "error_rate": round(stats.error_rate(), 3),
+                        "cooling_down": [tier for (tier, r), until in self.tripped.items() if r == route and until > now],
+                    }
+                    for route, stats in self.stats.items()
+                },
+                "recent_decisions": list(self.decisions)[-10:],
+            }
+
+
+def classify_turn(messages: List[Dict[str, Any]]) -> str:
+    """Tier for the next solver turn.
+
+    "fast" only when the latest tool results are all short, successful run_code
+    outputs, i.e. an answer that just needs submitting. The first turn, errors,
+    wrong answers and fresh data all go to the strong model.
+    """
+    if not LLM_ROUTING:
+        return "strong"
+    results = []
+    for message in reversed(messages):
+        if message.get("role") != "tool":
+            break
+        results.append(str(message.get("content")))
+    if not results:
+        return "strong"
+    for content in results:
+        simple = ("'return_code': 0" in content and "'stderr': ''" in content
+                  and len(content) <= ROUTER_SIMPLE_RESULT_CHARS)
+        if not simple:
+            return "strong"
+    return "fast"
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            strong = parse_routes(LLM_STRONG_MODEL, LLM_STRONG_FALLBACKS)
+            fast = parse_routes(LLM_FAST_MODEL, LLM_FAST_FALLBACKS) if LLM_ROUTING else strong
+            _router = ModelRouter(
+                {"strong": strong, "fast": fast},
+                {"strong": ROUTER_STRONG_P95_SECONDS, "fast": ROUTER_FAST_P95_SECONDS},
+            )
+        return _router
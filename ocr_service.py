@@ -0,0 +1,214 @@
+import base64
+import binascii
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List
+from shared_store import BASE64_STORE
+from dotenv import load_dotenv
+load_dotenv()
+
+IMAGE_DIR = "LLMFiles"
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(".cache", "ocr"))
+# Images larger than this (longest side, pixels) are downscaled before OCR; 0 disables
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2500"))
+# Binarize (Otsu threshold) when preprocessing is requested
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "0") == "1"
+# OCR results kept in memory in front of the on-disk cache
+OCR_MEMO_ENTRIES = int(os.getenv("OCR_MEMO_ENTRIES", "256"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, OCR_WORKERS),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_ocr():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_image_bytes(image: str) -> bytes:
+    """Resolve an image given as a BASE64_STORE key, a file path (relative to LLMFiles) or a base64 string."""
+    stored = BASE64_STORE.get(image)
+    if stored is not None:
+        image = stored
+    else:
+        for path in (image, os.path.join(IMAGE_DIR, image)):
+            if len(path) < 4096 and os.path.isfile(path):
+                with open(path, "rb") as f:
+                    return f.read()
+    if image.startswith("data:") and "," in image:
+        image = image.split(",", 1)[1]
+    try:
+        return base64.b64decode("".join(image.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("image is not a file in LLMFiles, a stored image key or valid base64")
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    weight_bg = sum_bg = 0
+    best, threshold = 0.0, 128
+    for i, h in enumerate(histogram):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def _ocr_bytes(data: bytes, lang: str, preprocess: bool, max_side: int, binarize: bool) -> str:
+    """Runs in a pool worker: OCR one image, preprocessing it first if asked to."""
+    from PIL import Image
+    import pytesseract
+    image = Image.open(io.BytesIO(data))
+    if preprocess:
+        image = image.convert("L")
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if binarize:
+            threshold = _otsu_threshold(image.histogram())
+            image = image.point(lambda p: 255 if p > threshold else 0)
+    return pytesseract.image_to_string(image, lang=lang).strip()
+
+
+def _cache_key(data: bytes, lang: str, preprocess: bool) -> str:
+    options = f"{lang}-{OCR_MAX_SIDE}-{int(OCR_BINARIZE)}" if preprocess else f"{lang}-raw"
+    return hashlib.sha256(data).hexdigest() + "-" + options
+
+
+def _remember(key: str, text: str):
+    with _memo_lock:
+        _memo[key] = text
+        _memo.move_to_end(key)
+        while len(_memo) > OCR_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+
+
+def _cached(key: str):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    path = os.path.join(OCR_CACHE_DIR, key + ".txt")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        _remember(key, text)
+        return text
+    return None
+
+
+def _store(key: str, text: str):
+    _remember(key, text)
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    path = os.path.join(OCR_CACHE_DIR, key + ".txt")
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _as_bool(value: Any) -> bool:
+    # Tool arguments may arrive as "false"/"0" strings
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def ocr_images(images: List[str], lang: str = "eng", preprocess: bool = False) -> List[Dict[str, Any]]:
+    """
+    OCR a batch of images. Results are cached by image content, and the
+    uncached ones are processed in parallel on a process pool.
+
+    Returns:
+        list: One ``{"image", "text"}`` or ``{"image", "error"}`` dict per input, in order.
+    """
+    preprocess = _as_bool(preprocess)
+    results = [None] * len(images)
+    pending = {}
+    hits = 0
+    for i, image in enumerate(images):
+        label = image if len(image) <= 120 else image[:40] + "..."
+        try:
+            data = load_image_bytes(image)
+        except Exception as e:
+            results[i] = {"image": label, "error": str(e)}
+            continue
+        key = _cache_key(data, lang, preprocess)
+        text = _cached(key)
+        if text is not None:
+            results[i] = {"image": label, "text": text}
+            hits += 1
+        else:
+            # The same image twice in one batch is OCRed once
+            pending.setdefault(key, (data, []))[1].append((i, label))
+
+    options = (lang, preprocess, OCR_MAX_SIDE, OCR_BINARIZE)
+    if len(pending) == 1 or OCR_WORKERS <= 1:
+        futures = None
+    else:
+        pool = _get_pool()
+        futures = {key: pool.submit(_ocr_bytes, data, *options) for key, (data, _) in pending.items()}
+    for key, (data, targets) in pending.items():
+        try:
+            text = futures[key].result() if futures else _ocr_bytes(data, *options)
+            _store(key, text)
+            entry = {"text": text}
+        except BrokenProcessPool as e:
+            shutdown_ocr()  # a worker died (e.g. out of memory); start a fresh pool next time
+            entry = {"error": f"OCR failed: {e}"}
+        except Exception as e:
+            entry = {"error": f"OCR failed: {e}"}
+        for i, label in targets:
+            results[i] = {"image": label, **entry}
+    print(f"OCR: {len(images)} images, {hits} from cache, {len(pending)} processed")
+    return results
+
+
+def ocr_image_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract text from one image (``payload["image"]``) or several (``payload["images"]``).
+
+    Images may be file paths relative to LLMFiles, base64 strings or keys
+    returned by encode_image_to_base64. ``lang`` defaults to "eng";
+    ``preprocess`` (default false) enables downscaling, and binarization
+    when OCR_BINARIZE is set.
+    """
+    lang = payload.get("lang") or "eng"
+    preprocess = _as_bool(payload.get("preprocess", False))
+    if payload.get("images"):
+        return {"results": ocr_images(list(payload["images"]), lang, preprocess)}
+    if not payload.get("image"):
+        raise ValueError("payload needs an 'image' or 'images' key")
+    result = ocr_images([payload["image"]], lang, preprocess)[0]
+    result.pop("image")
+    return result
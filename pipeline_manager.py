@@ -1,18 +1,40 @@
 from langchain_core.output_parsers import JsonOutputParser
+import asyncio
+import hashlib
+import threading
 import time
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from scraper import get_rendered_html as scraper
+from typing import List, Dict, Any, Optional, Callable
+from scraper import get_rendered_html as scraper, aget_rendered_html as ascraper
 from solver_agent import SolverAgent
+from downloader import (
+    download_file, adownload_file, prefetch_files, aprefetch_files,
+    warm_cache, awarm_cache
+)
 from llm import OpenRouterLLM
+from model_router import get_router
+from compaction import compact_content, count_tokens, DATA_EXTENSIONS, TASK_EXTRACTOR_TOKEN_BUDGET
+from telemetry import span, trace, bind_context
+from ingest import ingest_files, format_previews
+from extraction_cache import extraction_key, lookup as lookup_extraction, store as store_extraction
 import json
 from dotenv import load_dotenv
 load_dotenv()
 
-model = "openai/gpt-5.1-codex-max"
 api_key = os.getenv("AIPIPE_KEY")
+# Stream solver turns so tool calls start before the completion finishes
+STREAM_SOLVER = os.getenv("LLM_STREAM", "1") == "1"
+
+# Links on the quiz page that look like data files are fetched into the download
+# cache while the task extractor is still running.
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "1") == "1"
+SPECULATIVE_PREFETCH_MAX = int(os.getenv("SPECULATIVE_PREFETCH_MAX", "8"))
+_speculative_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+_speculative_tasks = set()
 
 class QuestionTemplate(BaseModel):
    task: str = Field(description="The task that needs to be done")
@@ -50,8 +72,8 @@ class SolutionModel(BaseModel):
 
 TASK_EXTRACTOR_PROMPT = """
 You are a Task Extractor. INPUTS:
-- {content}: quiz page text
-- {url}: source URL
+- {{content}}: quiz page text
+- {{url}}: source URL
 The task will have two parts first one is finding the answer and the other is to submit the answer using a POST request. The POST request part is only for submission, and is not part of finding the answer.
 STRICT INSTRUCTIONS:
 1) Produce EXACTLY ONE valid JSON object and NOTHING else (no markdown, no commentary, no code fences).
@@ -84,6 +106,8 @@ QUIZ_CONTENT:
 SOURCE_URL:
 {url}
 """
+# Part of the extraction cache key: editing the prompt invalidates cached extractions
+TASK_EXTRACTOR_PROMPT_VERSION = hashlib.sha256(TASK_EXTRACTOR_PROMPT.encode("utf-8")).hexdigest()[:12]
 
 SOLVER_SYSTEM_PROMPT = """
 You are a smart quiz solver agent. Your goal is to autonomously solve computational and logic tasks using the provided tools.
@@ -94,7 +118,8 @@ You are a smart quiz solver agent. Your goal is to autonomously solve computatio
 3. **Resource Management:** If a file mentioned in the task is missing, your first step should be to download it using the `download_file` tool.
 4. **Code Execution:** For calculations (like F1 scores, data processing, etc.), always write and execute Python code using `run_code`. Do not attempt to simulate complex math in your head.
 5. **Submission:** You must submit the final answer using the `submit_answer` tool to the specific submission URL provided in the task.
-6. **AVOID:** Downloading large files and keep the size less than 100 megabytes
+6. **Large Files:** Downloads over 100 megabytes are refused. To inspect a large file, call `download_file` with `head_bytes` to fetch just its first rows.
+7. **Tabular Data:** Downloaded CSV/JSON/Parquet files are ingested for DuckDB; use the schema preview instead of printing whole frames, and query with SQL instead of loading large files into pandas.
 """
 SOLVER_USER_PROMPT = """
 Here is the specific task you need to complete:
@@ -102,6 +127,7 @@ Here is the specific task you need to complete:
 - **Additional Context:** {other}
 - **Required Files:** {files} // All files are already downloaded in the environment, if they are not present download them by yourself.
   *(Note: Check if these files exist. If not, download them immediately.)*
+- **Data Previews:** {data_preview}
 **Submission Details:**
 - **Submission URL:** {submission_url}
 - **Required Payload Schema:**
@@ -118,41 +144,103 @@ Please begin by analyzing the task and executing the necessary steps to solve it
 **REMEMBER** to always include a "tool_call".
 """
 
-def main(url: str):
-    start_time = time.time()
-    content = scraper(url)
-    llm_task_extractor = OpenRouterLLM(api_key=api_key, model=model, json_mode=True)
+class StageTimer:
+    """Records when each stage of one quiz started and finished, relative to the quiz start.
+
+    ``on_stage`` is called with the name of each main-line stage as it starts
+    (stages run in the background via timed/atimed are not reported).
+    """
+
+    def __init__(self, on_stage: Optional[Callable[[str], None]] = None):
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, name: str, notify: bool = True):
+        if notify and self.on_stage is not None:
+            self.on_stage(name)
+        start = time.perf_counter() - self.origin
+        try:
+            with span(f"stage:{name}"):
+                yield
+        finally:
+            with self.lock:
+                self.stages[name] = (start, time.perf_counter() - self.origin)
+
+    def timed(self, name: str, func, *args, **kwargs):
+        with self.stage(name, notify=False):
+            return func(*args, **kwargs)
+
+    async def atimed(self, name: str, coro):
+        with self.stage(name, notify=False):
+            return await coro
+
+    def report(self) -> str:
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1][0])
+        lines = [f"  {name:<22} {start:7.2f}s -> {end:7.2f}s  ({end - start:.2f}s)" for name, (start, end) in stages]
+        busy = sum(end - start for _, (start, end) in stages)
+        wall = time.perf_counter() - self.origin
+        lines.append(f"  stages total {busy:.2f}s, wall clock {wall:.2f}s, overlap saved {max(0.0, busy - wall):.2f}s")
+        return "Stage timings:\n" + "\n".join(lines)
+
+def _speculative_urls(content) -> List[str]:
+    if not SPECULATIVE_PREFETCH or not isinstance(content, dict):
+        return []
+    urls = [
+        u for u in content.get("files", [])
+        if urlparse(u).scheme in ("http", "https") and urlparse(u).path.lower().endswith(DATA_EXTENSIONS)
+    ]
+    return urls[:SPECULATIVE_PREFETCH_MAX]
+
+def _prepare_solver():
+    # Each turn is routed to the fast or strong tier by SolverAgent (model_router.classify_turn)
+    llm_solver_agent = OpenRouterLLM(api_key=api_key, stream=STREAM_SOLVER, tier="strong")
+    system_message = {
+        "role": "system", 
+        "content": SOLVER_SYSTEM_PROMPT
+    }
+    return llm_solver_agent, system_message
+
+def _task_messages(content, url: str, budget: int = TASK_EXTRACTOR_TOKEN_BUDGET):
+    # Fit the page into the budget left after the prompt itself
+    overhead = count_tokens(TASK_EXTRACTOR_PROMPT.format(content="", url=url))
+    content, report = compact_content(content, max(1000, budget - overhead))
+    print(f"Task extractor content: {report['tokens_before']} -> {report['tokens_after']} tokens",
+          f"({', '.join(report['steps']) or 'unchanged'})")
     task_extractor_formatted = TASK_EXTRACTOR_PROMPT.format(
         content=content,
         url=url
     )
-    task_messages = [
+    return [
         {"role": "system", "content": task_extractor_formatted}
     ]
 
-    task_metadata = json.loads(llm_task_extractor.invoke(task_messages)["content"])
-    print("Task: ", json.dumps(task_metadata, indent=4))
-    task = task_metadata.get("task", "")
-    other = task_metadata.get("other", "")
-    submission_url = task_metadata.get("submission_url", "")
-    files_download_url = task_metadata.get("files", "")
-    payload = task_metadata.get("payload", "")
-    # Download files
-    files = []
-    for file, download_url in files_download_url.items():
-        files.append(download_file(filename=file, url=download_url))
+def _extraction_key(content, url: str, model: str) -> str:
+    return extraction_key(model, TASK_EXTRACTOR_PROMPT_VERSION, content, url)
 
-    # Solver agent
-    solver_user_prompt = SOLVER_USER_PROMPT.format(task= task,
-        other= other,
+def _parse_task(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        task_metadata = json.loads(response["content"])
+    except ValueError:
+        return None
+    return task_metadata if isinstance(task_metadata, dict) else None
+
+def _solver_messages(task_metadata: Dict[str, Any], files: List[str], url: str, system_message=None,
+                     data_preview: str = "None"):
+    solver_user_prompt = SOLVER_USER_PROMPT.format(task= task_metadata.get("task", ""),
+        other= task_metadata.get("other", ""),
         files= files,
+        data_preview= data_preview,
         url= url,
         email=os.getenv("EMAIL"),
         secret=os.getenv("SECRET"),
-        submission_url=submission_url,
-        payload=payload)
-    conv_history = [
-        {
+        submission_url=task_metadata.get("submission_url", ""),
+        payload=task_metadata.get("payload", ""))
+    return [
+        system_message or {
         "role": "system", 
         "content": SOLVER_SYSTEM_PROMPT
     },
@@ -161,43 +249,113 @@ def main(url: str):
         "content": solver_user_prompt
     },
     ]   # list of messages: HumanMessage, AIMessage, ToolMessage
-    llm_solver_agent = OpenRouterLLM(api_key=api_key, model=model)
-    solver_agent = SolverAgent(llm_solver_agent, conv_history, start_time)
-    conv_history = solver_agent.run_agent()
+
+def main(url: str, on_stage: Optional[Callable[[str], None]] = None):
+    start_time = time.time()
+    timer = StageTimer(on_stage)
+    with timer.stage("scrape"):
+        content = scraper(url)
+    # Overlap the task extractor call with prefetching the page's data files and solver setup
+    _speculative_pool.submit(bind_context(timer.timed), "speculative_prefetch", warm_cache, _speculative_urls(content))
+    solver_prep = _speculative_pool.submit(bind_context(timer.timed), "solver_prep", _prepare_solver)
+
+    with timer.stage("task_extraction"):
+        extractor_model = get_router().primary("fast").model
+        cache_key = _extraction_key(content, url, extractor_model)
+        task_metadata = lookup_extraction(cache_key, content)
+        if task_metadata is None:
+            llm_task_extractor = OpenRouterLLM(api_key=api_key, json_mode=True, tier="fast")
+            task_messages = _task_messages(content, url)
+            task_metadata = _parse_task(llm_task_extractor.invoke(task_messages))
+            if task_metadata is None:
+                # The fast model returned something unusable, escalate once
+                task_metadata = json.loads(llm_task_extractor.invoke(task_messages, tier="strong")["content"])
+            # Only cache what the keyed model produced, not an escalated or failed-over extraction
+            if llm_task_extractor.model == extractor_model:
+                store_extraction(cache_key, content, task_metadata)
+        else:
+            print("Task extraction served from cache")
+    print("Task: ", json.dumps(task_metadata, indent=4))
+    files_download_url = task_metadata.get("files", "")
+    # Download files
+    with timer.stage("download"):
+        files = prefetch_files(files_download_url)
+    # Convert tabular files for out-of-core queries and describe them for the prompt
+    with timer.stage("ingest"):
+        previews = ingest_files(files, url)
+
+    # Solver agent
+    llm_solver_agent, system_message = solver_prep.result()
+    conv_history = _solver_messages(task_metadata, files, url, system_message, format_previews(previews))
+    solver_agent = SolverAgent(llm_solver_agent, conv_history, start_time, task=task_metadata, quiz_url=url)
+    with timer.stage("solver"):
+        conv_history = solver_agent.run_agent()
     print(json.dumps(conv_history[-1], indent=4), '\n')
+    print(timer.report())
     return solver_agent.next_url
 
-def download_file(url: str, filename: str) -> str:
-    """
-    Download a file from a URL and save it with the given filename
-    in the current working directory.
+async def amain(url: str, on_stage: Optional[Callable[[str], None]] = None):
+    start_time = time.time()
+    timer = StageTimer(on_stage)
+    with timer.stage("scrape"):
+        content = await ascraper(url)
+    # Overlap the task extractor call with prefetching the page's data files and solver setup
+    speculative = asyncio.create_task(timer.atimed("speculative_prefetch", awarm_cache(_speculative_urls(content))))
+    _speculative_tasks.add(speculative)
+    speculative.add_done_callback(_speculative_tasks.discard)
+    solver_prep = asyncio.create_task(timer.atimed("solver_prep", asyncio.to_thread(_prepare_solver)))
 
-    Args:
-        url (str): Direct URL to the file.
-        filename (str): The filename to save the downloaded content as.
+    with timer.stage("task_extraction"):
+        extractor_model = get_router().primary("fast").model
+        # Hashing and compacting a large page is CPU work, and the cache is
+        # SQLite-backed: keep both off the event loop
+        cache_key = await asyncio.to_thread(_extraction_key, content, url, extractor_model)
+        task_metadata = await asyncio.to_thread(lookup_extraction, cache_key, content)
+        if task_metadata is None:
+            llm_task_extractor = OpenRouterLLM(api_key=api_key, json_mode=True, tier="fast")
+            task_messages = await asyncio.to_thread(_task_messages, content, url)
+            task_metadata = _parse_task(await llm_task_extractor.ainvoke(task_messages))
+            if task_metadata is None:
+                # The fast model returned something unusable, escalate once
+                task_metadata = json.loads((await llm_task_extractor.ainvoke(task_messages, tier="strong"))["content"])
+            # Only cache what the keyed model produced, not an escalated or failed-over extraction
+            if llm_task_extractor.model == extractor_model:
+                await asyncio.to_thread(store_extraction, cache_key, content, task_metadata)
+        else:
+            print("Task extraction served from cache")
+    print("Task: ", json.dumps(task_metadata, indent=4))
+    files_download_url = task_metadata.get("files", "")
+    # Download files concurrently
+    with timer.stage("download"):
+        files = await aprefetch_files(files_download_url)
+    # Convert tabular files for out-of-core queries and describe them for the prompt
+    with timer.stage("ingest"):
+        previews = await asyncio.to_thread(ingest_files, files, url)
 
-    Returns:
-        str: Full path to the saved file.
-    """
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        directory_name = "LLMFiles"
-        os.makedirs(directory_name, exist_ok=True)
-        parent_directory = os.path.dirname(filename)
-        if parent_directory and not os.path.isdir(parent_directory):
-            os.makedirs(parent_directory, exist_ok=True)
-        path = os.path.join(directory_name, filename)
-        print("Path: ", path)
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        return filename
-    except Exception:
-        return url
-
-def run_pipeline(url: str):
-    while url is not None:
-        print("Solving: ", url)
-        url = main(url)
+    # Solver agent
+    llm_solver_agent, system_message = await solver_prep
+    conv_history = _solver_messages(task_metadata, files, url, system_message, format_previews(previews))
+    solver_agent = SolverAgent(llm_solver_agent, conv_history, start_time, task=task_metadata, quiz_url=url)
+    with timer.stage("solver"):
+        conv_history = await solver_agent.arun_agent()
+    print(json.dumps(conv_history[-1], indent=4), '\n')
+    print(timer.report())
+    return solver_agent.next_url
+
+def run_pipeline(url: str, progress: Optional[Callable[[str, str], None]] = None):
+    """Solve the quiz chain starting at url. ``progress(url, stage)`` is called as each quiz moves through its stages."""
+    with trace("quiz_chain", url=url):
+        while url is not None:
+            print("Solving: ", url)
+            current = url
+            with span("quiz", url=url):
+                url = main(url, (lambda stage: progress(current, stage)) if progress else None)
+
+async def arun_pipeline(url: str, progress: Optional[Callable[[str, str], None]] = None):
+    # Concurrency is bounded by the caller (JobScheduler's JOB_WORKERS)
+    with trace("quiz_chain", url=url):
+        while url is not None:
+            print("Solving: ", url)
+            current = url
+            with span("quiz", url=url):
+                url = await amain(url, (lambda stage: progress(current, stage)) if progress else None)
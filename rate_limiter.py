@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+from shared_store import SHARED_STATE_DB
+from dotenv import load_dotenv
+load_dotenv()
+
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))
+RATE_BURST = float(os.getenv("LLM_RATE_BURST", "10"))
+MIN_RATE_PER_MINUTE = float(os.getenv("LLM_MIN_RATE_PER_MINUTE", "6"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "30"))
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Exponential backoff with full jitter, so workers hitting a 429 together don't retry together."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """A token bucket shared by every request made with one API key.
+
+    The refill rate adapts: it is halved on every 429 and creeps back up to the
+    configured rate on success. ``Retry-After`` and ``X-RateLimit-*`` headers
+    block the bucket until the provider says we may send again.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, rate_per_minute: float = RATE_PER_MINUTE, burst: float = RATE_BURST,
+                 min_rate_per_minute: float = MIN_RATE_PER_MINUTE):
+        self.max_rate = rate_per_minute / 60
+        self.min_rate = min(min_rate_per_minute / 60, self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = self.clock()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before sending."""
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1
+            delay = max(0.0, -self.tokens / self.rate, self.blocked_until - now)
+            self.requests += 1
+            self.waited_seconds += delay
+            return delay
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def _offload(self, fn, *args):
+        # In-memory buckets are cheap enough to update on the event loop
+        return fn(*args)
+
+    async def aacquire(self):
+        delay = await self._offload(self.reserve)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def aupdate_from_headers(self, headers):
+        await self._offload(self.update_from_headers, headers)
+
+    async def aon_success(self):
+        await self._offload(self.on_success)
+
+    async def aon_throttled(self, retry_after: Optional[float], attempt: int) -> float:
+        return await self._offload(self.on_throttled, retry_after, attempt)
+
+    def update_from_headers(self, headers):
+        """Honour provider rate-limit headers on any response."""
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining = float(remaining)
+            reset = float(reset)
+        except ValueError:
+            return
+        if remaining > 0:
+            return
+        # OpenRouter reports the reset as epoch milliseconds, others as seconds
+        reset_at = reset / 1000 if reset > 1e11 else reset
+        wait = reset_at - time.time()
+        if 0 < wait < 3600:
+            with self.lock:
+                self.blocked_until = max(self.blocked_until, self.clock() + wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def on_throttled(self, retry_after: Optional[float], attempt: int) -> float:
+        """Register a 429 and return how long this caller should back off."""
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        with self.lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.blocked_until = max(self.blocked_until, self.clock() + delay)
+        return delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            return {
+                "rate_per_minute": round(self.rate * 60, 2),
+                "tokens": round(self.tokens, 2),
+                "blocked_for_seconds": round(max(0.0, self.blocked_until - now), 2),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited_seconds, 2),
+            }
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """A TokenBucket whose state lives in an SQLite file, so every worker process
+    draws from one budget per key instead of each getting the full rate.
+
+    Each operation loads the bucket, applies the change and saves it inside one
+    ``BEGIN IMMEDIATE`` transaction on a connection kept open per process. The
+    async methods run that transaction in a worker thread, since it can wait on
+    another process's lock. The request/throttle counters stay per process.
+    """
+
+    # Monotonic clocks are not comparable between processes
+    clock = staticmethod(time.time)
+
+    def __init__(self, path: str, key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.key = key
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._db_lock:
+            db = self._connection()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    rate REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    blocked_until REAL NOT NULL
+                )
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process: a forked child must not reuse its parent's
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db_pid = os.getpid()
+        return self._db
+
+    async def _offload(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    @contextmanager
+    def _shared(self):
+        with self._db_lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT rate, tokens, updated, blocked_until FROM rate_limits WHERE key = ?",
+                                 (self.key,)).fetchone()
+                if row is not None:
+                    self.rate, self.tokens, self.updated, self.blocked_until = row
+                yield
+                db.execute("INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)",
+                           (self.key, self.rate, self.tokens, self.updated, self.blocked_until))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def reserve(self) -> float:
+        with self._shared():
+            return super().reserve()
+
+    def update_from_headers(self, headers):
+        if headers.get("x-ratelimit-remaining") is None:
+            return
+        with self._shared():
+            super().update_from_headers(headers)
+
+    async def aupdate_from_headers(self, headers):
+        # Skip the thread hop for the common response without rate-limit headers
+        if headers.get("x-ratelimit-remaining") is not None:
+            await super().aupdate_from_headers(headers)
+
+    def on_success(self):
+        with self._shared():
+            super().on_success()
+
+    def on_throttled(self, retry_after: Optional[float], attempt: int) -> float:
+        with self._shared():
+            return super().on_throttled(retry_after, attempt)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._shared():
+            return dict(super().snapshot(), shared=True)
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def _key_id(api_key: str) -> str:
+    # Never expose the key itself in metrics
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+def get_limiter(api_key: str) -> TokenBucket:
+    key = _key_id(api_key)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            # Worker processes (JOB_BACKEND=sqlite) share one budget through SHARED_STATE_DB
+            limiter = _limiters[key] = SQLiteTokenBucket(SHARED_STATE_DB, key) if SHARED_STATE_DB else TokenBucket()
+        return limiter
+
+
+def snapshot_all() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key: limiter.snapshot() for key, limiter in limiters.items()}
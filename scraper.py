@@ -1,8 +1,20 @@
-from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
+import asyncio
+import os
+from html.parser import HTMLParser
+from browser_pool import get_pool, RENDER_TIMEOUT
+from telemetry import span
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
+try:
+    from lxml import html as lxml_html
+except ImportError:  # e.g. no wheel for this platform: the stdlib parser is used instead
+    lxml_html = None
+
+# "lxml" or "html.parser"; defaults to lxml when it is installed
+HTML_BACKEND = os.getenv("SCRAPER_HTML_BACKEND", "lxml" if lxml_html is not None else "html.parser")
+SKIPPED_TAGS = {"script", "style"}
+
 
 def extract_all_urls(html: str, base_url: str) -> list:
     soup = BeautifulSoup(html, "html.parser")
@@ -41,32 +53,164 @@ def clean_text(html: str, base_url: str = "") -> str:
     return "\n".join(lines)
 
 
-def get_rendered_html(url: str) -> dict:
-    print("\nFetching and rendering:", url)
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            page.goto(url, wait_until="networkidle")
-            raw_html = page.content()
-            browser.close()
-
-            # 1️⃣ Extract ALL file URLs before cleaning
-            all_urls = extract_all_urls(raw_html, url)
+class _PageExtractor:
+    """Collects URLs and readable text in one pass over the document.
+
+    Produces the same output as ``extract_all_urls`` + ``clean_text``: script and
+    style bodies are dropped, ``<a href>`` becomes "text (URL)" and ``<img src>``
+    becomes "[Image: URL]".
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.urls = set()
+        self.strings = []
+        self.skip_depth = 0
+        self.anchor_href = None
+        self.anchor_text = []
+        self._joined = {}
+
+    def _join(self, link: str) -> str:
+        joined = self._joined.get(link)
+        if joined is None:
+            joined = self._joined[link] = urljoin(self.base_url, link)
+        return joined
+
+    def start(self, tag: str, attrs: dict):
+        href = attrs.get("href")
+        src = attrs.get("src")
+        if href is not None:
+            self.urls.add(self._join(href))
+        if src is not None:
+            self.urls.add(self._join(src))
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif self.skip_depth or self.anchor_href is not None:
+            return
+        elif tag == "a" and href is not None:
+            self.anchor_href = self._join(href)
+            self.anchor_text = []
+        elif tag == "img" and src is not None:
+            self.strings.append(f"[Image: {self._join(src)}]")
+
+    def end(self, tag: str):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "a" and self.anchor_href is not None and not self.skip_depth:
+            self._close_anchor()
+
+    def text(self, data: str):
+        if not data or self.skip_depth:
+            return
+        if self.anchor_href is not None:
+            stripped = data.strip()
+            if stripped:
+                self.anchor_text.append(stripped)
+        else:
+            self.strings.append(data)
+
+    def _close_anchor(self):
+        self.strings.append(f"{''.join(self.anchor_text)} ({self.anchor_href})")
+        self.anchor_href = None
+        self.anchor_text = []
+
+    def result(self):
+        if self.anchor_href is not None:
+            self._close_anchor()
+        text = "\n".join(self.strings)
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        return list(self.urls), "\n".join(lines)
+
+
+class _StdlibPageParser(HTMLParser):
+    def __init__(self, extractor: _PageExtractor):
+        super().__init__(convert_charrefs=True)
+        self.extractor = extractor
+
+    def handle_starttag(self, tag, attrs):
+        self.extractor.start(tag, {k: v if v is not None else "" for k, v in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.extractor.end(tag)
+
+    def handle_endtag(self, tag):
+        self.extractor.end(tag)
+
+    def handle_data(self, data):
+        self.extractor.text(data)
+
+
+def _walk_lxml(html: str, extractor: _PageExtractor):
+    root = lxml_html.document_fromstring(html)
+    # Iterative depth-first walk; unlike iterwalk it also visits comments, whose tail text is visible
+    stack = [(root, False)]
+    while stack:
+        element, closing = stack.pop()
+        is_tag = isinstance(element.tag, str)
+        if closing:
+            if is_tag:
+                extractor.end(element.tag.lower())
+            extractor.text(element.tail)
+            continue
+        if is_tag:
+            extractor.start(element.tag.lower(), element.attrib)
+            extractor.text(element.text)
+        stack.append((element, True))
+        stack.extend((child, False) for child in reversed(element))
+
+
+def extract_page(html: str, base_url: str, backend: str = None) -> tuple:
+    """Parse ``html`` once and return ``(urls, cleaned_text)``."""
+    extractor = _PageExtractor(base_url)
+    backend = backend or HTML_BACKEND
+    if backend == "lxml" and lxml_html is not None and html.strip():
+        _walk_lxml(html, extractor)
+    else:
+        parser = _StdlibPageParser(extractor)
+        parser.feed(html)
+        parser.close()
+    return extractor.result()
+
+
+def _build_result(raw_html: str, url: str) -> dict:
+    # Extract ALL file URLs and the readable text for the LLM in a single parse
+    all_urls, cleaned_text = extract_page(raw_html, url)
+
+    # Optionally truncate long pages
+    if len(cleaned_text) > 300000:
+        cleaned_text = cleaned_text[:300000] + "... [TRUNCATED]"
+
+    return {
+        "url": url,
+        "text": cleaned_text,
+        "files": all_urls,
+    }
 
-            # 2️⃣ Clean readable text for the LLM
-            cleaned_text = clean_text(raw_html, url)
 
-            # Optionally truncate long pages
-            if len(cleaned_text) > 300000:
-                cleaned_text = cleaned_text[:300000] + "... [TRUNCATED]"
-
-            return {
-                "url": url,
-                "text": cleaned_text,
-                "files": all_urls,
-            }
-
-    except Exception as e:
-        return {"error": f"Error fetching/rendering: {str(e)}"}
+def get_rendered_html(url: str) -> dict:
+    print("\nFetching and rendering:", url)
+    with span("get_rendered_html", url=url) as s:
+        try:
+            raw_html = get_pool().render(url)
+            result = _build_result(raw_html, url)
+            s.set(html_bytes=len(raw_html), files=len(result.get("files", [])))
+            return result
+        except Exception as e:
+            s.set(error=str(e))
+            return {"error": f"Error fetching/rendering: {str(e)}"}
+
+
+async def aget_rendered_html(url: str) -> dict:
+    print("\nFetching and rendering:", url)
+    with span("get_rendered_html", url=url) as s:
+        try:
+            future = asyncio.wrap_future(get_pool().submit(url))
+            raw_html = await asyncio.wait_for(future, timeout=RENDER_TIMEOUT)
+            # Parsing is CPU bound, keep it off the event loop
+            result = await asyncio.to_thread(_build_result, raw_html, url)
+            s.set(html_bytes=len(raw_html), files=len(result.get("files", [])))
+            return result
+        except Exception as e:
+            s.set(error=str(e))
+            return {"error": f"Error fetching/rendering: {str(e)}"}
@@ -1,2 +1,275 @@
-BASE64_STORE = {}
-url_time = {}
\ No newline at end of file
+import atexit
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+STORE_MAX_BYTES = int(os.getenv("STORE_MAX_BYTES", str(256 * 1024 ** 2)))
+STORE_MAX_DISK_BYTES = int(os.getenv("STORE_MAX_DISK_BYTES", str(2 * 1024 ** 3)))
+# Values at least this large are kept in a file while stored, and only read into memory on access
+STORE_SPILL_BYTES = int(os.getenv("STORE_SPILL_BYTES", str(1024 ** 2)))
+STORE_TTL_SECONDS = float(os.getenv("STORE_TTL_SECONDS", "3600"))
+STORE_SPILL_DIR = os.getenv("STORE_SPILL_DIR", os.path.join(".cache", "store"))
+# Small state that every worker process must see (url_time) lives here when set.
+# Defaults to a file under .cache when quiz chains run in worker processes.
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB") or (
+    os.path.join(".cache", "shared_state.sqlite") if os.getenv("JOB_BACKEND") == "sqlite" else ""
+)
+
+
+class _Entry:
+    __slots__ = ("value", "path", "kind", "size", "expires")
+
+    def __init__(self, value, path, kind, size, expires):
+        self.value = value
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.expires = expires
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value) if value.isascii() else len(value.encode("utf-8"))
+    return sys.getsizeof(value)
+
+
+class BoundedStore(MutableMapping):
+    """Thread-safe dict with a byte budget, LRU eviction and per-entry TTL.
+
+    str/bytes values of ``spill_bytes`` or more are written to files under
+    ``spill_dir`` and read back on access, so large base64 images only sit on
+    the heap while in use. Memory and disk use are bounded separately; the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, name: str, max_bytes: int = STORE_MAX_BYTES, ttl: Optional[float] = STORE_TTL_SECONDS,
+                 spill_bytes: int = STORE_SPILL_BYTES, max_disk_bytes: int = STORE_MAX_DISK_BYTES,
+                 spill_dir: str = STORE_SPILL_DIR):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_bytes = spill_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_root = spill_dir
+        self._dir = None
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._counter = 0
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _spill(self, value) -> str:
+        if self._dir is None:
+            os.makedirs(self.spill_root, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix=f"{self.name}-", dir=self.spill_root)
+            atexit.register(self.close)
+        self._counter += 1
+        path = os.path.join(self._dir, f"{self._counter}.bin")
+        with open(path, "wb") as f:
+            f.write(value.encode("utf-8") if isinstance(value, str) else value)
+        return path
+
+    def _load(self, entry: _Entry):
+        if entry.path is None:
+            return entry.value
+        with open(entry.path, "rb") as f:
+            data = f.read()
+        return data.decode("utf-8") if entry.kind is str else entry.kind(data)
+
+    def _drop(self, key, entry: _Entry):
+        del self._entries[key]
+        if entry.path is None:
+            self.memory_bytes -= entry.size
+        else:
+            self.disk_bytes -= entry.size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return entry.expires is not None and entry.expires <= now
+
+    def _evict(self):
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            if self._expired(entry, now):
+                self._drop(key, entry)
+                self.expirations += 1
+        # Oldest first: OrderedDict order is least to most recently used
+        for key, entry in list(self._entries.items()):
+            if self.memory_bytes <= self.max_bytes and self.disk_bytes <= self.max_disk_bytes:
+                break
+            if (entry.path is None and self.memory_bytes > self.max_bytes) or \
+                    (entry.path is not None and self.disk_bytes > self.max_disk_bytes):
+                self._drop(key, entry)
+                self.evictions += 1
+
+    def __setitem__(self, key, value):
+        size = _size_of(value)
+        spilled = isinstance(value, (str, bytes, bytearray)) and size >= self.spill_bytes
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, self._entries[key])
+            path = self._spill(value) if spilled else None
+            expires = time.time() + self.ttl if self.ttl else None
+            self._entries[key] = _Entry(None if spilled else value, path, type(value), size, expires)
+            if spilled:
+                self.disk_bytes += size
+            else:
+                self.memory_bytes += size
+            self._evict()
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.time()):
+                self._drop(key, entry)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._load(entry)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._drop(key, self._entries[key])
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry, time.time())
+
+    def __iter__(self):
+        with self._lock:
+            now = time.time()
+            keys = [k for k, e in self._entries.items() if not self._expired(e, now)]
+        return iter(keys)
+
+    def __len__(self):
+        with self._lock:
+            now = time.time()
+            return sum(1 for e in self._entries.values() if not self._expired(e, now))
+
+    def clear(self):
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                self._drop(key, entry)
+
+    def close(self):
+        self.clear()
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self.memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self.disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteStore(MutableMapping):
+    """Dict of JSON-serializable values shared by processes through an SQLite file, with a TTL."""
+
+    def __init__(self, path: str, namespace: str, ttl: Optional[float] = STORE_TTL_SECONDS):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def __setitem__(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+                       (self.namespace, key, json.dumps(value), expires))
+            db.execute("DELETE FROM kv WHERE namespace = ? AND expires <= ?", (self.namespace, time.time()))
+
+    def __getitem__(self, key):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+                (self.namespace, key, time.time()),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return json.loads(row[0])
+
+    def __delitem__(self, key):
+        with self._connect() as db:
+            deleted = db.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (self.namespace, key)).rowcount
+        if not deleted:
+            raise KeyError(key)
+
+    def _live_keys(self):
+        with self._connect() as db:
+            return [row[0] for row in db.execute(
+                "SELECT key FROM kv WHERE namespace = ? AND (expires IS NULL OR expires > ?)",
+                (self.namespace, time.time()),
+            )]
+
+    def __iter__(self):
+        return iter(self._live_keys())
+
+    def __len__(self):
+        return len(self._live_keys())
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+# Base64 images belong to one chain, which always runs in a single process
+BASE64_STORE = BoundedStore("base64")
+url_time = (
+    SQLiteStore(SHARED_STATE_DB, "url_time") if SHARED_STATE_DB
+    else BoundedStore("url_time", max_bytes=16 * 1024 ** 2, spill_bytes=sys.maxsize)
+)
+
+
+def snapshot() -> dict:
+    return {"base64": BASE64_STORE.stats(), "url_time": url_time.stats()}
@@ -1,113 +1,282 @@
-from tools import (
-    get_rendered_html, download_file,
-    run_code, add_dependencies, submit_answer,
-    transcribe_audio, ocr_image_tool, encode_image_to_base64
-)
 from llm import OpenRouterLLM
+from history import HistoryManager
+from kernel_pool import get_kernel_pool
+from telemetry import span, counter, histogram, bind_context
+from tool_registry import LazyFunctionMap
+from model_router import classify_turn
+from submission_validator import validate_submission, normalized_payload, answer_hints
+from concurrent.futures import ThreadPoolExecutor, wait
+import asyncio
 import json
+import os
 import time
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
 RETRY_LIMIT = 2
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+# These change shared state (the submission, installed packages, files written by
+# code), so they wait for every earlier call in the turn and block later ones.
+SERIAL_TOOLS = {"submit_answer", "run_code", "add_dependencies"}
+
+TOOL_CALLS = counter("tool_calls_total", "Solver tool calls by outcome", ("tool", "status"))
+SUBMISSIONS = counter("submissions_total", "Answers submitted by result", ("result",))
+SUBMISSIONS_REJECTED = counter("submissions_rejected_total", "submit_answer calls stopped by local validation", ("field",))
+SUBMIT_ATTEMPTS = histogram("quiz_submit_attempts", "Answers POSTed per quiz, by how the quiz ended", ("outcome",),
+                            buckets=(1, 2, 3, 4, 5, 8))
+
+
+class _ToolTurn:
+    """Schedules the tool calls of one assistant turn on the agent's executor.
+
+    Independent calls run concurrently; results are returned in the order the
+    model issued the calls.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.futures = {}
+        self.last_barrier = None
+        self.downloads = {}
+
+    def dispatch(self, tool_call):
+        if tool_call["id"] in self.futures:
+            return
+        name = tool_call["function"]["name"]
+        try:
+            args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except ValueError:
+            args = {}
+        if name in SERIAL_TOOLS:
+            deps = list(self.futures.values())
+        else:
+            deps = [self.last_barrier] if self.last_barrier else []
+            # Anything that mentions a file being downloaded in this turn waits for it
+            mentioned = json.dumps(args)
+            deps += [f for filename, f in self.downloads.items() if filename and filename in mentioned]
+        future = self.agent._executor.submit(bind_context(self._run_after), deps, tool_call)
+        if name in SERIAL_TOOLS:
+            self.last_barrier = future
+        if name == "download_file" and isinstance(args, dict):
+            self.downloads[args.get("filename")] = future
+        self.futures[tool_call["id"]] = future
+
+    def _run_after(self, deps, tool_call):
+        wait(deps)
+        return self.agent._run_tool_call(tool_call)
+
+    def results(self, tool_calls):
+        for tool_call in tool_calls:
+            self.dispatch(tool_call)
+        return [self.futures[tool_call["id"]].result() for tool_call in tool_calls]
+
+    async def aresults(self, tool_calls):
+        for tool_call in tool_calls:
+            self.dispatch(tool_call)
+        return [await asyncio.wrap_future(self.futures[tool_call["id"]]) for tool_call in tool_calls]
+
 class SolverAgent:
-    def __init__(self, llm: OpenRouterLLM, messages, start_time):
+    def __init__(self, llm: OpenRouterLLM, messages, start_time, task: Dict[str, Any] = None, quiz_url: str = None):
         self.llm = llm
+        # The extracted QuestionTemplate and the quiz URL; submissions are checked against them before sending
+        self.task = task or {}
+        self.quiz_url = quiz_url
+        self._rejected = set()
         self.messages = messages 
         self.run_limit = 20
         self.next_url = None
         self.start_time = start_time
         self.retry_count = 0
         self.run = True
+        # Sends a pruned view of self.messages; the full history is kept here
+        self.history = HistoryManager()
+        # Tool calls run here, streamed ones start while the rest of the response is still arriving
+        self._executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+        # One warm Python kernel per quiz, so data loaded by run_code stays in memory between calls
+        self.kernel = get_kernel_pool().session()
 
     def run_agent(self):
-        for _ in range(self.run_limit):
-            if not self.run:
-                break
-            response = self.llm.invoke(self.messages, tools=TOOLS_SCHEMA)
-            self.messages.append(response)
-            if "tool_calls" in response:
-                for tool_call in response["tool_calls"]:
-                    self.call_tool(tool_call["function"]["name"], json.loads(tool_call["function"]["arguments"]), tool_call["id"])
-            else:
+        try:
+            for _ in range(self.run_limit):
+                if not self.run:
+                    break
+                turn = _ToolTurn(self)
+                response = self.llm.invoke(self.history.build(self.messages), tools=TOOLS_SCHEMA,
+                                           on_tool_call=turn.dispatch if self.llm.stream else None,
+                                           tier=classify_turn(self.messages))
+                self.messages.append(response)
+                if "tool_calls" in response:
+                    self.messages.extend(turn.results(response["tool_calls"]))
+                else:
+                    if not self.run:
+                        break
+        finally:
+            if self.run:
+                # Turn limit reached (or an error) before the quiz was settled
+                self._finish("unfinished")
+            self._executor.shutdown(wait=False)
+            self.kernel.close()
+        return self.messages
+
+    async def arun_agent(self):
+        try:
+            for _ in range(self.run_limit):
                 if not self.run:
                     break
-            time.sleep(5)
+                turn = _ToolTurn(self)
+                response = await self.llm.ainvoke(self.history.build(self.messages), tools=TOOLS_SCHEMA,
+                                                  on_tool_call=turn.dispatch if self.llm.stream else None,
+                                                  tier=classify_turn(self.messages))
+                self.messages.append(response)
+                if "tool_calls" in response:
+                    # Tools are blocking (subprocesses, HTTP, OCR), they run on the executor
+                    self.messages.extend(await turn.aresults(response["tool_calls"]))
+                else:
+                    if not self.run:
+                        break
+        finally:
+            if self.run:
+                # Turn limit reached (or an error) before the quiz was settled
+                self._finish("unfinished")
+            self._executor.shutdown(wait=False)
+            self.kernel.close()
         return self.messages
+
+    def _run_tool_call(self, tool_call):
+        try:
+            args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except ValueError as e:
+            return {
+                "role": "tool",
+                "content": f"Tool call resulted in: {{'error': 'Arguments are not valid JSON: {e}'}}",
+                "tool_call_id": tool_call["id"]
+            }
+        return self.tool_message(tool_call["function"]["name"], args, tool_call["id"])
+
     def call_tool(self, func_name, args, id):
+        self.messages.append(self.tool_message(func_name, args, id))
+
+    def tool_message(self, func_name, args, id):
         print("Calling tool: ", func_name, "with args", args)
-        try:
-            if func_name == "submit_answer":
-                submission = self.handle_submission(args=args) 
-                submission["tool_call_id"] = id
-                self.messages.append(submission)
-            else:
-                result = FUNCTION_MAP[func_name](**args)
-                self.messages.append(
-                    {
+        tool = func_name if func_name in FUNCTION_MAP else "unknown"
+        with span(f"tool:{tool}", tool=func_name) as s:
+            try:
+                if func_name == "submit_answer":
+                    submission = self.handle_submission(args=args) 
+                    submission["tool_call_id"] = id
+                    TOOL_CALLS.inc(tool=tool, status="ok")
+                    return submission
+                elif func_name == "run_code":
+                    result = self.kernel.run(**args)
+                    s.set(return_code=result.get("return_code"))
+                    TOOL_CALLS.inc(tool=tool, status="ok" if result.get("return_code") == 0 else "failed")
+                    return {
+                        "role": "tool",
+                        "content": f"Tool call resulted in: {result}",
+                        "tool_call_id": id
+                    }
+                else:
+                    result = FUNCTION_MAP[func_name](**args)
+                    TOOL_CALLS.inc(tool=tool, status="ok")
+                    return {
                         "role": "tool",
                         "content": f"Tool call resulted in: {result}",
                         "tool_call_id": id
                     }
-                )
-        except Exception as e:
-            result = {"error": f"Error {e} occurred while calling {func_name} with args {args}"}
-            self.messages.append(
-                {
+            except Exception as e:
+                TOOL_CALLS.inc(tool=tool, status="error")
+                s.set(error=str(e))
+                result = {"error": f"Error {e} occurred while calling {func_name} with args {args}"}
+                return {
                     "role": "tool",
                     "content": f"Tool call resulted in: {result}",
                     "tool_call_id": id
                 }
-            )
+
+    def _validate(self, args) -> Optional[Dict[str, Any]]:
+        """The tool message rejecting ``args`` without sending them, or None if they look right."""
+        errors = validate_submission(args, self.task.get("payload"), self.quiz_url, self.task.get("submission_url"))
+        key = json.dumps(args, sort_keys=True, default=str)
+        # The schema is itself extracted by an LLM: an identical resubmission is sent as is
+        if not errors or key in self._rejected:
+            return None
+        self._rejected.add(key)
+        for error in errors:
+            SUBMISSIONS_REJECTED.inc(field=error["field"])
+        return {
+            "role": "tool",
+            "content": "Submission NOT sent, it does not match the required payload. Fix these problems and call "
+                       "submit_answer again: " + json.dumps({"errors": errors}),
+        }
+
+    def _finish(self, outcome: str):
+        self.run = False
+        SUBMIT_ATTEMPTS.observe(self.retry_count, outcome=outcome)
 
     def handle_submission(self, args):
-        try:
-            self.retry_count += 1
-            resp = submit_answer(**args)
-            correct = resp.get("correct", None)
-            self.next_url = resp.get("next_url", None)
-            reason = resp.get("reason", None)
-            if correct or (self.retry_count > RETRY_LIMIT and self.next_url is not None):
-                result = {
-                    "role": "tool",
-                    "content": "Task completed successfully you can stop!",
-				        }
-                self.run = False
-            elif not self.next_url:
-                result = {
+        with span("handle_submission", submission_url=args.get("submission_url")) as s:
+            rejection = self._validate(args)
+            if rejection is not None:
+                SUBMISSIONS.inc(result="invalid")
+                s.set(rejected=True)
+                return rejection
+            try:
+                self.retry_count += 1
+                resp = FUNCTION_MAP["submit_answer"](**normalized_payload(args))
+                correct = resp.get("correct", None)
+                SUBMISSIONS.inc(result="correct" if correct else "wrong")
+                s.set(correct=bool(correct), attempt=self.retry_count, next_url=resp.get("next_url"))
+                self.next_url = resp.get("next_url", None)
+                reason = resp.get("reason", None)
+                if not correct:
+                    hints = answer_hints(args, self.task.get("payload"))
+                    if hints:
+                        reason = f"{reason} (Possible cause: {json.dumps(hints)})"
+                if correct or (self.retry_count > RETRY_LIMIT and self.next_url is not None):
+                    result = {
+                        "role": "tool",
+                        "content": "Task completed successfully you can stop!",
+    				        }
+                    self._finish("solved" if correct else "skipped")
+                elif not self.next_url:
+                    result = {
+                            "role": "tool",
+                            "content": f"Retry again! Your previous answer was wrong because, {reason}",
+                        }
+                elif time.time() - self.start_time >= 180:
+                    result = {
+                           "role": "tool",
+                           "content": "Task completed",
+    					}
+                    self._finish("timed_out")
+                else:
+                    result = {
                         "role": "tool",
                         "content": f"Retry again! Your previous answer was wrong because, {reason}",
                     }
-            elif time.time() - self.start_time >= 180:
+                        
+            except Exception as e:
+                SUBMISSIONS.inc(result="error")
+                s.set(error=str(e))
                 result = {
-                       "role": "tool",
-                       "content": "Task completed",
-					}
-                self.run = False
-            else:
-                result = {
-                    "role": "tool",
-                    "content": f"Retry again! Your previous answer was wrong because, {reason}",
+                    "role":"tool",
+                    "content": f"Error: occurred while using the tool 'submit_answer' using {args, {e}}",
                 }
-                    
-        except Exception as e:
-            result = {
-                "role":"tool",
-                "content": f"Error: occurred while using the tool 'submit_answer' using {args, {e}}",
-            }
-        return result
+            return result
 			
 
-FUNCTION_MAP = {
-    "get_rendered_html": get_rendered_html,
-    "run_code": run_code,
-    "download_file": download_file,
-    "add_dependencies": add_dependencies,
-    "submit_answer": submit_answer,
-    "transcribe_audio": transcribe_audio,
-    "ocr_image_tool": ocr_image_tool,
-    "encode_image_to_base64": encode_image_to_base64
-}
+# Tool modules are imported on first use (see tool_registry), not when the solver is imported
+FUNCTION_MAP = LazyFunctionMap({
+    "get_rendered_html": "scraper:get_rendered_html",
+    "run_code": "kernel_pool:run_code",
+    "download_file": "downloader:download_file",
+    "add_dependencies": "tools:add_dependencies",
+    "submit_answer": "tools:submit_answer",
+    "transcribe_audio": "audio_transcriber:transcribe_audio",
+    "ocr_image_tool": "ocr_service:ocr_image_tool",
+    "encode_image_to_base64": "tools:encode_image_to_base64"
+})
 
 TOOLS_SCHEMA = [
   {
@@ -128,7 +297,7 @@ TOOLS_SCHEMA = [
     "type": "function",
     "function": {
       "name": "run_code",
-      "description": "Execute Python code inside an isolated environment and return stdout/stderr. **DO NOT** use this tool to submit the answer",
+      "description": "Execute Python code in a persistent Python session (variables, imports and loaded data are kept between calls; the working directory is LLMFiles) and return stdout/stderr. **DO NOT** use this tool to submit the answer",
       "parameters": {
         "type": "object",
         "properties": {
@@ -142,12 +311,13 @@ TOOLS_SCHEMA = [
     "type": "function",
     "function": {
       "name": "download_file",
-      "description": "Download a file from a URL and save it with the given filename.",
+      "description": "Download a file from a URL and save it with the given filename. Files over the size limit are refused; use head_bytes to fetch only the start of a large file.",
       "parameters": {
         "type": "object",
         "properties": {
           "url": { "type": "string", "description": "Direct URL to the file." },
-          "filename": { "type": "string", "description": "Filename to save the content as." }
+          "filename": { "type": "string", "description": "Filename to save the content as." },
+          "head_bytes": { "type": "integer", "minimum": 1, "description": "Optional. Only download the first N bytes (e.g. a sample of a huge CSV, cut at the last full line)." }
         },
         "required": ["url", "filename"]
       }
@@ -213,18 +383,23 @@ TOOLS_SCHEMA = [
     "type": "function",
     "function": {
         "name": "ocr_image_tool",
-        "description": "Extract text from an image using OCR (Tesseract). Use this for reading text from images.",
+        "description": "Extract text from one or more images using OCR (Tesseract). Use this for reading text from images; pass all images of a page at once with 'images'.",
         "parameters": {
             "type": "object",
             "properties": {
                 "payload": {
                     "type": "object",
-                    "description": "Object with 'image' key containing file path, base64 string, or image data",
+                    "description": "Object with an 'image' key, or an 'images' list, containing file paths, base64 strings or keys returned by encode_image_to_base64",
                     "properties": {
                         "image": { "type": "string", "description": "Image file path (relative to LLMFiles) or base64 string" },
-                        "lang": { "type": "string", "description": "OCR language code, default 'eng'" }
-                    },
-                    "required": ["image"]
+                        "images": {
+                            "type": "array",
+                            "items": { "type": "string" },
+                            "description": "Several images to OCR in one call (file paths or base64 strings)"
+                        },
+                        "lang": { "type": "string", "description": "OCR language code, default 'eng'" },
+                        "preprocess": { "type": "boolean", "description": "Downscale (and binarize, if enabled) before OCR (default false). Try true for very large or noisy scans." }
+                    }
                 }
             },
             "required": ["payload"]
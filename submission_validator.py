@@ -0,0 +1,171 @@
+import json
+import os
+import re
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+# Placeholders the task extractor leaves in the payload schema ("<answer>", "your email")
+_PLACEHOLDER = re.compile(r"^\s*(<[^>]*>|your[ _]\w+|\.\.\.|answer|\?)\s*$", re.I)
+_TYPE_WORDS = (
+    ("boolean", re.compile(r"\bbool(ean)?\b|\btrue\s*/\s*false\b", re.I)),
+    ("integer", re.compile(r"\bint(eger)?\b|\bwhole number\b", re.I)),
+    ("number", re.compile(r"\bnumber\b|\bnumeric\b|\bfloat\b|\bdecimal\b", re.I)),
+    ("array", re.compile(r"\barray\b|\blist\b", re.I)),
+    ("object", re.compile(r"\bobject\b|\bdict(ionary)?\b", re.I)),
+    ("string", re.compile(r"\bstring\b|\btext\b|\bbase64\b|\bdata uri\b", re.I)),
+)
+
+
+def _problem(field: str, problem: str, expected: Any = None, got: Any = None) -> Dict[str, Any]:
+    error = {"field": field, "problem": problem}
+    if expected is not None:
+        error["expected"] = expected
+    if got is not None:
+        error["got"] = got if not isinstance(got, str) or len(got) <= 200 else got[:200] + "..."
+    return error
+
+
+def expected_answer_type(schema_value: Any) -> str:
+    """The JSON type of the schema's example value: boolean, number, array, object or any.
+
+    Only a non-string example is evidence of the type; a string example is
+    free text written by the extractor and says nothing definite.
+    """
+    if isinstance(schema_value, bool):
+        return "boolean"
+    if isinstance(schema_value, (int, float)):
+        return "number"  # an example like 12345 rarely rules out decimals
+    if isinstance(schema_value, list):
+        return "array"
+    if isinstance(schema_value, dict):
+        return "object"
+    return "any"
+
+
+def described_answer_type(schema_value: Any) -> str:
+    """The type a string example's wording suggests ("an integer", "true/false"), or any. A guess, never a rule."""
+    if isinstance(schema_value, str):
+        for name, pattern in _TYPE_WORDS:
+            if pattern.search(schema_value):
+                return name
+    return "any"
+
+
+def _type_error(answer: Any, expected: str) -> Optional[str]:
+    is_number = isinstance(answer, (int, float)) and not isinstance(answer, bool)
+    if expected == "boolean" and not isinstance(answer, bool):
+        return "must be a JSON boolean (true/false)"
+    if expected in ("integer", "number") and not is_number:
+        if isinstance(answer, str) and re.fullmatch(r"\s*-?\d+(\.\d+)?\s*", answer):
+            return "is a string holding a number; send it as a JSON number, without quotes"
+        return f"must be a JSON {expected}"
+    if expected == "integer" and isinstance(answer, float) and not answer.is_integer():
+        return "must be an integer"
+    if expected == "array" and not isinstance(answer, list):
+        return "must be a JSON array"
+    if expected == "object" and not isinstance(answer, dict):
+        return "must be a JSON object"
+    if expected == "string" and not isinstance(answer, str):
+        return "must be a string"
+    return None
+
+
+def _same_url(a: str, b: str) -> bool:
+    return a.strip().rstrip("/") == b.strip().rstrip("/")
+
+
+def _payload(raw: Any) -> Optional[Dict[str, Any]]:
+    """The payload as a dict, None if it isn't a JSON object; ValueError if it isn't JSON."""
+    if isinstance(raw, dict):
+        return raw
+    payload = json.loads(raw) if isinstance(raw, str) else None
+    return payload if isinstance(payload, dict) else None
+
+
+def validate_submission(args: Dict[str, Any], expected_payload: Optional[Dict[str, Any]] = None,
+                        quiz_url: Optional[str] = None, submission_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Check a submit_answer call before it is sent.
+
+    ``expected_payload`` and ``submission_url`` come from the extracted
+    QuestionTemplate, ``quiz_url`` is the quiz being solved. Returns a list of
+    ``{"field", "problem", "expected", "got"}`` errors; empty means send it.
+    """
+    errors = []
+    target = args.get("submission_url")
+    if not isinstance(target, str) or not target.strip():
+        errors.append(_problem("submission_url", "is missing", expected=submission_url or None))
+    elif quiz_url and _same_url(target, quiz_url) and not (submission_url and _same_url(target, submission_url)):
+        errors.append(_problem("submission_url", "is the quiz URL, not the submission endpoint", expected=submission_url or None))
+    elif submission_url and not _same_url(target, submission_url):
+        errors.append(_problem("submission_url", "does not match the task's submission URL", expected=submission_url, got=target))
+
+    raw = args.get("payload")
+    try:
+        payload = _payload(raw)
+    except ValueError as e:
+        return errors + [_problem("payload", f"is not valid JSON: {e}", got=raw)]
+    if payload is None:
+        return errors + [_problem("payload", "must be a JSON object", got=raw)]
+
+    schema = expected_payload if isinstance(expected_payload, dict) else {}
+    for key in schema:
+        if key not in payload:
+            errors.append(_problem(key, "is missing from the payload", expected=sorted(schema)))
+    if schema:
+        unexpected = sorted(set(payload) - set(schema))
+        if unexpected and any(key not in payload for key in schema):
+            errors.append(_problem(", ".join(unexpected), "are not in the expected payload (misspelled keys?)",
+                                   expected=sorted(schema)))
+
+    if "url" in payload and quiz_url:
+        example = schema.get("url")
+        allowed = [quiz_url] + ([example] if isinstance(example, str) and example.startswith("http") else [])
+        if not isinstance(payload["url"], str) or not any(_same_url(payload["url"], u) for u in allowed):
+            errors.append(_problem("url", "must be the URL of the quiz being solved", expected=quiz_url, got=payload["url"]))
+    for key, env in (("email", "EMAIL"), ("secret", "SECRET")):
+        value = os.getenv(env)
+        if value and (key in schema or key in payload) and payload.get(key) != value:
+            errors.append(_problem(key, f"must be the {key} from My Credentials"))
+
+    if "answer" in payload:
+        answer = payload.get("answer")
+        example = schema.get("answer")
+        if answer is None or (isinstance(answer, str) and not answer.strip()):
+            errors.append(_problem("answer", "is empty"))
+        elif isinstance(answer, str) and (_PLACEHOLDER.match(answer) or
+                                          (answer == example and described_answer_type(example) != "any")):
+            errors.append(_problem("answer", "is still the schema placeholder", got=answer))
+        else:
+            expected = expected_answer_type(example)
+            problem = _type_error(answer, expected) if expected != "any" else None
+            if problem:
+                errors.append(_problem("answer", problem, expected=expected, got=answer))
+    return errors
+
+
+def answer_hints(args: Dict[str, Any], expected_payload: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Non-blocking notes on the answer: its type differs from what the schema's wording suggests.
+
+    Meant for the feedback after a wrong answer, not for rejecting a submission.
+    """
+    try:
+        payload = _payload(args.get("payload"))
+    except ValueError:
+        return []
+    example = (expected_payload or {}).get("answer") if isinstance(expected_payload, dict) else None
+    if not payload or "answer" not in payload:
+        return []
+    described = described_answer_type(example)
+    problem = _type_error(payload["answer"], described) if described != "any" else None
+    if not problem:
+        return []
+    return [{"field": "answer", "hint": f"the task describes it as {example!r}, which may mean type {described}; if so, the answer {problem}",
+             "got": payload["answer"]}]
+
+
+def normalized_payload(args: Dict[str, Any]) -> Dict[str, Any]:
+    """submit_answer arguments with the payload as the JSON string the tool expects."""
+    if isinstance(args.get("payload"), (dict, list)):
+        return dict(args, payload=json.dumps(args["payload"]))
+    return args
@@ -0,0 +1,212 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+# When set, every quiz chain writes its spans to TRACE_DIR/<trace id>.jsonl
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+_registry_lock = threading.Lock()
+_metrics: Dict[str, "_Metric"] = {}
+_collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]] = []
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+    return "{" + body + "}" if body else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+        return [f"{self.name}{_format_labels(zip(self.labelnames, key))} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    with _registry_lock:
+        if name not in _metrics:
+            _metrics[name] = Counter(name, help, labelnames)
+        return _metrics[name]
+
+
+def histogram(name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    with _registry_lock:
+        if name not in _metrics:
+            _metrics[name] = Histogram(name, help, labelnames, buckets)
+        return _metrics[name]
+
+
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]):
+    """Register a function returning ``(name, help, labels, value)`` gauges, read on every scrape."""
+    with _registry_lock:
+        _collectors.append(collector)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines += metric.header() + metric.render()
+    gauges = {}
+    for collector in collectors:
+        try:
+            for name, help, labels, value in collector():
+                gauges.setdefault(name, (help, []))[1].append((labels, value))
+        except Exception as e:
+            print("Metrics collector failed:", e)
+    for name, (help, samples) in gauges.items():
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_format_labels(sorted(labels.items()))} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+SPAN_SECONDS = histogram("quiz_span_duration_seconds", "Duration of traced operations", ("span",))
+SPAN_ERRORS = counter("quiz_span_errors_total", "Traced operations that raised", ("span",))
+
+
+class _Trace:
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.path = None
+        if TRACE_DIR:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            self.path = os.path.join(TRACE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.id[:12]}.jsonl")
+        self.write({"type": "trace", "trace_id": self.id, "name": name, "start": time.time(), **attrs})
+
+    def write(self, record: Dict[str, Any]):
+        if self.path is None:
+            return
+        line = json.dumps(record, default=str)
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Span:
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.attrs = attrs
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.id if parent else None
+        self.start = time.time()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+_current_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Group the spans of one quiz chain; exported to TRACE_DIR when configured."""
+    current = _Trace(name, attrs)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time an operation: always recorded in the span histogram, and written to the chain's trace if any."""
+    current = Span(name, attrs, _current_span.get())
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(token)
+        SPAN_SECONDS.observe(duration, span=name)
+        active = _current_trace.get()
+        if active is not None:
+            active.write({
+                "type": "span", "trace_id": active.id, "span_id": current.id, "parent_id": current.parent_id,
+                "name": name, "start": current.start, "duration": round(duration, 6),
+                "error": error, **current.attrs,
+            })
+
+
+def bind_context(func: Callable) -> Callable:
+    """Run ``func`` in the caller's trace/span context (for work handed to thread pools)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
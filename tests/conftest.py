@@ -0,0 +1,93 @@
+import http.server
+import os
+import re
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class _FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves ``server.files`` with Range, ETag and optional faults (drop / slow / no ranges)."""
+
+    def _range(self, size):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match or not self.server.ranges:
+            return None
+        start = int(match[1])
+        end = int(match[2]) if match[2] else size - 1
+        return start, min(end, size - 1)
+
+    def _headers(self, status, body_size, total, extra=()):
+        self.send_response(status)
+        self.send_header("Content-Length", str(body_size))
+        self.send_header("ETag", '"v1"')
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.log.append(("HEAD", self.path, None))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self._headers(200, len(data), len(data))
+
+    def do_GET(self):
+        self.server.log.append(("GET", self.path, self.headers.get("Range")))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        byte_range = self._range(len(data))
+        if byte_range:
+            start, end = byte_range
+            body = data[start:end + 1]
+            self._headers(206, len(body), len(data), [("Content-Range", f"bytes {start}-{end}/{len(data)}")])
+        else:
+            body = data
+            self._headers(200, len(body), len(data))
+        if self.server.drop_next and not byte_range:
+            self.server.drop_next -= 1
+            self.wfile.write(body[:len(body) // 3])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        if self.server.slow_seconds:
+            step = max(1, len(body) // 20)
+            for offset in range(0, len(body), step):
+                try:
+                    self.wfile.write(body[offset:offset + step])
+                    self.wfile.flush()
+                except OSError:
+                    return
+                time.sleep(self.server.slow_seconds / 20)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+    server.daemon_threads = True
+    server.files = {}
+    server.log = []
+    server.ranges = True
+    server.drop_next = 0
+    server.slow_seconds = 0
+    server.url = lambda path: f"http://127.0.0.1:{server.server_address[1]}{path}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
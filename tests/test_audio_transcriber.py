@@ -0,0 +1,46 @@
+import os
+import time
+
+import pytest
+
+import audio_transcriber
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_transcriber, "TRANSCRIPT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(audio_transcriber, "_memo", type(audio_transcriber._memo)())
+    return tmp_path
+
+
+def write(cache_dir, key, size, age):
+    path = cache_dir / f"{key}.txt"
+    path.write_text("x" * size)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def test_least_recently_used_transcripts_go_first(cache_dir):
+    write(cache_dir, "old", 100, age=30)
+    write(cache_dir, "used", 100, age=20)
+    write(cache_dir, "new", 100, age=10)
+    assert audio_transcriber._cached("used") == "x" * 100  # a hit refreshes it
+    audio_transcriber._evict_disk(max_bytes=200, ttl=3600)
+    assert sorted(os.listdir(cache_dir)) == ["new.txt", "used.txt"]
+
+
+def test_expired_transcripts_are_dropped(cache_dir):
+    write(cache_dir, "stale", 10, age=7200)
+    write(cache_dir, "fresh", 10, age=10)
+    audio_transcriber._evict_disk(max_bytes=10 ** 6, ttl=3600)
+    assert os.listdir(cache_dir) == ["fresh.txt"]
+
+
+def test_store_keeps_the_cache_under_its_limit(cache_dir, monkeypatch):
+    monkeypatch.setattr(audio_transcriber, "TRANSCRIPT_CACHE_MAX_BYTES", 250)
+    for key in "abcd":
+        audio_transcriber._store(key, "y" * 100)
+        time.sleep(0.01)
+    assert sorted(os.listdir(cache_dir)) == ["c.txt", "d.txt"]
+    assert audio_transcriber._cached("a") == "y" * 100  # still memoized in process
@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool, _BrowserWorker
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+class FlakyWorker(_BrowserWorker):
+    """Fails the first ``failures`` launches instead of starting Playwright."""
+
+    def __init__(self, pool, failures):
+        super().__init__(pool, 0)
+        self.failures = failures
+        self.launches = 0
+
+    def _launch(self):
+        self.launches += 1
+        if self.launches <= self.failures:
+            raise OSError(f"launch {self.launches} failed")
+        self.browser = FakeBrowser()
+        self.pages_served = 0
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(browser_pool, "LAUNCH_RETRIES", 3)
+    monkeypatch.setattr(browser_pool.time, "sleep", lambda seconds: None)
+
+
+def test_recycling_retries_a_failed_launch():
+    pool = BrowserPool(size=1, max_pages=1, max_rss_mb=0)
+    worker = FlakyWorker(pool, failures=0)
+    pool.workers = [worker]
+    worker._ensure_browser()
+    worker.pages_served = 1  # due for recycling
+    worker.failures = 3  # the relaunch fails twice before it works
+    worker._ensure_browser()
+    assert worker._healthy() and worker.launches == 4 and worker.recycles == 1
+
+
+def test_relaunch_that_keeps_failing_fails_the_queue():
+    pool = BrowserPool(size=1, max_pages=1, max_rss_mb=0)
+    worker = FlakyWorker(pool, failures=0)
+    pool.workers = [worker]
+    worker._ensure_browser()
+    worker.browser.connected = False
+    worker.failures = 10
+    queued = Future()
+    pool.jobs.put(("https://example.com", queued))
+    with pytest.raises(RuntimeError, match="No browser could be launched"):
+        worker._ensure_browser()
+    assert worker.launches == 4 and worker.launch_failures == 1
+    with pytest.raises(RuntimeError, match="launch 4 failed"):
+        queued.result(timeout=0)
@@ -0,0 +1,162 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import downloader
+
+DATA = b"".join(b"%d,%d\n" % (i, i * i) for i in range(200000))
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(downloader, "_cache", downloader.DownloadCache(root=str(tmp_path / "cache")))
+    downloader._inflight.clear()
+    yield downloader._cache
+    downloader._inflight.clear()
+
+
+def gets(server, path):
+    return [entry for entry in server.log if entry[0] == "GET" and entry[1] == path]
+
+
+def test_concurrent_fetches_share_one_download(file_server):
+    file_server.files["/a.csv"] = DATA
+    file_server.slow_seconds = 0.3
+    url = file_server.url("/a.csv")
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        entries = list(pool.map(downloader.fetch, [url] * 4))
+    assert len({entry["digest"] for entry in entries}) == 1
+    assert len(gets(file_server, "/a.csv")) == 1
+    assert url not in downloader._inflight
+
+
+def test_cancelled_owner_releases_the_url(file_server):
+    file_server.files["/slow.csv"] = DATA
+    file_server.slow_seconds = 2
+    url = file_server.url("/slow.csv")
+
+    async def cancel_in_flight():
+        task = asyncio.create_task(downloader.afetch(url))
+        while url not in downloader._inflight:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_in_flight())
+    assert url not in downloader._inflight
+    file_server.slow_seconds = 0
+    started = time.monotonic()
+    assert downloader.download_file(url, "slow.csv") == "slow.csv"
+    assert time.monotonic() - started < 5
+
+
+def test_waiter_of_a_cancelled_owner_fetches_itself(file_server):
+    file_server.files["/w.csv"] = DATA
+    url = file_server.url("/w.csv")
+    future, owner = downloader._claim(url)
+    assert owner
+    result = {}
+    waiter = threading.Thread(target=lambda: result.setdefault("entry", downloader.fetch(url)))
+    waiter.start()
+    time.sleep(0.1)
+    downloader._release(url, future, error=asyncio.CancelledError())
+    waiter.join(5)
+    assert result["entry"]["size"] == len(DATA)
+
+
+def test_waiters_do_not_wait_forever(file_server, monkeypatch):
+    monkeypatch.setattr(downloader, "DOWNLOAD_DEADLINE_SECONDS", 0.2)
+    monkeypatch.setattr(downloader, "DOWNLOAD_READ_TIMEOUT", 0.1)
+    url = file_server.url("/stuck.csv")
+    downloader._claim(url)  # an owner that never finishes
+    with pytest.raises(concurrent.futures.TimeoutError):
+        downloader.fetch(url)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(downloader.afetch(url))
+
+
+def test_dropped_connection_resumes_with_range(file_server):
+    file_server.files["/drop.csv"] = DATA
+    file_server.drop_next = 1
+    entry = downloader.fetch(file_server.url("/drop.csv"))
+    assert entry["size"] == len(DATA)
+    assert entry["transfer"]["resumes"] == 1
+    ranges = [r for _, _, r in gets(file_server, "/drop.csv")]
+    assert ranges[0] is None and ranges[1].startswith("bytes=")
+    with open(downloader.get_cache()._blob_path(entry["digest"]), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_dropped_connection_without_range_support_restarts(file_server):
+    file_server.files["/norange.csv"] = DATA
+    file_server.ranges = False
+    file_server.drop_next = 1
+    entry = downloader.fetch(file_server.url("/norange.csv"))
+    assert entry["size"] == len(DATA)
+    assert entry["transfer"]["resumes"] == 0
+    assert [r for _, _, r in gets(file_server, "/norange.csv")] == [None, None]
+
+
+def test_files_over_the_limit_are_refused(file_server, monkeypatch, cache):
+    monkeypatch.setattr(downloader, "DOWNLOAD_MAX_BYTES", 1000)
+    file_server.files["/big.csv"] = DATA
+    result = downloader.download_file(file_server.url("/big.csv"), "big.csv")
+    assert "not downloaded" in result
+    assert gets(file_server, "/big.csv") == []  # refused by the HEAD probe
+    monkeypatch.setattr(downloader, "DOWNLOAD_HEAD_PROBE", False)
+    with pytest.raises(downloader.FileTooLarge):
+        downloader.fetch(file_server.url("/big.csv"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_head_bytes_reads_whole_lines(file_server, tmp_path):
+    file_server.files["/h.csv"] = DATA
+    assert downloader.download_file(file_server.url("/h.csv"), "h.csv", head_bytes=100) == "h.csv"
+    head = (tmp_path / "LLMFiles" / "h.csv").read_bytes()
+    assert DATA.startswith(head) and head.endswith(b"\n") and len(head) <= 100
+    assert gets(file_server, "/h.csv")[0][2] == "bytes=0-99"
+
+
+@pytest.mark.parametrize("head_bytes", [0, -2, "abc"])
+def test_invalid_head_bytes_are_refused(file_server, head_bytes):
+    file_server.files["/h.csv"] = DATA
+    assert "head_bytes must be a positive integer" in downloader.download_file(
+        file_server.url("/h.csv"), "h.csv", head_bytes=head_bytes)
+    assert gets(file_server, "/h.csv") == []
+
+
+def test_fetch_range_skips_when_server_ignores_range(file_server):
+    file_server.files["/r.csv"] = DATA
+    file_server.ranges = False
+    assert downloader.fetch_range(file_server.url("/r.csv"), 10, 19) == DATA[10:20]
+
+
+def test_ranged_reads_stop_at_the_deadline(file_server, monkeypatch):
+    monkeypatch.setattr(downloader, "DOWNLOAD_DEADLINE_SECONDS", 0.2)
+    file_server.files["/d.csv"] = DATA
+    file_server.slow_seconds = 3
+    url = file_server.url("/d.csv")
+    started = time.monotonic()
+    with pytest.raises(downloader.DownloadDeadline):
+        downloader.fetch_range(url, 0, len(DATA) - 1)
+    with pytest.raises(downloader.DownloadDeadline):
+        asyncio.run(downloader.afetch_range(url, 0, len(DATA) - 1))
+    assert time.monotonic() - started < 3
+
+
+def test_evicted_blob_is_downloaded_again(file_server, tmp_path):
+    file_server.files["/e.csv"] = DATA
+    url = file_server.url("/e.csv")
+    entry = downloader.fetch(url)
+    (tmp_path / "LLMFiles").mkdir(exist_ok=True)
+    import os
+    os.remove(downloader.get_cache()._blob_path(entry["digest"]))
+    target = str(tmp_path / "LLMFiles" / "e.csv")
+    downloader._materialize(url, entry, target)
+    assert open(target, "rb").read() == DATA
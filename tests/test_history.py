@@ -0,0 +1,46 @@
+from history import HistoryManager, KEEP_HEAD_CHARS, KEEP_TAIL_CHARS
+
+
+def conversation(tool_results, size=8000):
+    messages = [{"role": "system", "content": "rules " * 50}, {"role": "user", "content": "the task"}]
+    for i in range(tool_results):
+        messages.append({"role": "assistant", "content": "", "tool_calls": [
+            {"id": f"c{i}", "type": "function", "function": {"name": "run_code", "arguments": "{}"}}]})
+        messages.append({"role": "tool", "tool_call_id": f"c{i}", "content": f"{i}:" + "x" * size})
+    return messages
+
+
+def test_under_budget_history_is_sent_unchanged():
+    messages = conversation(3)
+    assert HistoryManager(budget=100000).build(messages) == messages
+
+
+def test_old_tool_outputs_are_cut_to_head_and_tail():
+    messages = conversation(8)
+    manager = HistoryManager(budget=8000, keep_recent=2)
+    view = manager.build(messages)
+    assert view[:2] == messages[:2]  # the cacheable prefix is never touched
+    tool_views = [m for m in view if m["role"] == "tool"]
+    assert len(tool_views[0]["content"]) < KEEP_HEAD_CHARS + KEEP_TAIL_CHARS + 200
+    assert "were removed to save context" in tool_views[0]["content"]
+    assert tool_views[-2:] == [m for m in messages if m["role"] == "tool"][-2:]
+    assert all("were removed" in m["content"] for m in tool_views[:-2])
+    assert manager.turn_tokens[-1] <= 8000
+    assert len(messages[3]["content"]) > 8000  # the full history is kept
+
+
+def test_pruning_stops_at_the_low_watermark():
+    messages = conversation(8)
+    view = HistoryManager(budget=12000, keep_recent=0).build(messages)
+    shortened = [m is not original for m, original in zip(view, messages)]
+    # Oldest outputs first, and only as many as needed
+    assert shortened[3] and not shortened[-1]
+
+
+def test_cuts_are_stable_across_turns():
+    messages = conversation(8)
+    manager = HistoryManager(budget=8000, keep_recent=2)
+    first = manager.build(messages)
+    messages += conversation(1)[2:]
+    second = manager.build(messages)
+    assert second[:len(first) - 4] == first[:len(first) - 4]
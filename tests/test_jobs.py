@@ -0,0 +1,70 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+from jobs import SQLiteJobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(path=str(tmp_path / "jobs.sqlite"), max_queue=2, processes=0)
+
+
+def test_submit_dedupes_active_urls(queue):
+    job, created = queue.submit("https://quiz/1")
+    again, created_again = asyncio.run(queue.asubmit("https://quiz/1"))
+    assert created and not created_again
+    assert again.id == job.id
+
+
+def test_submit_applies_backpressure(queue):
+    queue.submit("https://quiz/1")
+    queue.submit("https://quiz/2")
+    with pytest.raises(QueueFull):
+        queue.submit("https://quiz/3")
+
+
+def test_claim_takes_oldest_job_once(queue):
+    first, _ = queue.submit("https://quiz/1")
+    second, _ = queue.submit("https://quiz/2")
+    claimed = queue.claim("worker-a")
+    assert claimed.id == first.id and claimed.status == "running"
+    assert queue.claim("worker-b").id == second.id
+    assert queue.claim("worker-c") is None
+    assert queue.stats()["running"] == 2
+
+
+def test_finished_jobs_free_the_url(queue):
+    job, _ = queue.submit("https://quiz/1")
+    queue.claim("worker-a")
+    queue.finish(job.id, "completed")
+    assert queue.get(job.id).status == "completed"
+    _, created = queue.submit("https://quiz/1")
+    assert created
+
+
+def test_jobs_of_lost_workers_are_reaped(queue, monkeypatch):
+    job, _ = queue.submit("https://quiz/1")
+    queue.claim("worker-a")
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 60)
+    with sqlite3.connect(queue.path) as db:
+        db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, job.id))
+    assert queue.claim("worker-b") is None
+    reaped = queue.get(job.id)
+    assert reaped.status == "failed" and reaped.error == "worker lost"
+    _, created = queue.submit("https://quiz/1")
+    assert created
+
+
+def test_heartbeats_keep_a_job_running(queue, monkeypatch):
+    job, _ = queue.submit("https://quiz/1")
+    queue.claim("worker-a")
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 60)
+    with sqlite3.connect(queue.path) as db:
+        db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, job.id))
+    queue.heartbeat(job.id)
+    queue.claim("worker-b")
+    assert queue.get(job.id).status == "running"
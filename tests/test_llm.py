@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import llm
+import rate_limiter
+from llm import OpenRouterLLM, _StreamAccumulator
+
+OK = {"choices": [{"message": {"role": "assistant", "content": "done"}}], "usage": {}}
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Queue of (status, json, headers) answered in order by a mock transport."""
+    queue = []
+
+    def handler(request):
+        status, body, headers = queue.pop(0)
+        return httpx.Response(status, json=body, headers=headers)
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(llm, "get_client", lambda url: httpx.Client(transport=transport))
+    monkeypatch.setattr(llm, "get_async_client", lambda url: httpx.AsyncClient(transport=transport))
+    return queue
+
+
+@pytest.fixture
+def shared_limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "SHARED_STATE_DB", str(tmp_path / "state.sqlite"))
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    limiter = rate_limiter.get_limiter("test-key")
+    assert isinstance(limiter, rate_limiter.SQLiteTokenBucket)
+    return limiter
+
+
+def test_async_retry_after_429_uses_the_shared_limiter(responses, shared_limiter):
+    responses += [(429, {"error": "slow down"}, {"retry-after": "0.2"}), (200, OK, {})]
+    client = OpenRouterLLM("test-key", model="test/model")
+
+    message = asyncio.run(client.ainvoke([{"role": "user", "content": "hi"}]))
+
+    assert message["content"] == "done"
+    assert shared_limiter.throttled == 1
+    assert shared_limiter.snapshot()["rate_per_minute"] < rate_limiter.RATE_PER_MINUTE
+
+
+def sse(**delta):
+    return "data: " + json.dumps({"choices": [{"delta": delta}]})
+
+
+def tool_delta(index, arguments="", id=None, name=None):
+    function = {"arguments": arguments}
+    if name:
+        function["name"] = name
+    part = {"index": index, "function": function}
+    if id:
+        part["id"] = id
+    return sse(tool_calls=[part])
+
+
+def test_tool_calls_are_dispatched_before_the_stream_ends():
+    dispatched = []
+    acc = _StreamAccumulator(lambda call: dispatched.append(call["id"]))
+    acc.feed_line(tool_delta(0, id="a", name="run_code"))
+    acc.feed_line(tool_delta(0, '{"code": "print('))
+    assert dispatched == []
+    acc.feed_line(tool_delta(0, '1)"}'))
+    assert dispatched == ["a"]
+    acc.feed_line(tool_delta(1, '{"url": "x"', id="b", name="download_file"))
+    acc.feed_line(sse(content="thinking"))
+    assert acc.feed_line("data: [DONE]") is False
+    message = acc.message()
+    assert dispatched == ["a", "b"]  # the unterminated call is flushed at the end
+    assert [c["function"]["arguments"] for c in message["tool_calls"]] == ['{"code": "print(1)"}', '{"url": "x"']
+    assert acc.timings()["time_to_first_tool_call"] is not None
+
+
+def test_a_call_is_dispatched_when_the_next_one_starts():
+    dispatched = []
+    acc = _StreamAccumulator(lambda call: dispatched.append(call["id"]))
+    acc.feed_line(tool_delta(0, '{"a": 1}  ', id="a", name="f"))
+    assert dispatched == ["a"]
+    # Arguments that don't end in "}" go out once the stream moves on to the next call
+    acc.feed_line(tool_delta(1, '[1, ', id="b", name="g"))
+    acc.feed_line(tool_delta(1, '2]'))
+    assert dispatched == ["a"]
+    acc.feed_line(tool_delta(2, '{', id="c", name="h"))
+    assert dispatched == ["a", "b"]
+
+
+def test_arguments_are_not_reparsed_on_every_delta(monkeypatch):
+    parsed = []
+    loads = json.loads
+    monkeypatch.setattr(llm.json, "loads", lambda s, *a, **k: (parsed.append(s), loads(s, *a, **k))[1])
+    acc = _StreamAccumulator()
+    acc.feed_line(tool_delta(0, id="a", name="f"))
+    for _ in range(200):
+        acc.feed_line(tool_delta(0, '"x", '))
+    argument_parses = [s for s in parsed if not s.startswith('{"choices')]
+    assert len(argument_parses) <= 2
+
+
+def test_broken_stream_keeps_only_dispatched_calls():
+    acc = _StreamAccumulator()
+    acc.feed_line(tool_delta(0, '{}', id="a", name="f"))
+    acc.feed_line(tool_delta(1, '{"half', id="b", name="g"))
+    with pytest.raises(llm._StreamError) as error:
+        acc.feed_line("data: {not json")
+    assert error.value.status == 502
+    assert [c["id"] for c in acc.partial_message()["tool_calls"]] == ["a"]
+
+
+def test_error_chunks_keep_throttling_status():
+    with pytest.raises(llm._StreamError) as error:
+        _StreamAccumulator().feed_line('data: {"error": {"code": 429, "message": "slow down"}}')
+    assert error.value.status == 429
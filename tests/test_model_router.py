@@ -0,0 +1,93 @@
+import pytest
+
+import model_router
+from model_router import ModelRouter, Route, classify_turn, parse_routes
+
+A, B = Route("a/model"), Route("b/model", "https://b.example/v1/chat/completions")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_router, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def router(clock):
+    return ModelRouter({"strong": [A, B], "fast": [B]}, {"strong": 10, "fast": 2},
+                       max_error_rate=0.3, window=10, min_samples=5, cooldown=60)
+
+
+def test_parse_routes_keeps_order_and_endpoints():
+    assert parse_routes("a/model, b/model@https://b.example/v1/chat/completions", "a/model") == [A, B]
+
+
+def test_healthy_primary_is_chosen(router):
+    for _ in range(5):
+        router.observe(A, 1.0, True)
+    assert router.choose("strong") == (A, "primary")
+
+
+def test_slow_route_trips_and_comes_back_after_cooldown(router, clock):
+    for _ in range(5):
+        router.observe(A, 30.0, True)
+    route, reason = router.choose("strong")
+    assert route == B and "p95 30.0s over 10s" in reason
+    clock.now += 30
+    assert router.choose("strong") == (B, f"{A} cooling down")
+    assert router.snapshot()["routes"][str(A)]["cooling_down"] == ["strong"]
+    clock.now += 31
+    assert router.choose("strong") == (A, "primary")
+
+
+def test_error_rate_trips_a_route(router):
+    for ok in (True, False, False, True, True):
+        router.observe(A, 1.0, ok)
+    route, reason = router.choose("strong")
+    assert route == B and "error rate 40%" in reason
+
+
+def test_too_few_samples_never_trip(router):
+    for _ in range(4):
+        router.observe(A, 30.0, False)
+    assert router.choose("strong")[0] == A
+
+
+def test_failed_route_is_avoided_for_the_retry(router):
+    assert router.choose("strong", avoid=A)[0] == B
+    # A single-route tier retries on the same route
+    assert router.choose("fast", avoid=B)[0] == B
+
+
+def test_fastest_route_is_used_when_all_are_degraded(router):
+    for _ in range(5):
+        router.observe(A, 40.0, True)
+        router.observe(B, 20.0, True)
+    route, reason = router.choose("strong")
+    assert route == B and reason.endswith("all routes degraded")
+
+
+def test_unknown_tier_falls_back_to_strong(router):
+    assert router.primary("vision") == A
+
+
+def tool(content):
+    return {"role": "tool", "content": content}
+
+
+def test_classify_turn():
+    ok = str({"stdout": "42", "stderr": "", "return_code": 0})
+    assert classify_turn([{"role": "user", "content": "task"}]) == "strong"
+    assert classify_turn([{"role": "assistant"}, tool(ok), tool(ok)]) == "fast"
+    assert classify_turn([{"role": "assistant"}, tool(ok), tool("x" * 1000)]) == "strong"
+    failed = str({"stdout": "", "stderr": "Traceback", "return_code": 1})
+    assert classify_turn([{"role": "assistant"}, tool(failed)]) == "strong"
@@ -0,0 +1,61 @@
+import io
+import sys
+import types
+
+import pytest
+from PIL import Image
+
+import ocr_service
+
+
+@pytest.fixture
+def tesseract(monkeypatch, tmp_path):
+    """Records the images handed to Tesseract instead of running it."""
+    seen = []
+    fake = types.ModuleType("pytesseract")
+    fake.image_to_string = lambda image, lang: (seen.append(image), f"text {len(seen)}")[1]
+    monkeypatch.setitem(sys.modules, "pytesseract", fake)
+    monkeypatch.setattr(ocr_service, "OCR_CACHE_DIR", str(tmp_path / "ocr"))
+    monkeypatch.setattr(ocr_service, "OCR_WORKERS", 1)
+    monkeypatch.setattr(ocr_service, "_memo", type(ocr_service._memo)())
+    return seen
+
+
+def png(color, size=(40, 20)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_raw_ocr_leaves_the_image_untouched(tesseract, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.png").write_bytes(png("red"))
+    assert ocr_service.ocr_images(["a.png"], preprocess=False) == [{"image": "a.png", "text": "text 1"}]
+    assert tesseract[0].mode == "RGB"
+
+
+def test_preprocessing_converts_and_downscales(tesseract, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ocr_service, "OCR_MAX_SIDE", 10)
+    (tmp_path / "a.png").write_bytes(png("red"))
+    ocr_service.ocr_images(["a.png"], preprocess="true")
+    assert tesseract[0].mode == "L" and max(tesseract[0].size) == 10
+
+
+def test_results_are_cached_per_mode(tesseract, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.png").write_bytes(png("blue"))
+    ocr_service.ocr_images(["a.png", "a.png"])
+    ocr_service.ocr_images(["a.png"])
+    assert len(tesseract) == 1
+    ocr_service.ocr_images(["a.png"], preprocess=True)
+    assert len(tesseract) == 2
+
+
+def test_memo_is_bounded(tesseract, monkeypatch):
+    monkeypatch.setattr(ocr_service, "OCR_MEMO_ENTRIES", 2)
+    for key in ("a", "b", "c"):
+        ocr_service._store(key, key.upper())
+    assert list(ocr_service._memo) == ["b", "c"]
+    assert ocr_service._cached("a") == "A"  # still on disk
+    assert list(ocr_service._memo) == ["c", "a"]
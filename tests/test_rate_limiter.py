@@ -0,0 +1,38 @@
+import asyncio
+
+from rate_limiter import SQLiteTokenBucket, TokenBucket
+
+
+def test_bucket_spaces_requests_after_the_burst():
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    assert [round(bucket.reserve(), 1) for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+
+
+def test_throttling_halves_the_rate_and_blocks():
+    bucket = TokenBucket(rate_per_minute=60, burst=1, min_rate_per_minute=6)
+    assert bucket.on_throttled(5, 1) == 5
+    assert bucket.rate == 0.5
+    assert bucket.reserve() >= 4.9
+
+
+def test_shared_buckets_draw_from_one_budget(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    first = SQLiteTokenBucket(path, "key", rate_per_minute=60, burst=2)
+    second = SQLiteTokenBucket(path, "key", rate_per_minute=60, burst=2)
+    delays = [first.reserve(), second.reserve(), first.reserve(), second.reserve()]
+    assert [round(d) for d in delays] == [0, 0, 1, 2]
+    assert first._connection() is first._connection()
+
+
+def test_shared_bucket_async_methods(tmp_path):
+    bucket = SQLiteTokenBucket(str(tmp_path / "state.sqlite"), "key", rate_per_minute=60, burst=1)
+
+    async def run():
+        await bucket.aacquire()
+        delay = await bucket.aon_throttled(0.5, 1)
+        await bucket.aupdate_from_headers({})
+        await bucket.aon_success()
+        return delay
+
+    assert asyncio.run(run()) == 0.5
+    assert bucket.snapshot()["shared"] is True
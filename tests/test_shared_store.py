@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import shared_store
+from shared_store import BoundedStore, SQLiteStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(shared_store, "time", clock)
+    return clock
+
+
+def store(tmp_path, **kwargs):
+    kwargs.setdefault("ttl", None)
+    kwargs.setdefault("spill_dir", str(tmp_path / "spill"))
+    return BoundedStore("test", **kwargs)
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    s = store(tmp_path, max_bytes=300, spill_bytes=10 ** 6)
+    s["a"], s["b"] = b"a" * 100, b"b" * 100
+    s["a"]  # now b is the least recently used
+    s["c"] = b"c" * 150
+    assert "a" in s and "c" in s and "b" not in s
+    assert s.memory_bytes <= 300 and s.stats()["evictions"] == 1
+
+
+def test_large_values_spill_to_disk_and_round_trip(tmp_path):
+    s = store(tmp_path, spill_bytes=100, max_disk_bytes=250)
+    s["text"] = "é" * 60
+    s["blob"] = b"x" * 120
+    assert s.memory_bytes == 0 and s.disk_bytes == 240
+    assert s["text"] == "é" * 60 and s["blob"] == b"x" * 120
+    spill_dir = s._dir
+    s["more"] = b"y" * 120  # over the disk budget: the oldest file goes
+    assert "text" not in s and len(os.listdir(spill_dir)) == 2
+    s.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    s = store(tmp_path, ttl=60)
+    s["k"] = "v"
+    clock.now += 59
+    assert s["k"] == "v"
+    clock.now += 2
+    assert "k" not in s and len(s) == 0
+    with pytest.raises(KeyError):
+        s["k"]
+    assert s.stats()["expirations"] == 1 and s.memory_bytes == 0
+
+
+def test_overwriting_a_key_releases_its_old_size(tmp_path):
+    s = store(tmp_path, spill_bytes=100)
+    s["k"] = b"x" * 500
+    s["k"] = b"small"
+    assert s.disk_bytes == 0 and s.memory_bytes == 5
+    assert os.listdir(s._dir) == []
+
+
+def test_sqlite_store_is_shared_and_expires(tmp_path, clock):
+    path = str(tmp_path / "state.sqlite")
+    writer, reader = SQLiteStore(path, "url_time", ttl=60), SQLiteStore(path, "url_time", ttl=60)
+    writer["https://quiz"] = 12.5
+    assert reader["https://quiz"] == 12.5 and list(reader) == ["https://quiz"]
+    clock.now += 61
+    assert "https://quiz" not in reader
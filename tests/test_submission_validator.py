@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from submission_validator import answer_hints, expected_answer_type, normalized_payload, validate_submission
+
+QUIZ = "https://quiz.example/demo"
+SUBMIT = "https://quiz.example/submit"
+SCHEMA = {"email": "your email", "secret": "your secret", "url": QUIZ, "answer": 12345}
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setenv("EMAIL", "me@example.com")
+    monkeypatch.setenv("SECRET", "s3cret")
+
+
+def submit(answer, **overrides):
+    payload = {"email": "me@example.com", "secret": "s3cret", "url": QUIZ, "answer": answer}
+    payload.update(overrides)
+    return {"submission_url": SUBMIT, "payload": json.dumps(payload)}
+
+
+def check(args, schema=SCHEMA):
+    return validate_submission(args, schema, quiz_url=QUIZ, submission_url=SUBMIT)
+
+
+def fields(errors):
+    return [(e["field"], e["problem"]) for e in errors]
+
+
+def test_a_correct_submission_passes():
+    assert check(submit(42)) == []
+    assert check(submit(4.5)) == []  # a numeric example doesn't rule out decimals
+
+
+def test_submission_url_must_be_the_endpoint():
+    args = submit(42)
+    args["submission_url"] = QUIZ + "/"
+    assert fields(check(args)) == [("submission_url", "is the quiz URL, not the submission endpoint")]
+    args["submission_url"] = "https://elsewhere.example/submit"
+    assert check(args)[0]["expected"] == SUBMIT
+
+
+def test_numbers_sent_as_strings_are_caught():
+    [error] = check(submit("42"))
+    assert error["field"] == "answer" and "without quotes" in error["problem"]
+
+
+def test_placeholders_and_empty_answers_are_caught():
+    assert fields(check(submit("<answer>"))) == [("answer", "is still the schema placeholder")]
+    assert fields(check(submit("  "))) == [("answer", "is empty")]
+
+
+def test_free_text_examples_do_not_constrain_the_type():
+    schema = dict(SCHEMA, answer="the integer sum of the column")
+    assert check(submit("forty-two"), schema) == []
+    assert check(submit(42), schema) == []
+
+
+def test_payload_problems():
+    assert fields(check({"submission_url": SUBMIT, "payload": "{oops"}))[0][0] == "payload"
+    assert fields(check({"submission_url": SUBMIT, "payload": "[1, 2]"})) == [("payload", "must be a JSON object")]
+    payload = {"email": "me@example.com", "secret": "s3cret", "url": QUIZ, "anwser": 42}
+    problems = fields(check({"submission_url": SUBMIT, "payload": payload}))
+    assert ("answer", "is missing from the payload") in problems
+    assert ("anwser", "are not in the expected payload (misspelled keys?)") in problems
+
+
+def test_credentials_and_url_must_match():
+    problems = fields(check(submit(42, secret="wrong", url="https://quiz.example/other")))
+    assert ("secret", "must be the secret from My Credentials") in problems
+    assert ("url", "must be the URL of the quiz being solved") in problems
+
+
+def test_without_a_schema_only_structure_is_checked():
+    assert validate_submission(submit("anything"), None, quiz_url=QUIZ) == []
+
+
+def test_expected_answer_type():
+    assert [expected_answer_type(v) for v in (True, 3, 2.5, [1], {}, "text")] == [
+        "boolean", "number", "number", "array", "object", "any"]
+
+
+def test_hints_follow_the_schema_wording():
+    [hint] = answer_hints(submit("42"), dict(SCHEMA, answer="an integer"))
+    assert "type integer" in hint["hint"] and hint["got"] == "42"
+    assert answer_hints(submit(42), dict(SCHEMA, answer="an integer")) == []
+
+
+def test_normalized_payload_serializes_objects():
+    args = normalized_payload({"submission_url": SUBMIT, "payload": {"answer": 1}})
+    assert json.loads(args["payload"]) == {"answer": 1}
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from solver_agent import _ToolTurn
+
+
+class FakeAgent:
+    """Runs each tool call by sleeping for ``args["sleep"]`` and records start/end order."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self.events = []
+        self.lock = threading.Lock()
+        self.runs = 0
+
+    def _record(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def _run_tool_call(self, tool_call):
+        args = json.loads(tool_call["function"]["arguments"])
+        with self.lock:
+            self.runs += 1
+        self._record(("start", tool_call["id"]))
+        time.sleep(args.get("sleep", 0))
+        self._record(("end", tool_call["id"]))
+        return {"role": "tool", "tool_call_id": tool_call["id"]}
+
+
+@pytest.fixture
+def agent():
+    agent = FakeAgent()
+    yield agent
+    agent._executor.shutdown(wait=True)
+
+
+def call(id, name="get_rendered_html", **args):
+    return {"id": id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+def position(agent, event, id):
+    return agent.events.index((event, id))
+
+
+def test_independent_calls_overlap_and_keep_issue_order(agent):
+    calls = [call("slow", sleep=0.3), call("fast", sleep=0.05)]
+    results = _ToolTurn(agent).results(calls)
+    assert [r["tool_call_id"] for r in results] == ["slow", "fast"]
+    assert position(agent, "end", "fast") < position(agent, "end", "slow")
+
+
+def test_serial_tools_are_barriers(agent):
+    calls = [
+        call("fetch", sleep=0.2),
+        call("code", "run_code", sleep=0.05),
+        call("after", sleep=0),
+    ]
+    _ToolTurn(agent).results(calls)
+    assert position(agent, "end", "fetch") < position(agent, "start", "code")
+    assert position(agent, "end", "code") < position(agent, "start", "after")
+
+
+def test_calls_mentioning_a_download_wait_for_it(agent):
+    calls = [
+        call("dl", "download_file", url="https://x/scan.png", filename="scan.png", sleep=0.2),
+        call("ocr", "ocr_image_tool", payload={"image": "scan.png"}),
+        call("other", sleep=0),
+    ]
+    _ToolTurn(agent).results(calls)
+    assert position(agent, "end", "dl") < position(agent, "start", "ocr")
+    assert position(agent, "start", "other") < position(agent, "end", "dl")
+
+
+def test_streamed_calls_are_not_run_twice(agent):
+    turn = _ToolTurn(agent)
+    first = call("a", sleep=0.05)
+    turn.dispatch(first)  # handed out while the response was streaming
+    results = asyncio.run(turn.aresults([first, call("b")]))
+    assert [r["tool_call_id"] for r in results] == ["a", "b"]
+    assert agent.runs == 2
+
+
+def test_malformed_arguments_still_run(agent):
+    broken = {"id": "x", "type": "function", "function": {"name": "run_code", "arguments": "{not json"}}
+    agent._run_tool_call = lambda tool_call: {"tool_call_id": tool_call["id"]}
+    assert _ToolTurn(agent).results([broken]) == [{"tool_call_id": "x"}]
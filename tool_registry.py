@@ -0,0 +1,54 @@
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict
+
+
+class LazyFunctionMap(Mapping):
+    """Tool name -> callable, where each tool is registered as ``"module:attr"``.
+
+    A tool's module is imported the first time the tool is looked up, so
+    importing the solver doesn't pull in the heavy stacks (torch, whisper,
+    pandas) behind tools a quiz may never call.
+    """
+
+    def __init__(self, specs: Dict[str, str]):
+        self.specs = dict(specs)
+        self.load_seconds: Dict[str, float] = {}
+        self._loaded: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Callable:
+        func = self._loaded.get(name)
+        if func is not None:
+            return func
+        module_name, _, attr = self.specs[name].partition(":")
+        with self._lock:
+            if name not in self._loaded:
+                started = time.perf_counter()
+                self._loaded[name] = getattr(importlib.import_module(module_name), attr)
+                self.load_seconds[name] = round(time.perf_counter() - started, 3)
+            return self._loaded[name]
+
+    def __contains__(self, name) -> bool:
+        # Membership must not trigger the import
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def loaded(self) -> Dict[str, bool]:
+        return {name: name in self._loaded for name in self.specs}
+
+    def load_all(self) -> Dict[str, float]:
+        """Import every tool now (background warm-up); returns seconds spent per tool."""
+        for name in self.specs:
+            try:
+                self[name]
+            except Exception as e:
+                print(f"Failed to load tool {name} ({self.specs[name]}): {e}")
+        return dict(self.load_seconds)
@@ -0,0 +1,67 @@
+"""
+Quiz worker process for JOB_BACKEND=sqlite.
+
+Claims jobs queued by /solve from JOB_DB and runs each chain with
+pipeline_manager.run_pipeline. The API process starts JOB_WORKER_PROCESSES
+of these; more can be started by hand (``python worker.py``) on the same host.
+All workers must share one local JOB_DB, download cache and LLMFiles: SQLite's
+WAL locking does not work over network filesystems such as NFS or SMB.
+"""
+import signal
+import threading
+from jobs import SQLiteJobQueue, JOB_POLL_SECONDS, worker_id
+from pipeline_manager import run_pipeline
+from browser_pool import shutdown_pool
+from kernel_pool import shutdown_kernel_pool
+from llm import close_clients
+
+HEARTBEAT_SECONDS = 10
+
+stopping = threading.Event()
+
+
+def _heartbeat(queue: SQLiteJobQueue, job_id: str, done: threading.Event):
+    while not done.wait(HEARTBEAT_SECONDS):
+        queue.heartbeat(job_id)
+
+
+def _on_signal(signum, frame):
+    # Finish the current chain, then exit; a second signal exits immediately
+    if stopping.is_set():
+        raise SystemExit(1)
+    stopping.set()
+
+
+def main():
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+    queue = SQLiteJobQueue()
+    name = worker_id()
+    print(f"Worker {name} polling {queue.path}")
+    try:
+        while not stopping.is_set():
+            job = queue.claim(name)
+            if job is None:
+                stopping.wait(JOB_POLL_SECONDS)
+                continue
+            print(f"Worker {name} took job {job.id}: {job.url}")
+            done = threading.Event()
+            threading.Thread(target=_heartbeat, args=(queue, job.id, done), daemon=True).start()
+            try:
+                run_pipeline(job.url, progress=lambda url, stage, job_id=job.id: queue.progress(job_id, url, stage))
+                queue.finish(job.id, "completed")
+            except BaseException as e:
+                queue.finish(job.id, "cancelled" if isinstance(e, SystemExit) else "failed", f"{type(e).__name__}: {e}")
+                if isinstance(e, (SystemExit, KeyboardInterrupt)):
+                    raise
+                print(f"Job {job.id} failed: {e}")
+            finally:
+                done.set()
+    finally:
+        shutdown_pool()
+        shutdown_kernel_pool()
+        close_clients()
+
+
+if __name__ == "__main__":
+    main()